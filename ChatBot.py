@@ -1,23 +1,29 @@
 # ====================================================================================
 #  Gemini AI 챗봇 (Streamlit) - 엔트리포인트
 # ====================================================================================
+#  Streamlit은 이 스크립트를 __main__ 모듈로 실행한다. spawn 방식의 전처리 워커
+#  (preprocess.py)는 시작할 때 __main__ 스크립트를 __mp_main__으로 다시 불러오므로,
+#  워커에서 앱이 실행되지 않도록 앱 코드는 __main__일 때만 돌린다.
 
 import streamlit as st
 
-# --- 페이지 기본 설정 (반드시 최상단) ---
-st.set_page_config(
-    page_title="동동봇",
-    page_icon="./images/동동이.PNG",
-    layout="wide",
-    initial_sidebar_state="collapsed",
-)
+if __name__ == "__main__":
+    # --- 페이지 기본 설정 (반드시 최상단) ---
+    st.set_page_config(
+        page_title="동동봇",
+        page_icon="./images/동동이.PNG",
+        layout="wide",
+        initial_sidebar_state="collapsed",
+    )
 
-# --- 모듈 임포트 ---
-from session import init_session_state
-from ui_sidebar import render_sidebar
-from ui_main import render_main_chat
+    # --- 모듈 임포트 ---
+    from session import init_session_state
+    from session_memory import account_session_memory
+    from ui_sidebar import render_sidebar
+    from ui_main import render_main_chat
 
-# --- 앱 실행 ---
-init_session_state()
-render_sidebar()
-render_main_chat()
+    # --- 앱 실행 ---
+    init_session_state()
+    account_session_memory()
+    render_sidebar()
+    render_main_chat()
@@ -0,0 +1,149 @@
+# ====================================================================================
+#  attachments.py - 첨부 파일 원격 핸들 (Files API로 한 번만 올리고 URI로 재사용)
+# ====================================================================================
+#  큰 PDF와 이미지는 매 턴 히스토리와 함께 다시 전송된다. 내용 다이제스트를 키로
+#  Files API에 한 번만 올리고 요청에는 file URI만 넣는다. 핸들은 API 키별 공유 캐시에
+#  두므로 같은 키(무료 키 포함)를 쓰는 세션끼리는 같은 교과서를 다시 올리지 않는다.
+#  Files API 파일은 일정 시간 뒤 만료되므로 만료 시각을 기록해 두고, 지났으면 다음
+#  요청에서 저장소의 원본 바이트로 다시 올린다. 업로드에 실패하면 인라인으로 보내고,
+#  실패도 잠시 기록해 두어 매 턴 같은 파일의 업로드를 다시 기다리지 않는다.
+
+import io
+import time
+import hashlib
+import threading
+from datetime import datetime
+
+from google.genai import types
+
+from config import (
+    ATTACHMENT_ACTIVE_TIMEOUT_SECONDS,
+    ATTACHMENT_DEFAULT_TTL_SECONDS,
+    ATTACHMENT_EXPIRY_MARGIN_SECONDS,
+    ATTACHMENT_FAILURE_TTL_SECONDS,
+    ATTACHMENT_REMOTE_MIN_BYTES,
+    ATTACHMENT_UPLOAD_LOCK_STRIPES,
+    logger,
+)
+from shared_cache import cache_get, cache_set
+
+_NAMESPACE = "file_handles"
+
+# 같은 파일을 동시에 여러 세션이 올리지 않도록 (키, 다이제스트) 해시로 고른 잠금
+_upload_locks = [threading.Lock() for _ in range(ATTACHMENT_UPLOAD_LOCK_STRIPES)]
+
+
+def _handle_key(api_key: str, digest: str) -> str:
+    # 업로드한 파일은 API 키의 프로젝트에만 보이므로 키별로 나눈다
+    key_hash = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    return f"{key_hash}:{digest}"
+
+
+def _get_lock(handle_key: str) -> threading.Lock:
+    index = int(hashlib.sha256(handle_key.encode("utf-8")).hexdigest()[:8], 16)
+    return _upload_locks[index % len(_upload_locks)]
+
+
+def _cached_handle(handle_key: str) -> dict | None:
+    """유효한 핸들 또는 최근 업로드 실패 기록 {"failed": True} (없으면 None)"""
+    handle = cache_get(_NAMESPACE, handle_key)
+    if handle and (
+        handle.get("failed")
+        or handle["expires_at"] - ATTACHMENT_EXPIRY_MARGIN_SECONDS > time.time()
+    ):
+        return handle
+    return None
+
+
+def _expiry_timestamp(expiration_time) -> float:
+    if isinstance(expiration_time, datetime):
+        return expiration_time.timestamp()
+    return time.time() + ATTACHMENT_DEFAULT_TTL_SECONDS
+
+
+def _upload(client, data: bytes, mime_type: str, display_name: str):
+    """업로드 후 처리가 끝날(ACTIVE) 때까지 기다린다"""
+    uploaded = client.files.upload(
+        file=io.BytesIO(data),
+        config=types.UploadFileConfig(mime_type=mime_type, display_name=display_name or None),
+    )
+    deadline = time.monotonic() + ATTACHMENT_ACTIVE_TIMEOUT_SECONDS
+    while getattr(uploaded, "state", None) == types.FileState.PROCESSING:
+        if time.monotonic() > deadline:
+            raise TimeoutError("업로드한 파일 처리가 끝나지 않았습니다.")
+        time.sleep(1.0)
+        uploaded = client.files.get(name=uploaded.name)
+    if getattr(uploaded, "state", None) == types.FileState.FAILED:
+        raise RuntimeError("업로드한 파일 처리에 실패했습니다.")
+    return uploaded
+
+
+def get_file_handle(
+    client, api_key: str, digest: str, mime_type: str, load_bytes, display_name: str = ""
+) -> dict | None:
+    """
+    다이제스트에 해당하는 유효한 원격 파일 핸들 {"uri", "mime_type", "expires_at"}
+
+    캐시에 없거나 만료가 가까우면 load_bytes()로 원본을 읽어 다시 올린다.
+    ATTACHMENT_REMOTE_MIN_BYTES보다 작은 파일이나 업로드에 실패한 경우 None
+    (호출 측은 인라인으로 보낸다). 실패는 ATTACHMENT_FAILURE_TTL_SECONDS 동안 기록해
+    그동안은 원본을 읽거나 다시 올리지 않고 바로 None을 반환한다.
+    """
+    if not api_key or getattr(client, "files", None) is None:
+        return None
+    handle_key = _handle_key(api_key, digest)
+    handle = _cached_handle(handle_key)
+    if handle:
+        return None if handle.get("failed") else handle
+
+    with _get_lock(handle_key):
+        # 기다리는 동안 다른 세션이 올렸을 수 있다
+        handle = _cached_handle(handle_key)
+        if handle:
+            return None if handle.get("failed") else handle
+        data = load_bytes()
+        if not data or len(data) < ATTACHMENT_REMOTE_MIN_BYTES:
+            return None
+        started_at = time.monotonic()
+        try:
+            uploaded = _upload(client, data, mime_type, display_name)
+        except Exception as e:
+            logger.warning(
+                "attachment_upload_failed digest=%s bytes=%d error=%s", digest[:12], len(data), e
+            )
+            cache_set(_NAMESPACE, handle_key, {"failed": True}, ttl=ATTACHMENT_FAILURE_TTL_SECONDS)
+            return None
+        handle = {
+            "uri": uploaded.uri,
+            "mime_type": getattr(uploaded, "mime_type", None) or mime_type,
+            "expires_at": _expiry_timestamp(getattr(uploaded, "expiration_time", None)),
+        }
+        cache_set(
+            _NAMESPACE,
+            handle_key,
+            handle,
+            ttl=max(handle["expires_at"] - time.time() - ATTACHMENT_EXPIRY_MARGIN_SECONDS, 1),
+        )
+        logger.info(
+            "attachment_uploaded digest=%s bytes=%d seconds=%.2f",
+            digest[:12],
+            len(data),
+            time.monotonic() - started_at,
+        )
+        return handle
+
+
+def make_part_resolver(client, api_key: str):
+    """
+    첨부 항목(digest, mime_type, load_bytes, 이름) → 원격 파일 Part (없으면 None)
+
+    build_request_contents에 넘겨 요청을 만들 때마다 핸들을 확인한다.
+    """
+
+    def resolve(digest: str, mime_type: str, load_bytes, display_name: str = ""):
+        handle = get_file_handle(client, api_key, digest, mime_type, load_bytes, display_name)
+        if handle is None:
+            return None
+        return types.Part.from_uri(file_uri=handle["uri"], mime_type=handle["mime_type"])
+
+    return resolve
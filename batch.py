@@ -0,0 +1,332 @@
+# ====================================================================================
+#  batch.py - 헤드리스 일괄 생성 (CSV/JSONL 입력 → 기능별 지시문으로 생성 → HTML 파일 저장)
+# ====================================================================================
+#  사용법:
+#    python batch.py inputs.csv --feature "프론트엔드 개발" --api-key $GEMINI_API_KEY
+#    python batch.py units.jsonl --feature "깊이 있는 수학수업" \
+#        --template "{unit} 단원 {page}쪽 학습지를 만들어 주세요." --concurrency 4
+#
+#  단원별 학습지 40쪽처럼 같은 기능을 여러 입력에 돌릴 때 채팅 화면을 거치지 않고
+#  prompts_config.json의 기능/지시문을 그대로 써서 생성한다. 항목마다 결과를 저장하고
+#  checkpoint.jsonl에 기록하므로 중단된 작업은 같은 명령으로 다시 실행하면 이어서 한다.
+#  체크포인트 첫 줄에는 실행 설정(기능, 템플릿/열)을 기록해 두고, 다른 설정으로 같은
+#  폴더를 이어 실행하려 하면 거부한다(--restart로 처음부터). 입력이 바뀐 항목은 다시 만든다.
+#  --base-url로 로컬 API 대역 서버를 지정하면 실제 API 없이 확인할 수 있다.
+#  (batch_check.py가 대역 서버를 띄워 이어하기/실패 처리를 확인한다)
+
+import os
+import re
+import csv
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from google import genai
+from google.genai import types
+
+import curriculum
+import rate_limiter
+from config import (
+    BATCH_CONCURRENCY,
+    BATCH_MAX_RETRIES,
+    BATCH_OUTPUT_DIR,
+    BATCH_RETRY_BACKOFF_SECONDS,
+    logger,
+)
+from feature_registry import FeatureConfigError, get_registry
+from utils import extract_latest_html_code
+
+CHECKPOINT_FILE = "checkpoint.jsonl"
+_SAFE_NAME_PATTERN = re.compile(r"[^\w\-]+")
+
+
+class BatchInputError(Exception):
+    """입력 파일을 읽을 수 없거나 항목 형식이 올바르지 않은 경우"""
+
+
+class CheckpointMismatch(Exception):
+    """기존 체크포인트가 다른 기능/템플릿으로 실행된 결과인 경우"""
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def run_settings(feature, column: str, template: str | None) -> dict:
+    """체크포인트에 기록해 이어하기 가능 여부를 판단하는 실행 설정"""
+    return {"feature": feature.label, "model": feature.model, "template": template, "column": column}
+
+
+def load_items(path: Path, column: str, template: str | None) -> list[dict]:
+    """
+    CSV/JSONL 입력을 {"id", "input"} 목록으로 읽는다
+
+    template이 있으면 행의 값으로 채워 입력을 만들고, 없으면 column 값을 그대로 쓴다.
+    id 열이 없으면 1부터 시작하는 행 번호를 id로 쓴다.
+    """
+    if path.suffix.lower() == ".csv":
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            rows = list(csv.DictReader(f))
+    elif path.suffix.lower() in (".jsonl", ".ndjson"):
+        rows = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise BatchInputError(f"{line_number}번째 줄이 올바른 JSON이 아닙니다: {e}") from e
+                rows.append(row if isinstance(row, dict) else {column: row})
+    else:
+        raise BatchInputError("입력 파일은 .csv 또는 .jsonl이어야 합니다.")
+
+    items = []
+    seen_ids = set()
+    for index, row in enumerate(rows, start=1):
+        try:
+            text = template.format(**row) if template else row[column]
+        except KeyError as e:
+            raise BatchInputError(f"{index}번째 항목에 {e} 값이 없습니다.") from e
+        if not isinstance(text, str) or not text.strip():
+            raise BatchInputError(f"{index}번째 항목의 입력이 비어 있습니다.")
+        item_id = _SAFE_NAME_PATTERN.sub("_", str(row.get("id") or index)).strip("_")
+        if not item_id or item_id in seen_ids:
+            raise BatchInputError(f"{index}번째 항목의 id가 비어 있거나 중복됩니다: {row.get('id')!r}")
+        seen_ids.add(item_id)
+        items.append({"id": item_id, "input": text.strip()})
+    return items
+
+
+def load_checkpoint(output_dir: Path) -> tuple[dict | None, dict[str, str]]:
+    """
+    체크포인트에서 (실행 설정, 완료된 항목 id → 입력 다이제스트)를 읽는다
+
+    실패한 항목은 완료로 치지 않으므로 다시 실행된다.
+    """
+    settings = None
+    completed = {}
+    try:
+        with open(output_dir / CHECKPOINT_FILE, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # 강제 종료로 마지막 줄이 잘린 경우
+                if "settings" in record:
+                    settings = record["settings"]
+                elif record.get("status") == "done":
+                    completed[record["id"]] = record.get("input_digest")
+    except FileNotFoundError:
+        pass
+    return settings, completed
+
+
+class _Checkpoint:
+    """항목 결과를 한 줄씩 바로 디스크에 기록 (여러 작업 스레드에서 호출)"""
+
+    def __init__(self, path: Path):
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def record(self, **fields):
+        with self._lock:
+            self._file.write(json.dumps(fields, ensure_ascii=False) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def _write_artifact(output_dir: Path, item_id: str, text: str) -> Path:
+    """응답에 HTML이 있으면 .html, 없으면 응답 전체를 .md로 저장 (임시 파일에 쓴 뒤 교체)"""
+    html_code = extract_latest_html_code([{"role": "assistant", "content": text}])
+    path = output_dir / (f"{item_id}.html" if html_code else f"{item_id}.md")
+    temp_path = path.with_suffix(path.suffix + ".tmp")
+    temp_path.write_text(html_code or text, encoding="utf-8")
+    temp_path.replace(path)
+    return path
+
+
+def generate_item(client, feature, api_key: str, item: dict) -> str:
+    """항목 하나를 생성해 응답 텍스트를 반환 (실패하면 BATCH_MAX_RETRIES번 다시 시도)"""
+    system_instruction = feature.prompt_text or None
+    if feature.sectioned_prompt == "curriculum" and system_instruction:
+        system_instruction = curriculum.build_curriculum_instruction(
+            system_instruction, [{"role": "user", "content": item["input"]}]
+        )
+    config = types.GenerateContentConfig(system_instruction=system_instruction)
+
+    for attempt in range(BATCH_MAX_RETRIES + 1):
+        try:
+            rate_limiter.acquire(api_key)
+            response = client.models.generate_content(
+                model=feature.model, contents=item["input"], config=config
+            )
+            text = (response.text or "").strip()
+            if not text:
+                raise ValueError("응답이 비어 있습니다.")
+            return text
+        except Exception as e:
+            if attempt == BATCH_MAX_RETRIES:
+                raise
+            logger.warning(
+                "batch_item_retry id=%s attempt=%d error=%s", item["id"], attempt + 1, e
+            )
+            time.sleep(BATCH_RETRY_BACKOFF_SECONDS * (2**attempt))
+
+
+def run_batch(
+    items: list[dict],
+    feature,
+    api_key: str,
+    output_dir: Path,
+    concurrency: int = BATCH_CONCURRENCY,
+    base_url: str | None = None,
+    settings: dict | None = None,
+    restart: bool = False,
+) -> dict:
+    """
+    완료되지 않은 항목을 최대 concurrency개씩 동시에 생성해 output_dir에 저장
+
+    settings(run_settings)가 기존 체크포인트와 다르면 CheckpointMismatch를 던진다.
+    restart이면 기존 체크포인트를 지우고 처음부터 실행한다. 입력 내용이 바뀐 항목은
+    완료 기록이 있어도 다시 생성한다.
+
+    Returns:
+        {"done": 이번에 완료, "skipped": 이전 실행에서 완료, "failed": 실패} 개수
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    checkpoint_path = output_dir / CHECKPOINT_FILE
+    if restart:
+        checkpoint_path.unlink(missing_ok=True)
+    previous_settings, completed = load_checkpoint(output_dir)
+    if settings is not None and checkpoint_path.exists() and previous_settings != settings:
+        raise CheckpointMismatch(
+            f"{output_dir}의 기존 결과는 다른 설정으로 만든 것입니다 "
+            f"(기존: {previous_settings}, 현재: {settings}). "
+            "--output으로 다른 폴더를 지정하거나 --restart로 처음부터 실행하세요."
+        )
+    for item in items:
+        item["input_digest"] = _digest(item["input"])
+    pending = [item for item in items if completed.get(item["id"]) != item["input_digest"]]
+    counts = {"done": 0, "skipped": len(items) - len(pending), "failed": 0}
+    if not pending:
+        return counts
+
+    http_options = types.HttpOptions(base_url=base_url) if base_url else None
+    client = genai.Client(api_key=api_key, http_options=http_options)
+    is_new_checkpoint = not checkpoint_path.exists()
+    checkpoint = _Checkpoint(checkpoint_path)
+    if is_new_checkpoint and settings is not None:
+        checkpoint.record(settings=settings)
+
+    def process(item: dict):
+        started_at = time.monotonic()
+        text = generate_item(client, feature, api_key, item)
+        path = _write_artifact(output_dir, item["id"], text)
+        return path, time.monotonic() - started_at
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            futures = {pool.submit(process, item): item for item in pending}
+            for future in as_completed(futures):
+                item = futures[future]
+                try:
+                    path, seconds = future.result()
+                except Exception as e:
+                    counts["failed"] += 1
+                    checkpoint.record(
+                        id=item["id"], status="failed", error=f"{type(e).__name__}: {e}"
+                    )
+                    logger.error("batch_item_failed id=%s error=%s", item["id"], e)
+                    continue
+                counts["done"] += 1
+                checkpoint.record(
+                    id=item["id"],
+                    status="done",
+                    input_digest=item["input_digest"],
+                    file=path.name,
+                    seconds=round(seconds, 2),
+                )
+                logger.info(
+                    "batch_item_done id=%s file=%s seconds=%.2f progress=%d/%d",
+                    item["id"],
+                    path.name,
+                    seconds,
+                    counts["done"] + counts["failed"],
+                    len(pending),
+                )
+    finally:
+        checkpoint.close()
+    return counts
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="동동봇 기능을 여러 입력에 일괄 실행")
+    parser.add_argument("input", type=Path, help="입력 파일 (.csv 또는 .jsonl)")
+    parser.add_argument("--feature", help="prompts_config.json의 기능 레이블 (기본: 첫 번째 기능)")
+    parser.add_argument("--column", default="input", help="입력으로 쓸 열 이름 (기본: input)")
+    parser.add_argument("--template", help='행 값으로 채울 입력 템플릿, 예: "{unit} 단원 학습지"')
+    parser.add_argument("--output", type=Path, help="결과 폴더 (기본: data/batch/<입력 파일 이름>)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument(
+        "--restart", action="store_true", help="기존 체크포인트를 지우고 처음부터 실행"
+    )
+    parser.add_argument("--api-key", default=os.environ.get("GEMINI_API_KEY"))
+    parser.add_argument(
+        "--base-url",
+        default=os.environ.get("DONGDONGBOT_API_BASE_URL"),
+        help="API 주소 (로컬 대역 서버로 확인할 때 지정)",
+    )
+    args = parser.parse_args(argv)
+
+    if not args.api_key:
+        parser.error("--api-key 또는 GEMINI_API_KEY 환경 변수가 필요합니다.")
+    try:
+        registry = get_registry()
+    except FeatureConfigError as e:
+        parser.error(str(e))
+    if args.feature and args.feature not in registry.by_label:
+        parser.error(f"알 수 없는 기능: {args.feature} (사용 가능: {', '.join(registry.options)})")
+    feature = registry.get(args.feature) if args.feature else registry.default
+    if feature.is_image_model:
+        parser.error("이미지 생성 기능은 일괄 실행을 지원하지 않습니다.")
+
+    try:
+        items = load_items(args.input, args.column, args.template)
+    except (OSError, BatchInputError) as e:
+        parser.error(str(e))
+
+    output_dir = args.output or BATCH_OUTPUT_DIR / args.input.stem
+    try:
+        counts = run_batch(
+            items,
+            feature,
+            args.api_key,
+            output_dir,
+            args.concurrency,
+            args.base_url,
+            settings=run_settings(feature, args.column, args.template),
+            restart=args.restart,
+        )
+    except CheckpointMismatch as e:
+        parser.error(str(e))
+    print(
+        f"완료 {counts['done']}건, 이전 실행에서 완료 {counts['skipped']}건, "
+        f"실패 {counts['failed']}건 → {output_dir}"
+    )
+    if counts["failed"]:
+        print("실패한 항목은 같은 명령을 다시 실행하면 이어서 처리합니다.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
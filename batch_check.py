@@ -0,0 +1,164 @@
+# ====================================================================================
+#  batch_check.py - batch.py 로컬 API 대역 서버와 동작 확인 (네트워크/API 키 불필요)
+# ====================================================================================
+#  사용법:
+#    python batch_check.py                  # 대역 서버를 띄워 batch.py 이어하기/실패/설정 검사 확인
+#    python batch_check.py --serve --port 8765
+#        # 대역 서버만 실행 → python batch.py inputs.csv --api-key stub --base-url http://127.0.0.1:8765
+#
+#  대역 서버는 generateContent 요청을 받아 입력 문장을 담은 HTML 코드 블록으로 답한다.
+#  입력에 FAIL_MARKER가 들어 있으면 500 오류로 답해 재시도/실패 기록을 확인할 수 있다.
+
+import os
+
+# 확인 중에는 공유 캐시 DB를 건드리지 않도록 프로세스 메모리 캐시만 사용
+os.environ["DONGDONGBOT_CACHE_BACKEND"] = "memory"
+
+import sys
+import json
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import batch
+from feature_registry import get_registry
+
+FAIL_MARKER = "[실패]"
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Gemini generateContent 요청에 고정 형식으로 답하는 핸들러"""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        text = body["contents"][-1]["parts"][0]["text"]
+        self.server.requests.append(text)
+        if FAIL_MARKER in text and not self.server.recovered.is_set():
+            self._send(500, {"error": {"code": 500, "message": "stub failure", "status": "INTERNAL"}})
+            return
+        answer = f"```html\n<!DOCTYPE html><html><body>{text}</body></html>\n```"
+        self._send(
+            200,
+            {"candidates": [{"content": {"role": "model", "parts": [{"text": answer}]}}]},
+        )
+
+    def _send(self, status: int, payload: dict):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub_server(port: int = 0) -> ThreadingHTTPServer:
+    """대역 서버를 백그라운드 스레드로 시작 (server.requests에 받은 입력 기록)"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), _StubHandler)
+    server.requests = []
+    # set하면 FAIL_MARKER 입력도 정상 응답 (장애 복구 후 다시 실행하는 상황)
+    server.recovered = threading.Event()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_check() -> list[str]:
+    """batch.run_batch를 대역 서버로 실행해 확인하고, 실패한 항목 설명 목록을 반환"""
+    server = start_stub_server()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    feature = get_registry().default
+    problems = []
+
+    def expect(condition: bool, description: str):
+        print(f"{'✅' if condition else '❌'} {description}")
+        if not condition:
+            problems.append(description)
+
+    def items(template: str = "{unit} 학습지"):
+        rows = [{"id": "u1", "unit": "피타고라스"}, {"id": "u2", "unit": f"{FAIL_MARKER} 원"}]
+        return [{"id": row["id"], "input": template.format(**row)} for row in rows]
+
+    original_backoff = batch.BATCH_RETRY_BACKOFF_SECONDS
+    batch.BATCH_RETRY_BACKOFF_SECONDS = 0.01
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_dir = Path(temp_dir)
+            settings = batch.run_settings(feature, "input", "{unit} 학습지")
+
+            counts = batch.run_batch(
+                items(), feature, "stub", output_dir, 2, base_url, settings=settings
+            )
+            expect(counts == {"done": 1, "skipped": 0, "failed": 1}, f"첫 실행: {counts}")
+            expect((output_dir / "u1.html").exists(), "완료 항목 HTML 저장")
+
+            server.recovered.set()
+            server.requests.clear()
+            counts = batch.run_batch(
+                items(), feature, "stub", output_dir, 2, base_url, settings=settings
+            )
+            expect(counts == {"done": 1, "skipped": 1, "failed": 0}, f"이어하기: {counts}")
+            expect(
+                len(server.requests) == 1 and "원" in server.requests[0],
+                "이어하기는 실패한 항목만 요청",
+            )
+
+            changed = items()
+            changed[0]["input"] += " (개정)"
+            counts = batch.run_batch(
+                changed, feature, "stub", output_dir, 2, base_url, settings=settings
+            )
+            expect(
+                counts["done"] == 1 and counts["skipped"] == 1,
+                f"입력이 바뀐 항목만 다시 생성: {counts}",
+            )
+
+            other_settings = batch.run_settings(feature, "input", "{unit} 지도안")
+            try:
+                batch.run_batch(
+                    items("{unit} 지도안"), feature, "stub", output_dir, 2, base_url,
+                    settings=other_settings,
+                )
+                expect(False, "다른 템플릿으로 이어 실행하면 거부")
+            except batch.CheckpointMismatch:
+                expect(True, "다른 템플릿으로 이어 실행하면 거부")
+
+            counts = batch.run_batch(
+                items("{unit} 지도안"), feature, "stub", output_dir, 2, base_url,
+                settings=other_settings, restart=True,
+            )
+            expect(counts == {"done": 2, "skipped": 0, "failed": 0}, f"--restart: {counts}")
+    finally:
+        batch.BATCH_RETRY_BACKOFF_SECONDS = original_backoff
+        server.shutdown()
+    return problems
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="batch.py 로컬 API 대역 서버와 동작 확인")
+    parser.add_argument("--serve", action="store_true", help="확인 없이 대역 서버만 실행")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        server = start_stub_server(args.port)
+        print(f"대역 서버 실행 중: http://127.0.0.1:{server.server_address[1]} (Ctrl+C로 종료)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+        return 0
+
+    problems = run_check()
+    if problems:
+        print(f"\n확인 실패 {len(problems)}건")
+        return 1
+    print("\n모든 확인 통과")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,331 @@
+# ====================================================================================
+#  benchmark.py - 핫 함수 마이크로 벤치마크 (합성 데이터, 기준값 저장/비교, 오프라인 실행)
+# ====================================================================================
+#  사용법:
+#    python benchmark.py                    # 실행 후 저장된 기준값과 비교 (회귀가 있으면 종료 코드 1)
+#    python benchmark.py --save-baseline    # 현재 결과를 기준값으로 저장
+#    python benchmark.py --only build_conversation_text --repeat 10
+#
+#  긴 대화, 큰 HTML 응답, 수백 쪽 PDF, 고해상도 이미지를 매번 같은 시드로 만들어
+#  함수별 실행 시간(중앙값)과 최대 메모리(tracemalloc)를 잰다. 네트워크나 API 키 없이
+#  돌아가며, 기준값은 머신마다 다르므로 data/ 아래(저장소 제외)에 둔다.
+#  process_uploaded_files의 PDF/이미지 처리는 preprocess 프로세스 풀에서 실행되므로
+#  메모리 값은 스크립트 프로세스 쪽 사용량만 반영한다.
+
+import os
+
+# 벤치마크가 공유 캐시 DB를 건드리지 않도록 프로세스 메모리 캐시만 사용
+os.environ["DONGDONGBOT_CACHE_BACKEND"] = "memory"
+
+import io
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import statistics
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+
+import fitz  # PyMuPDF
+from PIL import Image
+from streamlit import config as streamlit_config
+from streamlit import logger as streamlit_logger
+
+from config import (
+    BENCHMARK_BASELINE_PATH,
+    BENCHMARK_MEMORY_THRESHOLD,
+    BENCHMARK_REPEAT,
+    BENCHMARK_TIME_THRESHOLD,
+)
+
+SEED = 20240601
+_WORDS = (
+    "피타고라스 정리 직각삼각형 넓이 증명 활동 모둠 학습지 탐구 질문 평가 "
+    "function button layout section header grid flex color responsive state"
+).split()
+
+
+class _FakeUploadedFile(io.BytesIO):
+    """st.file_uploader가 돌려주는 UploadedFile과 같은 인터페이스"""
+
+    def __init__(self, name: str, mime_type: str, data: bytes):
+        super().__init__(data)
+        self.name = name
+        self.type = mime_type
+
+
+# --- 합성 데이터 ---
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words))
+
+
+def make_large_html(rng: random.Random, sections: int = 1500) -> str:
+    """섹션이 많은 단일 HTML 파일 (약 0.5MB)"""
+    body = "\n".join(
+        f'    <section class="p-4 grid gap-2" id="s{i}">\n'
+        f"      <h2>{_sentence(rng, 4)}</h2>\n"
+        f"      <p>{_sentence(rng, 30)}</p>\n"
+        f"      <button onclick=\"toggle({i})\">{_sentence(rng, 2)}</button>\n"
+        f"    </section>"
+        for i in range(sections)
+    )
+    return (
+        "<!DOCTYPE html>\n<html lang=\"ko\">\n<head>\n"
+        '  <meta name="viewport" content="width=device-width, initial-scale=1.0">\n'
+        "</head>\n<body>\n  <main>\n"
+        f"{body}\n"
+        "  </main>\n  <script>function toggle(i) {}</script>\n</body>\n</html>"
+    )
+
+
+def make_long_conversation(rng: random.Random, turns: int = 200, html: str = "") -> list:
+    """
+    수업 설계처럼 긴 대화. HTML 응답은 앞쪽에 한 번만 두어 최신 HTML 탐색의 최악 경우를 만든다
+    """
+    messages = []
+    for turn in range(turns):
+        messages.append(
+            {
+                "role": "user",
+                "content": _sentence(rng, 40),
+                "context": [_sentence(rng, 400)] if turn % 10 == 0 else [],
+            }
+        )
+        if turn == 2 and html:
+            reply = f"- {_sentence(rng, 10)}\n```html\n{html}\n```"
+        else:
+            reply = (
+                f"## {_sentence(rng, 5)}\n\n{_sentence(rng, 250)}\n\n"
+                f"```python\nprint('{_sentence(rng, 6)}')\n```"
+            )
+        messages.append({"role": "assistant", "content": reply})
+    return messages
+
+
+def make_pdf(rng: random.Random, pages: int = 300, tag: str = "") -> bytes:
+    """글자가 가득 찬 여러 쪽 PDF (tag로 바이트를 바꿔 캐시를 피한다)"""
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        page.insert_textbox(
+            fitz.Rect(36, 36, 559, 806),
+            "\n".join(_sentence(rng, 8) for _ in range(40)),
+            fontname="korea",
+            fontsize=9,
+        )
+    doc.set_metadata({"title": f"benchmark {tag}"})
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def make_image(width: int = 4000, height: int = 3000) -> bytes:
+    """휴대폰 사진 크기의 JPEG"""
+    image = Image.radial_gradient("L").resize((width, height)).convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def make_stream_response(rng: random.Random, parts: int = 2000, image: bytes = b"") -> object:
+    """텍스트 파트가 많고 이미지가 하나 섞인 응답 객체"""
+    response_parts = [
+        SimpleNamespace(text=_sentence(rng, 8), inline_data=None) for _ in range(parts)
+    ]
+    if image:
+        response_parts.append(
+            SimpleNamespace(
+                text=None, inline_data=SimpleNamespace(data=image, mime_type="image/jpeg")
+            )
+        )
+    content = SimpleNamespace(parts=response_parts)
+    return SimpleNamespace(candidates=[SimpleNamespace(content=content)])
+
+
+# --- 벤치마크 대상 ---
+
+
+def _cases() -> dict:
+    """이름 → (setup, run). setup은 반복마다 호출되며 측정에서 제외된다"""
+    import utils
+    import chat_engine
+
+    rng = random.Random(SEED)
+    html = make_large_html(rng)
+    conversation = make_long_conversation(rng, html=html)
+    image_bytes = make_image()
+    response = make_stream_response(rng, image=image_bytes)
+    pdf_counter = iter(range(1_000_000))
+
+    def pdf_files():
+        # 반복마다 다른 바이트 → PDF 추출/검색 색인 캐시를 거치지 않는 첫 업로드 경로
+        pdf = make_pdf(random.Random(SEED), tag=str(next(pdf_counter)))
+        return ([_FakeUploadedFile("textbook.pdf", "application/pdf", pdf)],)
+
+    return {
+        "extract_latest_html_code": (
+            lambda: (conversation,),
+            utils.extract_latest_html_code,
+        ),
+        "extract_latest_html_code_large_reply": (
+            lambda: ([{"role": "assistant", "content": f"```html\n{html}\n```"}],),
+            utils.extract_latest_html_code,
+        ),
+        "build_conversation_text": (
+            lambda: (conversation,),
+            utils.build_conversation_text,
+        ),
+        "build_request_contents": (
+            lambda: (conversation,),
+            chat_engine.build_request_contents,
+        ),
+        "extract_response_parts": (
+            lambda: (response,),
+            chat_engine.extract_response_parts,
+        ),
+        "process_uploaded_files_pdf": (
+            pdf_files,
+            lambda files: utils.process_uploaded_files(files, "피타고라스 정리 증명 활동"),
+        ),
+        "process_uploaded_files_image": (
+            lambda: ([_FakeUploadedFile("photo.jpg", "image/jpeg", image_bytes)],),
+            utils.process_uploaded_files,
+        ),
+    }
+
+
+# --- 측정 / 비교 ---
+
+
+def measure(setup, run, repeat: int) -> dict:
+    """실행 시간 중앙값(ms)과 최대 메모리(KiB). 메모리는 시간 측정과 따로 한 번 잰다"""
+    run(*setup())  # 프로세스 풀 시작, 임포트 등 첫 호출 비용 제외
+    durations = []
+    for _ in range(repeat):
+        args = setup()
+        started_at = time.perf_counter()
+        run(*args)
+        durations.append((time.perf_counter() - started_at) * 1000)
+
+    args = setup()
+    tracemalloc.start()
+    try:
+        run(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "time_ms": round(statistics.median(durations), 3),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def load_baseline(path) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def save_baseline(path, results: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+def compare(results: dict, baseline: dict, time_threshold: float, memory_threshold: float):
+    """
+    기준값 대비 비율로 상태를 정한다
+
+    Returns:
+        (표 행 목록, 회귀한 벤치마크 이름 목록)
+    """
+    rows = []
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            rows.append((name, result, None, None, None, "NEW"))
+            continue
+        time_ratio = result["time_ms"] / base["time_ms"] if base["time_ms"] else 1.0
+        memory_ratio = result["peak_kib"] / base["peak_kib"] if base["peak_kib"] else 1.0
+        regressed = time_ratio > time_threshold or memory_ratio > memory_threshold
+        if regressed:
+            regressions.append(name)
+        rows.append((name, result, base, time_ratio, memory_ratio, "REGRESSED" if regressed else "OK"))
+    return rows, regressions
+
+
+def _fmt(value, spec: str) -> str:
+    return "-" if value is None else format(value, spec)
+
+
+def format_report(rows: list) -> str:
+    header = (
+        f"{'benchmark':<38} {'time_ms':>10} {'base':>10} {'ratio':>6} "
+        f"{'peak_kib':>10} {'base':>10} {'ratio':>6}  status"
+    )
+    lines = [header, "-" * len(header)]
+    for name, result, base, time_ratio, memory_ratio, status in rows:
+        base = base or {}
+        lines.append(
+            f"{name:<38} {result['time_ms']:>10.2f} {_fmt(base.get('time_ms'), '.2f'):>10} "
+            f"{_fmt(time_ratio, '.2f'):>6} {result['peak_kib']:>10.1f} "
+            f"{_fmt(base.get('peak_kib'), '.1f'):>10} {_fmt(memory_ratio, '.2f'):>6}  {status}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="동동봇 핫 함수 마이크로 벤치마크")
+    parser.add_argument("--only", action="append", help="실행할 벤치마크 이름 (여러 번 지정 가능)")
+    parser.add_argument("--repeat", type=int, default=BENCHMARK_REPEAT)
+    parser.add_argument("--baseline", default=str(BENCHMARK_BASELINE_PATH))
+    parser.add_argument("--save-baseline", action="store_true", help="결과를 기준값으로 저장")
+    parser.add_argument("--time-threshold", type=float, default=BENCHMARK_TIME_THRESHOLD)
+    parser.add_argument("--memory-threshold", type=float, default=BENCHMARK_MEMORY_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    cases = _cases()
+    # 스크립트 밖에서 st.* 를 호출할 때마다 나오는 경고와 앱 로그가 결과 표를 가리지 않게 한다
+    # (설정 파일을 처음 읽을 때 로그 레벨이 다시 정해지므로 먼저 읽어 둔다)
+    streamlit_config.get_option("logger.level")
+    streamlit_logger.set_log_level("error")
+    logging.getLogger("dongdongbot").setLevel(logging.WARNING)
+    unknown = set(args.only or ()) - set(cases)
+    if unknown:
+        parser.error(f"알 수 없는 벤치마크: {', '.join(sorted(unknown))}")
+
+    results = {}
+    for name, (setup, run) in cases.items():
+        if args.only and name not in args.only:
+            continue
+        print(f"running {name} ...", file=sys.stderr)
+        results[name] = measure(setup, run, args.repeat)
+
+    baseline_path = Path(args.baseline)
+    baseline = load_baseline(baseline_path)
+    rows, regressions = compare(results, baseline, args.time_threshold, args.memory_threshold)
+    print(format_report(rows))
+
+    if args.save_baseline:
+        save_baseline(baseline_path, {**baseline, **results})
+        print(f"\n기준값 저장: {baseline_path}")
+        return 0
+    if regressions:
+        print(
+            f"\n회귀 {len(regressions)}건 (시간 ×{args.time_threshold}, 메모리 ×{args.memory_threshold} 초과): "
+            + ", ".join(regressions)
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,10 @@
 # ====================================================================================
-#  callbacks.py - 콜백 함수 (API키, 모델 변경, 지시문 변경)
+#  callbacks.py - 콜백 함수 (API키, 모델 변경, 지시문 변경, 이미지 선택, 생성 중지)
 # ====================================================================================
 
 import streamlit as st
-from config import get_prompt_for_feature
+from chat_engine import warm_up_chat_session
+from session import keep_image_variant, reset_session_for_new_chat
 
 
 def load_api_key_from_secrets(password: str) -> tuple[str | None, str | None]:
@@ -45,10 +46,7 @@ def auto_apply_api_key_on_change():
         ):
             st.session_state.api_key_configured = False
             st.session_state.current_api_key = None
-            st.session_state.chat_session = None
-            st.session_state.gemini_client = None
-            st.session_state.messages = []
-            st.session_state.summary_html = None
+            reset_session_for_new_chat()
         return
 
     api_key, error_msg = load_api_key_from_secrets(entered_password)
@@ -57,10 +55,7 @@ def auto_apply_api_key_on_change():
         st.session_state.api_key_configured = False
         st.session_state.current_api_key = None
         st.session_state.api_key_error_text = error_msg
-        st.session_state.chat_session = None
-        st.session_state.gemini_client = None
-        st.session_state.messages = []
-        st.session_state.summary_html = None
+        reset_session_for_new_chat()
         return
 
     if st.session_state.get(
@@ -71,10 +66,7 @@ def auto_apply_api_key_on_change():
     try:
         st.session_state.api_key_configured = True
         st.session_state.current_api_key = api_key
-        st.session_state.chat_session = None
-        st.session_state.gemini_client = None
-        st.session_state.messages = []
-        st.session_state.summary_html = None
+        reset_session_for_new_chat()
         st.toast("✅ API 키가 성공적으로 적용되었습니다! 새 대화를 시작합니다.")
     except Exception as e:
         st.session_state.api_key_configured = False
@@ -82,28 +74,38 @@ def auto_apply_api_key_on_change():
         st.session_state.api_key_error_text = (
             f"API 키 적용 중 오류 발생: {type(e).__name__} - {e}"
         )
-        st.session_state.chat_session = None
-        st.session_state.gemini_client = None
-        st.session_state.messages = []
-        st.session_state.summary_html = None
+        reset_session_for_new_chat()
 
 
 def reset_chat_session_on_model_change():
-    """모델 변경 시 세션 초기화 및 지시문 자동 적용 콜백"""
-    st.session_state.chat_session = None
-    st.session_state.gemini_client = None
-    st.session_state.messages = []
-    st.session_state.summary_html = None
+    """모델 변경 시 세션 초기화 콜백"""
+    reset_session_for_new_chat()
+
+    # prompt 파일이 매핑된 기능은 요청마다 레지스트리의 현재 지시문을 쓰므로 세션에
+    # 복사하지 않는다. 파일이 없는 기능을 위해 사용자 입력 지시문만 복원한다.
+    st.session_state.system_instructions = st.session_state.get(
+        "system_instructions_input", ""
+    )
+
+    # 첫 질문 전에 세션 핸들과 연결을 미리 준비
+    warm_up_chat_session()
+
 
-    selected_model = st.session_state.selected_gemini_model
+def keep_image_variant_on_click(index: int):
+    """후보 이미지 중 하나를 남기는 버튼 콜백"""
+    keep_image_variant(index)
+    st.toast("✅ 선택한 이미지만 대화에 남겼습니다.")
 
-    # config에서 해당 기능의 prompt_file 확인
-    prompt_text = get_prompt_for_feature(selected_model)
-    if prompt_text:
-        # prompt 파일이 매핑된 기능 → 자동 적용
-        st.session_state.system_instructions = prompt_text
+
+def toggle_full_image_on_click(image_key: str):
+    """대화 기록 이미지의 원본 보기/접기 버튼 콜백"""
+    expanded = st.session_state.expanded_images
+    if image_key in expanded:
+        expanded.discard(image_key)
     else:
-        # prompt 파일이 없는 기능 → 사용자 입력 지시문 복원
-        st.session_state.system_instructions = st.session_state.get(
-            "system_instructions_input", ""
-        )
+        expanded.add(image_key)
+
+
+def stop_generation_on_click():
+    """생성 중지 버튼 콜백 (실제 중단은 이어지는 rerun이 처리)"""
+    st.toast("⏹️ 답변 생성을 중지했습니다.")
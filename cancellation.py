@@ -0,0 +1,132 @@
+# ====================================================================================
+#  cancellation.py - 진행 중인 생성 중지 (중지 버튼/새 질문 입력 시 업스트림 호출 정리)
+# ====================================================================================
+#  Streamlit은 위젯 조작(중지 버튼, 새 질문 입력)이 들어오면 실행 중인 스크립트의 다음
+#  st.* 호출에서 RerunException/StopException을 던져 중단시킨다. 업스트림 호출을
+#  작업 스레드로 옮기고 기다리는 동안 주기적으로 화면을 갱신해 이 중단 지점을 만들고,
+#  중단되면 스트림을 닫은 뒤 받은 데이터까지를 GenerationCancelled로 전달한다.
+
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import RerunException, StopException, get_script_run_ctx
+
+from config import GENERATION_POLL_SECONDS, logger
+
+# 스크립트 중단 신호 (BaseException 계열이라 except Exception에 잡히지 않는다)
+STREAMLIT_INTERRUPTS = (RerunException, StopException)
+
+
+class GenerationCancelled(Exception):
+    """사용자가 생성을 중지한 경우. 그때까지 받은 텍스트/이미지를 담는다"""
+
+    def __init__(self, partial_text: str = "", images: list | None = None, interrupt=None):
+        super().__init__("생성이 중지되었습니다.")
+        self.partial_text = partial_text
+        self.images = images or []
+        # 다시 던져야 하는 Streamlit 중단 신호 (없으면 호출 측에서 st.rerun)
+        self.interrupt = interrupt
+
+
+def _close_stream(stream):
+    close = getattr(stream, "close", None)
+    if close is not None:
+        try:
+            close()
+        except Exception as e:
+            logger.warning("stream_close_failed error=%s", e)
+
+
+def _pump_stream(stream, events: queue.Queue, cancel: threading.Event):
+    try:
+        for chunk in stream:
+            if cancel.is_set():
+                break
+            events.put(("chunk", chunk))
+        events.put(("done", None))
+    except Exception as error:
+        events.put(("error", error))
+    finally:
+        # 중지된 경우 다음 청크를 받는 즉시 연결을 닫는다
+        _close_stream(stream)
+
+
+def iterate_with_ticks(stream):
+    """
+    스트림을 작업 스레드에서 읽어 청크를 내보내고, 청크가 늦으면 None을 내보낸다.
+
+    호출 측은 None을 받을 때 화면을 다시 그려 중단 지점을 만든다. 제너레이터가
+    닫히면(중단 포함) 업스트림 스트림도 닫는다.
+    """
+    events = queue.Queue()
+    cancel = threading.Event()
+    threading.Thread(target=_pump_stream, args=(stream, events, cancel), daemon=True).start()
+    try:
+        while True:
+            try:
+                kind, payload = events.get(timeout=GENERATION_POLL_SECONDS)
+            except queue.Empty:
+                yield None
+                continue
+            if kind == "chunk":
+                yield payload
+            elif kind == "error":
+                raise payload
+            else:
+                return
+    finally:
+        cancel.set()
+
+
+def run_interruptibly(func, *args, cancel_event: threading.Event | None = None, **kwargs):
+    """
+    블로킹 호출을 작업 스레드에서 실행하고 기다리는 동안 경과 시간을 표시한다.
+
+    중단되면 결과를 기다리지 않고 스크립트 스레드를 바로 돌려준다. Streamlit 스크립트
+    밖에서는 그대로 호출한다.
+
+    한계: 스트리밍이 아닌 generate_content 호출은 SDK에 취소 수단이 없어, 이미 보낸
+    업스트림 요청은 작업 스레드에서 끝까지 실행되고 호출 한도도 쓴다(결과만 버림).
+    func가 여러 호출로 이루어진 경우 cancel_event를 함께 넘기면 중단 시 이를 set하므로,
+    func는 아직 보내지 않은 호출을 건너뛸 수 있다.
+    """
+    if get_script_run_ctx() is None:
+        return func(*args, **kwargs)
+
+    future = Future()
+
+    def target():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(func(*args, **kwargs))
+        except BaseException as error:
+            future.set_exception(error)
+
+    threading.Thread(target=target, daemon=True).start()
+    status = st.empty()
+    started_at = time.monotonic()
+    try:
+        while True:
+            try:
+                result = future.result(timeout=GENERATION_POLL_SECONDS)
+                break
+            except FutureTimeoutError:
+                elapsed = int(time.monotonic() - started_at)
+                status.caption(f"⏳ {elapsed}초 경과 · 중지 버튼으로 멈출 수 있습니다.")
+        status.empty()
+        return result
+    except STREAMLIT_INTERRUPTS:
+        future.cancel()
+        if cancel_event is not None:
+            cancel_event.set()
+        logger.info(
+            "blocking_call_abandoned func=%s elapsed=%.1f",
+            getattr(func, "__name__", "call"),
+            time.monotonic() - started_at,
+        )
+        raise
@@ -2,18 +2,41 @@
 #  chat_engine.py - Gemini 채팅 세션 생성, 응답 처리
 # ====================================================================================
 
+import time
 import uuid
+import base64
+import hashlib
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import httpx
 import streamlit as st
 from google import genai
 from google.genai import types
 
+import attachments
+import cancellation
+import curriculum
+import hedging
+import html_patch
+import preflight
+import rate_limiter
+import single_flight
+import store
+from cancellation import STREAMLIT_INTERRUPTS, GenerationCancelled
 from config import (
-    MODEL_OPTIONS,
-    MODEL_NAME_MAP,
-    get_feature,
-    get_prompt_for_feature,
+    ATTACHMENT_REMOTE_FILES,
+    ATTACHMENT_REMOTE_MIN_BYTES,
+    CLIENT_KEEPALIVE_SECONDS,
+    GENERATION_POLL_SECONDS,
+    IMAGE_VARIANT_CONCURRENCY,
+    IMAGE_VARIANT_GRID_COLUMNS,
+    SESSION_WARMUP,
+    WARMUP_MIN_INTERVAL_SECONDS,
     logger,
 )
+from feature_registry import get_registry
+from utils import extract_latest_html_code
 
 
 def extract_response_parts(response) -> tuple[str, list]:
@@ -43,51 +66,159 @@ def resolve_runtime_model() -> tuple[str, str, str | None, str]:
     Returns:
         (model_label, model_name, api_key, project_type)
     """
-    selected_label = st.session_state.get("selected_gemini_model", MODEL_OPTIONS[0])
+    registry = get_registry()
+    selected_label = st.session_state.get("selected_gemini_model", registry.default.label)
     paid_api_key = st.session_state.get("current_api_key")
-    feature = get_feature(selected_label)
-    feature_type = feature.get("type", "free")
+    feature = registry.get(selected_label)
 
-    if feature_type == "paid_or_free":
+    if feature.type == "paid_or_free":
         if paid_api_key and st.session_state.get("api_key_configured", False):
-            return selected_label, MODEL_NAME_MAP[selected_label], paid_api_key, "paid"
+            return feature.label, feature.model, paid_api_key, "paid"
         # 유료키 없으면 무료 모델로 폴백
-        free_label = MODEL_OPTIONS[0]
+        free_feature = registry.default
         return (
-            free_label,
-            MODEL_NAME_MAP[free_label],
+            free_feature.label,
+            free_feature.model,
             st.secrets.get("default_api_key"),
             "free",
         )
 
-    if feature_type == "paid_only":
+    if feature.is_paid_only:
         if paid_api_key and st.session_state.get("api_key_configured", False):
-            return selected_label, MODEL_NAME_MAP[selected_label], paid_api_key, "paid"
-        return selected_label, MODEL_NAME_MAP[selected_label], None, "paid"
+            return feature.label, feature.model, paid_api_key, "paid"
+        return feature.label, feature.model, None, "paid"
 
     # free 타입
-    free_label = MODEL_OPTIONS[0]
+    free_feature = registry.default
     return (
-        free_label,
-        MODEL_NAME_MAP[free_label],
+        free_feature.label,
+        free_feature.model,
         st.secrets.get("default_api_key"),
         "free",
     )
 
 
+@st.cache_resource(show_spinner=False)
+def get_client(api_key: str) -> genai.Client:
+    """API 키별로 재사용하는 genai 클라이언트 (프로세스 전역 풀)"""
+    # 미리 열어 둔 연결이 첫 질문까지 남아 있도록 keep-alive를 늘린다
+    return genai.Client(
+        api_key=api_key,
+        http_options=types.HttpOptions(
+            client_args={"limits": httpx.Limits(keepalive_expiry=CLIENT_KEEPALIVE_SECONDS)}
+        ),
+    )
+
+
+def _load_message_image(image_item: dict) -> bytes | None:
+    if image_item.get("data"):
+        return base64.b64decode(image_item["data"])
+    if image_item.get("ref"):
+        return store.safe_call(store.load_image_blob, image_item["ref"])
+    return None
+
+
+def _load_message_context(message: dict) -> list[str]:
+    """첨부 텍스트 목록. 세션 메모리 상한으로 저장소에 내보낸 경우 참조로 다시 읽는다"""
+    if message.get("context") is not None:
+        return message["context"]
+    if message.get("context_ref"):
+        return store.safe_call(store.load_text_blob, message["context_ref"]) or []
+    return []
+
+
+def _with_restored_context(messages: list) -> list:
+    """저장소로 내보낸 첨부 텍스트를 채운 요청용 메시지 목록 (세션 히스토리는 그대로)"""
+    return [
+        {**message, "context": _load_message_context(message)}
+        if "context" not in message and message.get("context_ref")
+        else message
+        for message in messages
+    ]
+
+
+def _file_item_part(item: dict, resolve_file=None) -> types.Part | None:
+    """
+    이미지/첨부 파일 항목 → 요청 Part
+
+    resolve_file이 있으면 업로드해 둔 원격 파일 URI를 쓰고, 작은 파일이거나 업로드할 수
+    없으면 바이트를 그대로 넣는다. 원격 핸들이 캐시에 있으면 원본을 읽지 않는다.
+    """
+    mime_type = item.get("mime_type", "image/png")
+    loaded = []
+
+    def load_bytes():
+        if not loaded:
+            loaded.append(_load_message_image(item))
+        return loaded[0]
+
+    if resolve_file is not None:
+        digest = item.get("ref")
+        if digest is None and load_bytes():
+            if len(load_bytes()) >= ATTACHMENT_REMOTE_MIN_BYTES:
+                digest = store.content_digest(load_bytes())
+        if digest:
+            part = resolve_file(digest, mime_type, load_bytes, item.get("name", ""))
+            if part is not None:
+                return part
+
+    data = load_bytes()
+    return types.Part.from_bytes(data=data, mime_type=mime_type) if data else None
+
+
+def build_request_contents(messages: list, resolve_file=None) -> list[types.Content]:
+    """
+    세션 메시지(단일 정본 히스토리)로부터 모델 요청용 contents를 만든다.
+
+    사용자 메시지의 첨부 텍스트(context), 첨부 파일(attachments), 이미지도 함께
+    포함하며, 오류 안내 메시지는 모델 히스토리에서 제외한다. resolve_file은
+    attachments.make_part_resolver로 만든 원격 파일 조회 함수다.
+    """
+    contents = []
+    for msg in messages:
+        if msg.get("is_error"):
+            continue
+        parts = []
+        if msg.get("content"):
+            parts.append(types.Part.from_text(text=msg["content"]))
+        for context_text in _load_message_context(msg):
+            parts.append(types.Part.from_text(text=context_text))
+        for item in (msg.get("attachments") or []) + (msg.get("images") or []):
+            if item.get("evicted"):
+                continue
+            part = _file_item_part(item, resolve_file)
+            if part is not None:
+                parts.append(part)
+        if parts:
+            contents.append(
+                types.Content(
+                    role="model" if msg["role"] == "assistant" else "user",
+                    parts=parts,
+                )
+            )
+    return contents
+
+
 def create_chat_session(
     model_label: str,
     model_name: str,
     api_key: str,
     project_type: str,
-    history_messages: list,
 ):
-    """Gemini 채팅 세션을 생성"""
+    """
+    요청에 필요한 클라이언트/모델/설정을 묶은 채팅 세션 핸들을 생성
+
+    히스토리는 핸들에 복사하지 않고 매 요청마다 st.session_state.messages에서
+    만들기 때문에 세션 재생성 비용이 없다.
+    """
     if not api_key:
         return None, None
 
-    # config 기반으로 지시문 결정
-    prompt_text = get_prompt_for_feature(model_label)
+    # 지시문/구성 방식은 실제 호출 모델이 아니라 사용자가 고른 기능을 따른다 (무료 폴백 포함)
+    registry = get_registry()
+    selected_feature = registry.get(st.session_state.get("selected_gemini_model", model_label))
+    prompt_text = selected_feature.prompt_text
+    # 지시문 파일이 없는 기능만 사용자가 입력한 지시문을 쓴다
     system_instructions = (
         prompt_text if prompt_text else st.session_state.get("system_instructions", "")
     )
@@ -96,23 +227,24 @@ def create_chat_session(
         system_instruction=system_instructions if system_instructions.strip() else None
     )
 
-    client = genai.Client(api_key=api_key)
-    gemini_history = [
-        types.Content(
-            role="model" if msg["role"] == "assistant" else "user",
-            parts=[types.Part.from_text(text=msg["content"])],
-        )
-        for msg in history_messages
-    ]
+    client = get_client(api_key)
     logger.info(
         "chat_session_created project=%s model=%s", project_type, model_name
     )
     st.session_state.active_project_type = project_type
     st.session_state.active_model_label = model_label
 
-    chat = client.chats.create(
-        model=model_name, config=config, history=gemini_history
-    )
+    chat = {
+        "client": client,
+        "model_name": model_name,
+        "config": config,
+        "api_key": api_key,
+        # 기능별 설정(입력 한도 등)은 무료 폴백 중에도 사용자가 고른 기능 기준
+        "feature_label": selected_feature.label,
+        "sectioned_prompt": selected_feature.sectioned_prompt,
+        # 지시문 파일이 바뀌면(핫 리로드) 다음 요청부터 새 지시문을 쓰기 위해 기록
+        "prompt_digest": selected_feature.prompt_digest if prompt_text else None,
+    }
     return client, chat
 
 
@@ -125,8 +257,7 @@ def initialize_chat_session():
         try:
             model_label, model_name, api_key, project_type = resolve_runtime_model()
             if not api_key:
-                feature = get_feature(model_label)
-                if feature.get("type") != "paid_only":
+                if not get_registry().get(model_label).is_paid_only:
                     st.error(
                         "⚠️ 서버(secrets.toml)에 무료 모델용 'default_api_key'가 설정되지 않았습니다."
                     )
@@ -137,7 +268,6 @@ def initialize_chat_session():
                 model_name,
                 api_key,
                 project_type,
-                st.session_state.get("messages", []),
             )
             st.session_state.gemini_client = client
             st.session_state.chat_session = chat
@@ -151,14 +281,179 @@ def initialize_chat_session():
     return st.session_state.get("chat_session")
 
 
-def send_chat_response(chat, content_parts: list, model_label: str) -> tuple[str, list]:
-    """채팅 메시지를 전송하고 응답을 처리"""
-    feature = get_feature(model_label)
-    is_image_model = feature.get("type") == "paid_only" and "image" in feature.get("model", "")
+def generate_image_variants(
+    chat, model_name: str, contents: list, request_config, count: int
+) -> tuple[str, list]:
+    """
+    같은 요청으로 이미지 count장을 동시에 생성하고, 끝나는 순서대로 격자에 표시
+
+    동시 호출 수는 IMAGE_VARIANT_CONCURRENCY로 제한하고 호출마다 API 키 한도를
+    확보한다. 일부만 실패하면 성공한 이미지만 반환하고, 모두 실패하면 첫 오류를 던진다.
+    중지되면 남은 호출을 취소하고 그때까지 받은 이미지를 GenerationCancelled로 전달한다.
+
+    Returns:
+        (첫 번째로 받은 설명 텍스트, [(image_bytes, mime_type), ...]) — 이미지는 요청 순서
+    """
+    models = chat["client"].models
+    api_key = chat["api_key"]
+    columns = st.columns(min(count, IMAGE_VARIANT_GRID_COLUMNS))
+    slots = [columns[index % len(columns)].empty() for index in range(count)]
+    for slot in slots:
+        slot.caption("⏳ 이미지 생성 중...")
+
+    def generate(_index):
+        rate_limiter.acquire(api_key)
+        return extract_response_parts(
+            models.generate_content(model=model_name, contents=contents, config=request_config)
+        )
+
+    results = [None] * count
+    texts = [""] * count
+    errors = []
+    started_at = time.monotonic()
+    executor = ThreadPoolExecutor(max_workers=min(count, IMAGE_VARIANT_CONCURRENCY))
+    futures = {executor.submit(generate, index): index for index in range(count)}
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(
+                pending, timeout=GENERATION_POLL_SECONDS, return_when=FIRST_COMPLETED
+            )
+            for future in done:
+                index = futures[future]
+                try:
+                    texts[index], images = future.result()
+                except Exception as error:
+                    errors.append(error)
+                    logger.warning(
+                        "image_variant_failed index=%d error=%s", index, type(error).__name__
+                    )
+                    slots[index].caption("⚠️ 이 이미지는 생성하지 못했습니다.")
+                    continue
+                if images:
+                    results[index] = images[0]
+                    slots[index].image(images[0][0], use_container_width=True)
+                else:
+                    slots[index].caption("⚠️ 이미지 없이 응답했습니다.")
+            if not done:
+                # 경과 시간 표시 (중지 버튼이 바로 반영되는 지점)
+                elapsed = int(time.monotonic() - started_at)
+                for future in pending:
+                    slots[futures[future]].caption(f"⏳ 이미지 생성 중... {elapsed}초")
+    except STREAMLIT_INTERRUPTS as interrupt:
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise GenerationCancelled(
+            next((text for text in texts if text), ""),
+            [result for result in results if result],
+            interrupt,
+        ) from None
+    executor.shutdown(wait=False)
+
+    images = [result for result in results if result]
+    if not images and errors:
+        raise errors[0]
+    return next((text for text in texts if text), ""), images
+
+
+# (키 다이제스트, 모델) → 마지막으로 연결을 미리 연 시각
+_warmed_connections: dict[tuple[str, str], float] = {}
+_warmup_lock = threading.Lock()
+
+
+def _warm_up_in_background(client, api_key: str, model_name: str, curriculum_prompt: str | None):
+    """첫 요청 경로에서 빼낼 수 있는 준비 작업 (교육과정 색인, 업스트림 연결)"""
+    started_at = time.monotonic()
+    if curriculum_prompt:
+        curriculum.get_curriculum_index(curriculum_prompt)
+
+    warm_key = (hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16], model_name)
+    with _warmup_lock:
+        last = _warmed_connections.get(warm_key, 0.0)
+        if time.monotonic() - last < WARMUP_MIN_INTERVAL_SECONDS:
+            warm_key = None
+        else:
+            _warmed_connections[warm_key] = time.monotonic()
+    if warm_key is not None:
+        try:
+            # 생성 호출이 아닌 모델 조회로 DNS/TLS 연결만 열어 둔다 (호출 한도 미사용)
+            client.models.get(model=model_name)
+        except Exception as e:
+            logger.warning("chat_warmup_connect_failed model=%s error=%s", model_name, e)
+    logger.info(
+        "chat_warmup_done model=%s connected=%s seconds=%.2f",
+        model_name,
+        warm_key is not None,
+        time.monotonic() - started_at,
+    )
+
+
+def warm_up_chat_session():
+    """
+    기능 선택 직후 채팅 세션 핸들을 미리 만들고, 느린 준비 작업은 백그라운드로 돌린다.
+
+    첫 질문에서는 스트리밍만 하면 되도록 키 결정, 클라이언트 풀 조회, 지시문 준비,
+    업스트림 연결을 미리 해 둔다. 실패해도 initialize_chat_session이 다시 시도한다.
+    """
+    if not SESSION_WARMUP:
+        return
+    try:
+        model_label, model_name, api_key, project_type = resolve_runtime_model()
+        if not api_key:
+            return
+        client, chat = create_chat_session(model_label, model_name, api_key, project_type)
+    except Exception as e:
+        logger.warning("chat_warmup_failed error=%s", e)
+        return
+    st.session_state.gemini_client = client
+    st.session_state.chat_session = chat
+
+    curriculum_prompt = (
+        chat["config"].system_instruction if chat.get("sectioned_prompt") == "curriculum" else None
+    )
+    threading.Thread(
+        target=_warm_up_in_background,
+        args=(client, api_key, model_name, curriculum_prompt),
+        daemon=True,
+    ).start()
+
+
+def _with_patch_context(messages: list, code: str, full_output: bool = False) -> list:
+    """마지막 사용자 메시지에 현재 HTML을 붙인 요청용 메시지 목록 (세션 히스토리는 그대로)"""
+    last_message = dict(messages[-1])
+    last_message["context"] = [html_patch.build_patch_context(code, full_output)] + list(
+        last_message.get("context") or []
+    )
+    return messages[:-1] + [last_message]
+
+
+def send_chat_response(
+    chat,
+    messages: list,
+    model_label: str,
+    image_variants: int = 1,
+    patch_edit: bool = True,
+) -> tuple[str, list, str | None]:
+    """
+    히스토리(마지막 사용자 메시지 포함)로 요청을 만들어 전송하고 응답을 처리
+
+    chat 객체에 상태를 두지 않고 generate_content 계열로 매번 요청한다.
+    이미지 모델에서 image_variants가 2 이상이면 여러 장을 동시에 생성한다.
+    부분 수정 기능은 이전 HTML에 수정 블록을 적용한 전체 HTML을 세 번째 값으로 돌려주며,
+    적용에 실패하면 patch_edit=False로 전체 코드를 다시 요청한다.
+
+    Returns:
+        (응답 텍스트, 이미지 목록, 수정 블록을 적용한 HTML 또는 None)
+    """
+    registry = get_registry()
+    feature = registry.get(model_label)
+    selected_feature = registry.get(chat.get("feature_label") or model_label)
+    is_image_model = feature.is_image_model
 
     request_id = uuid.uuid4().hex[:12]
     project_type = st.session_state.get("active_project_type", "unknown")
-    model_name = MODEL_NAME_MAP.get(model_label, MODEL_NAME_MAP.get(MODEL_OPTIONS[0], ""))
+    model_name = chat["model_name"]
+    # 메모리 상한으로 내보낸 첨부 텍스트도 토큰 추정/요청에 포함되도록 먼저 채운다
+    messages = _with_restored_context(messages)
     logger.info(
         "request_started request_id=%s project=%s model=%s",
         request_id,
@@ -166,11 +461,136 @@ def send_chat_response(chat, content_parts: list, model_label: str) -> tuple[str
         model_name,
     )
 
-    response = (
-        chat.send_message(message=content_parts)
-        if is_image_model
-        else chat.send_message_stream(message=content_parts)
+    # 지시문 파일이 있는 기능은 매 요청마다 레지스트리의 현재 지시문을 쓴다 (핫 리로드 반영)
+    if (
+        selected_feature.prompt_text
+        and selected_feature.prompt_digest != chat.get("prompt_digest")
+    ):
+        chat["config"] = chat["config"].model_copy(
+            update={"system_instruction": selected_feature.prompt_text}
+        )
+        chat["prompt_digest"] = selected_feature.prompt_digest
+        logger.info(
+            "chat_prompt_reloaded request_id=%s feature=%s digest=%s",
+            request_id,
+            selected_feature.label,
+            selected_feature.prompt_digest,
+        )
+
+    request_config = chat["config"]
+    if chat.get("sectioned_prompt") == "curriculum" and request_config.system_instruction:
+        # 전체 교육과정 대신 대화와 관련된 단원 데이터만 지시문에 포함
+        request_config = request_config.model_copy(
+            update={
+                "system_instruction": curriculum.build_curriculum_instruction(
+                    request_config.system_instruction, messages
+                )
+            }
+        )
+
+    # 부분 수정: 최신 HTML을 요청에 붙이고 바뀌는 부분만 수정 블록으로 받는다
+    patch_base = None
+    request_messages = messages
+    if selected_feature.patch_edit and patch_edit and request_config.system_instruction:
+        patch_base = extract_latest_html_code(messages[:-1])
+        if patch_base:
+            request_messages = _with_patch_context(messages, patch_base)
+            request_config = request_config.model_copy(
+                update={
+                    "system_instruction": request_config.system_instruction
+                    + "\n"
+                    + html_patch.get_patch_instruction()
+                }
+            )
+
+    models = chat["client"].models
+    # 큰 첨부 파일/이미지는 한 번 올려 둔 원격 파일 URI로 보낸다
+    resolve_file = (
+        attachments.make_part_resolver(chat["client"], chat["api_key"])
+        if ATTACHMENT_REMOTE_FILES
+        else None
+    )
+    contents, preflight_report = preflight.run_preflight(
+        request_messages,
+        request_config.system_instruction,
+        preflight.get_input_budget(selected_feature),
+        lambda fitted: build_request_contents(fitted, resolve_file),
+        count_tokens=lambda contents: models.count_tokens(
+            model=model_name, contents=contents
+        ).total_tokens,
     )
+    if preflight_report["truncated_contexts"] or preflight_report["dropped_messages"]:
+        logger.info(
+            "request_input_trimmed request_id=%s estimated=%d sent=%d budget=%d",
+            request_id,
+            preflight_report["estimated_tokens"],
+            preflight_report["sent_tokens"],
+            preflight_report["budget"],
+        )
+        st.warning(
+            f"입력이 기능별 한도({preflight_report['budget']:,} 토큰)를 넘어 "
+            "첨부 내용 일부를 줄여서 보냈습니다. 필요한 PDF 페이지만 선택하면 더 정확해집니다.",
+            icon="✂️",
+        )
+
+    if is_image_model and image_variants > 1:
+        response_text, response_images = generate_image_variants(
+            chat, model_name, contents, request_config, image_variants
+        )
+        if response_text:
+            st.markdown(response_text)
+        logger.info(
+            "request_succeeded request_id=%s project=%s model=%s variants=%d/%d",
+            request_id,
+            project_type,
+            model_name,
+            len(response_images),
+            image_variants,
+        )
+        return response_text, response_images, None
+
+    if is_image_model:
+        rate_limiter.acquire(chat["api_key"])
+        try:
+            # 단일 호출이라 중지하면 결과만 버린다 (이미 보낸 요청은 취소할 수 없음)
+            response = cancellation.run_interruptibly(
+                models.generate_content,
+                model=model_name,
+                contents=contents,
+                config=request_config,
+            )
+        except STREAMLIT_INTERRUPTS as interrupt:
+            raise GenerationCancelled(interrupt=interrupt) from None
+    else:
+
+        def open_stream():
+            if feature.hedging:
+                # 첫 청크가 늦으면 형제 모델로 한 번 더 요청하고 먼저 온 스트림 사용
+                return hedging.hedged_stream(
+                    lambda target_model: models.generate_content_stream(
+                        model=target_model, contents=contents, config=request_config
+                    ),
+                    model_name,
+                    feature.hedge_model,
+                    chat["api_key"],
+                    request_id,
+                )
+            rate_limiter.acquire(chat["api_key"])
+            return models.generate_content_stream(
+                model=model_name, contents=contents, config=request_config
+            )
+
+        if selected_feature.single_flight:
+            # 같은 키를 쓰는 다른 세션의 동일 요청이 진행 중이면 그 스트림을 함께 받는다
+            response = single_flight.coalesced_stream(
+                single_flight.request_key(
+                    chat["api_key"], model_name, request_config.system_instruction, contents
+                ),
+                open_stream,
+                request_id,
+            )
+        else:
+            response = open_stream()
 
     response_text = ""
     response_images = []
@@ -181,14 +601,54 @@ def send_chat_response(chat, content_parts: list, model_label: str) -> tuple[str
             st.markdown(response_text)
     else:
         message_placeholder = st.empty()
-        for chunk in response:
-            chunk_text = chunk.text
-            if chunk_text:
-                response_text += chunk_text
-                message_placeholder.markdown(response_text + "▌")
-        response_text = response_text.strip()
-        message_placeholder.markdown(response_text)
-        _, response_images = extract_response_parts(response)
+        chunks = cancellation.iterate_with_ticks(response)
+        try:
+            for chunk in chunks:
+                if chunk is None:
+                    # 청크가 늦을 때도 주기적으로 다시 그려 중지/새 질문이 바로 반영되게 한다
+                    message_placeholder.markdown(response_text + "▌")
+                    continue
+                chunk_text = chunk.text
+                _, chunk_images = extract_response_parts(chunk)
+                response_images.extend(chunk_images)
+                if chunk_text:
+                    response_text += chunk_text
+                    message_placeholder.markdown(response_text + "▌")
+            response_text = response_text.strip()
+            message_placeholder.markdown(response_text)
+        except STREAMLIT_INTERRUPTS as interrupt:
+            chunks.close()
+            raise GenerationCancelled(response_text.strip(), response_images, interrupt) from None
+
+    artifact_html = None
+    patch_blocks = html_patch.parse_patch_blocks(response_text) if patch_base else []
+    if patch_blocks:
+        try:
+            artifact_html = html_patch.apply_patch_blocks(patch_base, patch_blocks)
+            html_patch.validate_patched_html(patch_base, artifact_html)
+        except html_patch.PatchError as e:
+            logger.warning(
+                "html_patch_failed request_id=%s blocks=%d error=%s",
+                request_id,
+                len(patch_blocks),
+                e,
+            )
+            st.info(f"수정 블록을 적용하지 못해 전체 코드를 다시 생성합니다. ({e})", icon="🔁")
+            return send_chat_response(
+                chat,
+                _with_patch_context(messages, patch_base, full_output=True),
+                model_label,
+                patch_edit=False,
+            )
+        added, removed = html_patch.count_changed_lines(patch_base, artifact_html)
+        st.caption(f"🩹 수정 블록 {len(patch_blocks)}개를 적용했습니다. (+{added}줄 / -{removed}줄)")
+        logger.info(
+            "html_patch_applied request_id=%s blocks=%d response_chars=%d html_chars=%d",
+            request_id,
+            len(patch_blocks),
+            len(response_text),
+            len(artifact_html),
+        )
 
     logger.info(
         "request_succeeded request_id=%s project=%s model=%s response_chars=%d",
@@ -197,4 +657,4 @@ def send_chat_response(chat, content_parts: list, model_label: str) -> tuple[str
         model_name,
         len(response_text),
     )
-    return response_text, response_images
+    return response_text, response_images, artifact_html
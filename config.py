@@ -1,8 +1,8 @@
 # ====================================================================================
-#  config.py - 상수, 모델 설정, prompt 설정 로딩
+#  config.py - 상수, prompt 파일 로딩
 # ====================================================================================
 
-import json
+import os
 import logging
 from pathlib import Path
 
@@ -10,55 +10,136 @@ from pathlib import Path
 BASE_DIR = Path(__file__).resolve().parent
 PROMPT_DIR = BASE_DIR / "prompt"
 CONFIG_PATH = PROMPT_DIR / "prompts_config.json"
+DATA_DIR = BASE_DIR / "data"
+
+# --- 대화 저장소 설정 ---
+STORE_DB_PATH = DATA_DIR / "conversations.db"
+SESSION_TOKEN_STORAGE_KEY = "dongdongbot_session_token"
+RESUME_WINDOW_MESSAGES = 40  # 재접속 시 불러올 최근 메시지 개수
+
+# --- 세션 메모리 한도 ---
+SESSION_MEMORY_CAP_BYTES = 48 * 1024 * 1024  # 세션당 session_state 총량 상한
+SESSION_INLINE_IMAGE_LIMIT = 4  # 원본 데이터를 메모리에 유지할 최근 이미지 수
+MEMORY_REGISTRY_TTL_SECONDS = 60 * 60  # 갱신이 없는 세션 기록 보관 시간
+
+# --- 공유 캐시 / 멀티 워커 설정 ---
+# 단일 프로세스는 "memory", 여러 워커를 띄울 때는 "sqlite"로 설정해 캐시와 호출 한도를 공유
+SHARED_CACHE_BACKEND = os.environ.get("DONGDONGBOT_CACHE_BACKEND", "memory")
+SHARED_CACHE_PATH = Path(
+    os.environ.get("DONGDONGBOT_CACHE_PATH", DATA_DIR / "shared_cache.db")
+)
+FILE_CACHE_TTL_SECONDS = 24 * 60 * 60  # PDF 추출 결과 캐시 보관 시간
+SHARED_CACHE_MEMORY_MAX_BYTES = 128 * 1024 * 1024  # memory 백엔드 상한 (넘으면 오래 안 쓴 항목부터 제거)
+SHARED_CACHE_PURGE_INTERVAL_SECONDS = 10 * 60  # sqlite 백엔드의 만료 항목 삭제 주기
+
+# --- 업로드 파일 전처리 프로세스 풀 ---
+PREPROCESS_WORKERS = int(os.environ.get("DONGDONGBOT_PREPROCESS_WORKERS", "2"))
+PREPROCESS_MAX_PENDING = 16  # 프로세스 풀에 동시에 올라갈 수 있는 작업 수
+PREPROCESS_QUEUE_WAIT_SECONDS = 5.0  # 대기열이 가득 찼을 때 자리를 기다리는 시간
+PREPROCESS_JOB_TIMEOUT_SECONDS = 60.0  # 파일 하나당 처리 제한 시간
+UPLOAD_IMAGE_MAX_SIDE = 2048  # 모델에 보낼 첨부 이미지의 최대 변 길이(px)
+
+# --- PDF 발췌 검색 (관련 부분만 전송) ---
+RETRIEVAL_MIN_CHARS = 15_000  # 이보다 짧은 PDF는 전체를 보낸다
+RETRIEVAL_CHUNK_CHARS = 1_200  # 검색 단위(청크) 최대 글자 수
+RETRIEVAL_TOP_K = 8  # 질문마다 보낼 청크 수
+RETRIEVAL_INDEX_CACHE_SIZE = 16  # 프로세스에 보관할 PDF 색인 수
+
+# --- 교육과정 지시문 단원별 구성 ---
+CURRICULUM_MAX_UNITS = 3  # 한 요청에 포함할 최대 단원 수
+CURRICULUM_QUERY_MESSAGES = 4  # 관련 단원을 찾을 때 참고할 최근 사용자 메시지 수
+
+# --- 이미지 여러 장 동시 생성 ---
+IMAGE_VARIANT_MAX_COUNT = 4  # 한 번에 만들 수 있는 최대 이미지 수
+IMAGE_VARIANT_CONCURRENCY = 2  # 요청 하나에서 동시에 보내는 이미지 생성 호출 수
+IMAGE_VARIANT_GRID_COLUMNS = 2  # 후보 이미지 격자의 열 수
+
+# --- 스트리밍 헤지 요청 (prompts_config.json의 "hedging": true 기능만) ---
+HEDGE_PERCENTILE = 95  # 첫 청크 지연이 최근 분포의 이 백분위수를 넘으면 중복 요청
+HEDGE_SAMPLE_SIZE = 200  # 모델별로 보관할 최근 첫 청크 지연 표본 수
+HEDGE_MIN_SAMPLES = 20  # 표본이 이보다 적으면 기본 기준 시간 사용
+HEDGE_DEFAULT_DELAY_SECONDS = 4.0
+HEDGE_MIN_DELAY_SECONDS = 1.0
+HEDGE_MAX_DELAY_SECONDS = 15.0
+
+# --- 기능 선택 직후 세션 미리 준비 ---
+SESSION_WARMUP = os.environ.get("DONGDONGBOT_SESSION_WARMUP", "1") != "0"
+WARMUP_MIN_INTERVAL_SECONDS = 30.0  # 같은 키/모델 연결을 다시 여는 최소 간격
+CLIENT_KEEPALIVE_SECONDS = 120.0  # 미리 연 연결을 유지하는 시간 (httpx 기본값 5초)
+
+# --- 생성 중지 ---
+GENERATION_POLL_SECONDS = 0.5  # 응답을 기다리는 동안 중지 요청을 확인하는 간격
+
+# --- 요청 전 입력 토큰 점검 ---
+DEFAULT_INPUT_TOKEN_BUDGET = 200_000  # prompts_config.json에 input_token_budget이 없을 때
+IMAGE_TOKEN_ESTIMATE = 1290  # 이미지 1장의 보수적인 입력 토큰 추정치
+TOKEN_COUNT_VERIFY_RATIO = 0.8  # 추정치가 예산의 이 비율을 넘으면 count_tokens로 확인
+
+# --- API 키별 호출 한도 (토큰 버킷) ---
+RATE_LIMIT_REQUESTS_PER_MINUTE = int(os.environ.get("DONGDONGBOT_RPM_PER_KEY", "60"))
+RATE_LIMIT_MAX_WAIT_SECONDS = 15.0  # 한도 초과 시 대기할 최대 시간
+
+# --- 기능 설정 핫 리로드 ---
+# prompt 폴더(prompts_config.json, 지시문 파일)가 바뀌면 재시작 없이 기능 설정을 다시 로딩
+FEATURE_HOT_RELOAD = os.environ.get("DONGDONGBOT_FEATURE_HOT_RELOAD", "1") != "0"
+FEATURE_RELOAD_DEBOUNCE_SECONDS = 0.5  # 저장 직후 이어지는 변경 이벤트를 모아 한 번만 리로드
+
+# --- 대화 기록 이미지 썸네일 ---
+IMAGE_THUMBNAIL_MAX_SIDE = 384  # 대화 기록에 표시할 썸네일의 최대 변 길이(px)
+IMAGE_THUMBNAIL_FORMAT = "WEBP"  # PIL 저장 형식 (WEBP, JPEG, PNG)
+IMAGE_THUMBNAIL_QUALITY = 80  # WEBP/JPEG 품질
+
+# --- 첨부 파일 원격 핸들 (Files API) ---
+ATTACHMENT_REMOTE_FILES = os.environ.get("DONGDONGBOT_REMOTE_FILES", "1") != "0"
+ATTACHMENT_REMOTE_MIN_BYTES = 256 * 1024  # 이보다 작은 파일/이미지는 요청에 그대로 넣는다
+ATTACHMENT_PDF_MAX_PAGES = 200  # 이보다 긴 PDF는 텍스트 추출 + 관련 발췌로 보낸다
+ATTACHMENT_PDF_PAGE_TOKENS = 258  # 원격 PDF 한 쪽의 입력 토큰 추정치
+ATTACHMENT_EXPIRY_MARGIN_SECONDS = 60 * 60  # 만료까지 이보다 적게 남으면 다시 올린다
+ATTACHMENT_DEFAULT_TTL_SECONDS = 47 * 60 * 60  # 응답에 만료 시각이 없을 때 (Files API 보관 48시간)
+ATTACHMENT_ACTIVE_TIMEOUT_SECONDS = 60.0  # 업로드 후 처리 완료를 기다리는 최대 시간
+ATTACHMENT_FAILURE_TTL_SECONDS = 5 * 60  # 업로드에 실패한 파일은 이 시간 동안 바로 인라인으로 보낸다
+ATTACHMENT_UPLOAD_LOCK_STRIPES = 64  # 업로드 잠금 개수 (파일마다 잠금을 만들지 않고 나눠 쓴다)
+
+# --- 긴 대화 요약 (구간별 요약 후 종합) ---
+SUMMARY_SINGLE_PASS_TOKENS = 120_000  # 대화 추정 토큰이 이 값 이하면 한 번에 요약
+SUMMARY_CHUNK_TOKENS = 30_000  # 구간 하나에 넣을 최대 추정 토큰
+SUMMARY_MAP_CONCURRENCY = 3  # 동시에 보내는 구간 요약 호출 수
+SUMMARY_CHUNK_CACHE_TTL_SECONDS = 24 * 60 * 60  # 구간 요약 캐시 보관 시간
+SUMMARY_CHUNK_PROMPT_FILE = "summarize_chunk.txt"
+
+# --- 일괄 생성 (batch.py) ---
+BATCH_OUTPUT_DIR = DATA_DIR / "batch"  # 입력 파일 이름별 결과 폴더를 만드는 위치
+BATCH_CONCURRENCY = 4  # 동시에 보내는 생성 요청 수 (API 키 호출 한도도 함께 적용)
+BATCH_MAX_RETRIES = 2  # 항목 하나당 재시도 횟수
+BATCH_RETRY_BACKOFF_SECONDS = 2.0  # 첫 재시도 대기 시간 (재시도마다 두 배)
+
+# --- 마이크로 벤치마크 (benchmark.py) ---
+BENCHMARK_BASELINE_PATH = DATA_DIR / "benchmark_baseline.json"  # 머신별 기준값이라 저장소에서 제외
+BENCHMARK_REPEAT = 5  # 함수별 반복 횟수 (중앙값 사용)
+BENCHMARK_TIME_THRESHOLD = 1.25  # 기준값 대비 실행 시간이 이 배수를 넘으면 회귀
+BENCHMARK_MEMORY_THRESHOLD = 1.25  # 기준값 대비 최대 메모리가 이 배수를 넘으면 회귀
 
 # --- 로깅 설정 ---
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("dongdongbot")
 
 
-def load_prompts_config() -> list[dict]:
-    """prompts_config.json에서 기능 목록을 로딩"""
-    try:
-        with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return data.get("features", [])
-    except (FileNotFoundError, json.JSONDecodeError) as e:
-        logger.error("prompts_config.json 로딩 실패: %s", e)
-        return []
+# 파일명 → (수정 시각, 내용). 워커마다 디스크의 같은 파일을 보므로 mtime으로만 검증
+_PROMPT_CACHE: dict[str, tuple[int, str]] = {}
 
 
 def load_prompt(filename: str) -> str:
-    """prompt 폴더에서 지시문 파일 로딩"""
+    """prompt 폴더에서 지시문 파일 로딩 (파일이 바뀌지 않았으면 캐시 사용)"""
     prompt_path = PROMPT_DIR / filename
     try:
-        return prompt_path.read_text(encoding="utf-8").strip()
+        mtime = prompt_path.stat().st_mtime_ns
+        cached = _PROMPT_CACHE.get(filename)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        text = prompt_path.read_text(encoding="utf-8").strip()
+        _PROMPT_CACHE[filename] = (mtime, text)
+        return text
     except FileNotFoundError:
         logger.warning("프롬프트 파일을 찾을 수 없습니다: %s", filename)
         return ""
 
-
-# --- 설정 데이터 빌드 ---
-FEATURES_CONFIG = load_prompts_config()
-
-# 드롭다운에 표시할 기능 레이블 목록
-MODEL_OPTIONS = [f["label"] for f in FEATURES_CONFIG]
-
-# 레이블 → 실제 모델명 매핑
-MODEL_NAME_MAP = {f["label"]: f["model"] for f in FEATURES_CONFIG}
-
-# 레이블 → 기능 설정 전체 매핑 (빠른 접근용)
-FEATURE_MAP = {f["label"]: f for f in FEATURES_CONFIG}
-
-
-def get_feature(label: str) -> dict:
-    """레이블로 기능 설정 조회, 없으면 기본 모델 설정 반환"""
-    return FEATURE_MAP.get(label, FEATURE_MAP.get(MODEL_OPTIONS[0], {}))
-
-
-def get_prompt_for_feature(label: str) -> str:
-    """기능에 매핑된 prompt 파일 내용을 반환"""
-    feature = get_feature(label)
-    prompt_file = feature.get("prompt_file")
-    if prompt_file:
-        return load_prompt(prompt_file)
-    return ""
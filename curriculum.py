@@ -0,0 +1,220 @@
+# ====================================================================================
+#  curriculum.py - 교육과정 지시문 구조화 및 대화 관련 단원만 골라 지시문 구성
+# ====================================================================================
+#  middleschoolcurriculum.txt를 한 번 파싱해 (학년 → 영역 → 단원 → 성취기준) 색인을
+#  만들고, 매 요청마다 핵심 지시문 + 대화와 관련된 단원 데이터만 system instruction으로
+#  보낸다. 관련 단원을 찾지 못하면 목차만 보낸다.
+
+import re
+from functools import lru_cache
+
+from config import CURRICULUM_MAX_UNITS, CURRICULUM_QUERY_MESSAGES
+from retrieval import Bm25Index
+
+_DOMAIN_HEADER = "# [2022 개정"
+_STANDARD_CODE_PATTERN = re.compile(r"9수\d{2}-\d{2}")
+_GRADE_PATTERN = re.compile(r"중\s*([123])|([123])\s*학년")
+
+# 2022 개정 교육과정 기준 단원별 편성 학년
+UNIT_GRADES = {
+    "소인수분해": 1,
+    "정수와 유리수": 1,
+    "문자의 사용과 식": 1,
+    "일차방정식": 1,
+    "좌표평면과 그래프": 1,
+    "기본 도형": 1,
+    "작도와 합동": 1,
+    "평면도형의 성질": 1,
+    "입체도형의 성질": 1,
+    "대푯값": 1,
+    "도수분포표와 상대도수": 1,
+    "유리수와 순환소수": 2,
+    "식의 계산": 2,
+    "일차부등식": 2,
+    "연립일차방정식": 2,
+    "일차함수와 그 그래프": 2,
+    "일차함수와 일차방정식의 관계": 2,
+    "삼각형과 사각형의 성질": 2,
+    "도형의 닮음": 2,
+    "피타고라스 정리": 2,
+    "경우의 수와 확률": 2,
+    "제곱근과 실수": 3,
+    "다항식의 곱셈과 인수분해": 3,
+    "이차방정식": 3,
+    "이차함수와 그 그래프": 3,
+    "삼각비": 3,
+    "원의 성질": 3,
+    "산포도": 3,
+    "상자그림과 산점도": 3,
+}
+
+
+class CurriculumIndex:
+    """파싱된 교육과정 지시문"""
+
+    def __init__(self, text: str):
+        first_domain = text.find(_DOMAIN_HEADER)
+        if first_domain < 0:
+            self.core = text.strip()
+            self.domains = []
+        else:
+            self.core = text[:first_domain].strip().rstrip("-").strip()
+            self.domains = [
+                _parse_domain(_DOMAIN_HEADER + block)
+                for block in text[first_domain:].split(_DOMAIN_HEADER)
+                if block.strip()
+            ]
+
+        # (영역 번호, 단원명) 목록과 단원 검색 색인
+        self.units = [
+            (domain_index, unit_name)
+            for domain_index, domain in enumerate(self.domains)
+            for unit_name in domain["units"]
+        ]
+        unit_documents = []
+        for domain_index, unit_name in self.units:
+            domain = self.domains[domain_index]
+            codes = _STANDARD_CODE_PATTERN.findall(domain["units"][unit_name])
+            explanations = " ".join(domain["explanations"].get(code, "") for code in codes)
+            unit_documents.append(
+                (0, f"{unit_name} {unit_name} {unit_name}\n{domain['units'][unit_name]}\n{explanations}")
+            )
+        self._unit_index = Bm25Index(unit_documents)
+
+    def match_units(self, query: str) -> list[int]:
+        """대화 내용과 관련된 단원 번호(self.units 기준) 목록"""
+        compact_query = re.sub(r"\s+", "", query)
+        grades = {
+            int(group)
+            for match in _GRADE_PATTERN.finditer(query)
+            for group in match.groups()
+            if group
+        }
+
+        explicit = []
+        for unit_id, (domain_index, unit_name) in enumerate(self.units):
+            unit_text = self.domains[domain_index]["units"][unit_name]
+            if re.sub(r"\s+", "", unit_name) in compact_query or any(
+                code in query for code in _STANDARD_CODE_PATTERN.findall(unit_text)
+            ):
+                explicit.append(unit_id)
+        if explicit:
+            return explicit[:CURRICULUM_MAX_UNITS]
+
+        scores = self._unit_index.score(query)
+        ranked = [int(i) for i in scores.argsort()[::-1] if scores[i] > 0]
+        if grades:
+            ranked = [i for i in ranked if UNIT_GRADES.get(self.units[i][1]) in grades]
+        if ranked:
+            # 가장 관련 높은 단원 점수의 절반 이상인 단원만 함께 보낸다
+            top_score = scores[ranked[0]]
+            ranked = [i for i in ranked if scores[i] >= top_score * 0.5]
+            return ranked[:CURRICULUM_MAX_UNITS]
+        if grades:
+            # 학년만 언급된 경우 그 학년 단원 전체
+            return [
+                unit_id
+                for unit_id, (_, unit_name) in enumerate(self.units)
+                if UNIT_GRADES.get(unit_name) in grades
+            ]
+        return []
+
+    def table_of_contents(self) -> str:
+        lines = ["# [교육과정 데이터 목차]"]
+        for domain in self.domains:
+            units = ", ".join(
+                f"{name}(중{UNIT_GRADES[name]})" if name in UNIT_GRADES else name
+                for name in domain["units"]
+            )
+            lines.append(f"* {domain['title']}: {units}")
+        lines.append("\n대화에서 다룰 단원이 정해지면 해당 단원의 성취기준 데이터가 함께 제공됩니다.")
+        return "\n".join(lines)
+
+    def build_instruction(self, query: str) -> str:
+        """핵심 지시문 + 관련 단원 데이터(없으면 목차)"""
+        unit_ids = self.match_units(query) if query.strip() else []
+        if not unit_ids:
+            return f"{self.core}\n\n---\n\n{self.table_of_contents()}"
+
+        selected: dict[int, list[str]] = {}
+        for unit_id in unit_ids:
+            domain_index, unit_name = self.units[unit_id]
+            selected.setdefault(domain_index, []).append(unit_name)
+
+        sections = [self.core]
+        for domain_index in sorted(selected):
+            domain = self.domains[domain_index]
+            unit_names = [name for name in domain["units"] if name in selected[domain_index]]
+            codes = [
+                code
+                for name in unit_names
+                for code in _STANDARD_CODE_PATTERN.findall(domain["units"][name])
+            ]
+            explanations = [domain["explanations"][code] for code in codes if code in domain["explanations"]]
+            parts = [
+                domain["header"],
+                domain["overview"],
+                "## 2. 성취기준 목록\n\n"
+                + "\n\n".join(f"### [{name}]\n{domain['units'][name]}" for name in unit_names),
+            ]
+            if explanations:
+                parts.append(
+                    "## 3. 성취기준 해설 (Achievement Standard Explanations)\n\n"
+                    + "\n".join(explanations)
+                )
+            parts.append(domain["considerations"])
+            sections.append("\n\n---\n\n".join(part for part in parts if part))
+        return "\n\n---\n\n".join(sections)
+
+
+def _split_sections(block: str) -> dict[str, str]:
+    """'## 1.' ~ '## 4.' 단위로 나눈다"""
+    sections = {}
+    for chunk in re.split(r"(?m)^(?=## \d\.)", block):
+        match = re.match(r"## (\d)\.", chunk)
+        if match:
+            sections[match.group(1)] = chunk.strip().rstrip("-").strip()
+    return sections
+
+
+def _parse_domain(block: str) -> dict:
+    header_line = block.strip().splitlines()[0]
+    title_match = re.search(r"\(\d\)\s*(.+?)\s*영역", header_line)
+    sections = _split_sections(block)
+
+    units = {}
+    for chunk in re.split(r"(?m)^(?=### \[)", sections.get("2", "")):
+        match = re.match(r"### \[(.+?)\]\s*\n", chunk)
+        if match:
+            units[match.group(1)] = chunk[match.end():].strip()
+
+    explanations = {}
+    for chunk in re.split(r"(?m)^(?=\* \*\*\[)", sections.get("3", "")):
+        match = re.match(r"\* \*\*\[(9수\d{2}-\d{2}) 해설\]", chunk)
+        if match:
+            explanations[match.group(1)] = chunk.strip()
+
+    return {
+        "header": header_line.strip(),
+        "title": title_match.group(1) if title_match else header_line.strip("# "),
+        "overview": sections.get("1", ""),
+        "units": units,
+        "explanations": explanations,
+        "considerations": sections.get("4", ""),
+    }
+
+
+@lru_cache(maxsize=4)
+def get_curriculum_index(text: str) -> CurriculumIndex:
+    """지시문 텍스트별로 한 번만 파싱"""
+    return CurriculumIndex(text)
+
+
+def build_curriculum_instruction(prompt_text: str, messages: list) -> str:
+    """최근 사용자 메시지를 기준으로 교육과정 지시문을 구성"""
+    user_texts = [
+        message.get("content", "")
+        for message in messages
+        if message.get("role") == "user"
+    ][-CURRICULUM_QUERY_MESSAGES:]
+    return get_curriculum_index(prompt_text).build_instruction("\n".join(user_texts))
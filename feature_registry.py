@@ -0,0 +1,270 @@
+# ====================================================================================
+#  feature_registry.py - 기능 설정 레지스트리 (검증/불변 객체 + prompts_config.json 핫 리로드)
+# ====================================================================================
+#  prompts_config.json과 지시문 파일을 한 번 읽어 검증된 불변 Feature 객체로 만들고,
+#  요청 경로에서 매번 계산하던 값(이미지 모델 여부, 미리보기 여부, 지시문 다이제스트)을
+#  미리 계산해 둔다. prompt 폴더가 바뀌면 watchdog로 감지해 새 레지스트리를 만든 뒤
+#  참조 하나만 교체하므로, 요청 중에는 항상 완전한 이전 또는 새 레지스트리를 보게 된다.
+
+import json
+import hashlib
+import threading
+
+from config import (
+    CONFIG_PATH,
+    FEATURE_HOT_RELOAD,
+    FEATURE_RELOAD_DEBOUNCE_SECONDS,
+    PROMPT_DIR,
+    load_prompt,
+    logger,
+)
+
+FEATURE_TYPES = ("free", "paid_or_free", "paid_only")
+_WATCHED_SUFFIXES = (".json", ".txt")
+_CHANGE_EVENTS = ("created", "modified", "moved", "deleted")
+
+
+class FeatureConfigError(Exception):
+    """prompts_config.json 내용이 올바르지 않은 경우"""
+
+
+class Feature:
+    """기능 하나의 설정 (생성 후 변경 불가)"""
+
+    __slots__ = (
+        "label",
+        "model",
+        "type",
+        "description",
+        "prompt_file",
+        "prompt_text",
+        "prompt_digest",
+        "guide_file",
+        "guide_button_label",
+        "summarize_prompt_file",
+        "sectioned_prompt",
+        "input_token_budget",
+        "hedging",
+        "hedge_model",
+        "single_flight",
+        "patch_edit",
+        "has_html_preview",
+        "has_summary_export",
+        "has_preview",
+        "is_free",
+        "is_paid_only",
+        "is_image_model",
+    )
+
+    def __init__(self, raw: dict, prompt_text: str = ""):
+        values = {
+            "label": raw["label"],
+            "model": raw["model"],
+            "type": raw.get("type", "free"),
+            "description": raw.get("description") or "",
+            "prompt_file": raw.get("prompt_file") or None,
+            "prompt_text": prompt_text,
+            "prompt_digest": (
+                hashlib.sha256(prompt_text.encode("utf-8")).hexdigest()[:16]
+                if prompt_text
+                else None
+            ),
+            "guide_file": raw.get("guide_file") or "",
+            "guide_button_label": raw.get("guide_button_label") or "📖 배포 가이드 확인",
+            "summarize_prompt_file": raw.get("summarize_prompt_file") or "",
+            "sectioned_prompt": raw.get("sectioned_prompt") or None,
+            "input_token_budget": raw.get("input_token_budget"),
+            "hedging": bool(raw.get("hedging", False)),
+            # 헤지 요청을 보낼 형제 모델 (없으면 같은 모델로 한 번 더)
+            "hedge_model": raw.get("hedge_model") or raw["model"],
+            # 동시에 들어온 동일 요청을 하나의 업스트림 스트림으로 합칠지 여부
+            "single_flight": bool(raw.get("single_flight", False)),
+            # 이전 HTML이 있으면 전체 재생성 대신 SEARCH/REPLACE 블록으로 수정받을지 여부
+            "patch_edit": bool(raw.get("patch_edit", False)),
+            "has_html_preview": bool(raw.get("has_html_preview", False)),
+            "has_summary_export": bool(raw.get("has_summary_export", False)),
+        }
+        # 프론트엔드 개발처럼 별도 HTML 미리보기 섹션을 두는 기능 (요약 내보내기 기능은 제외)
+        values["has_preview"] = values["has_html_preview"] and not values["has_summary_export"]
+        values["is_free"] = values["type"] == "free"
+        values["is_paid_only"] = values["type"] == "paid_only"
+        values["is_image_model"] = values["is_paid_only"] and "image" in values["model"]
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"Feature는 변경할 수 없습니다: {name}")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"Feature는 변경할 수 없습니다: {name}")
+
+    def __repr__(self) -> str:
+        return f"Feature(label={self.label!r}, model={self.model!r}, type={self.type!r})"
+
+
+class FeatureRegistry:
+    """기능 목록 전체 (생성 후 변경 불가, 리로드 시 통째로 교체)"""
+
+    __slots__ = ("features", "options", "by_label", "default")
+
+    def __init__(self, features: tuple[Feature, ...]):
+        object.__setattr__(self, "features", features)
+        object.__setattr__(self, "options", tuple(f.label for f in features))
+        object.__setattr__(self, "by_label", {f.label: f for f in features})
+        object.__setattr__(self, "default", features[0])
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"FeatureRegistry는 변경할 수 없습니다: {name}")
+
+    def get(self, label: str) -> Feature:
+        """레이블로 기능 조회, 없으면 기본(첫 번째) 기능"""
+        return self.by_label.get(label, self.default)
+
+
+def _validate_feature(raw, index: int, seen_labels: set):
+    if not isinstance(raw, dict):
+        raise FeatureConfigError(f"features[{index}]는 객체여야 합니다.")
+    for key in ("label", "model"):
+        if not isinstance(raw.get(key), str) or not raw[key].strip():
+            raise FeatureConfigError(f"features[{index}].{key}가 비어 있습니다.")
+    label = raw["label"]
+    if label in seen_labels:
+        raise FeatureConfigError(f"중복된 기능 레이블: {label}")
+    seen_labels.add(label)
+    if raw.get("type", "free") not in FEATURE_TYPES:
+        raise FeatureConfigError(f"{label}: 알 수 없는 type {raw.get('type')!r}")
+    budget = raw.get("input_token_budget")
+    if budget is not None and (
+        isinstance(budget, bool) or not isinstance(budget, int) or budget <= 0
+    ):
+        raise FeatureConfigError(f"{label}: input_token_budget은 양의 정수여야 합니다.")
+    for key in ("prompt_file", "guide_file", "summarize_prompt_file"):
+        filename = raw.get(key)
+        if filename and not (PROMPT_DIR / filename).is_file():
+            raise FeatureConfigError(f"{label}: {key} 파일이 없습니다 ({filename})")
+
+
+def build_registry() -> FeatureRegistry:
+    """prompts_config.json과 지시문 파일을 읽어 검증된 레지스트리를 만든다"""
+    try:
+        with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise FeatureConfigError(f"prompts_config.json 로딩 실패: {e}") from e
+
+    raw_features = data.get("features") if isinstance(data, dict) else None
+    if not isinstance(raw_features, list) or not raw_features:
+        raise FeatureConfigError("prompts_config.json에 features 목록이 없습니다.")
+
+    seen_labels = set()
+    for index, raw in enumerate(raw_features):
+        _validate_feature(raw, index, seen_labels)
+    known_models = {raw["model"] for raw in raw_features}
+    for raw in raw_features:
+        if raw.get("hedge_model") and raw["hedge_model"] not in known_models:
+            raise FeatureConfigError(
+                f"{raw['label']}: hedge_model은 prompts_config.json에 있는 모델이어야 합니다."
+            )
+
+    features = []
+    for raw in raw_features:
+        prompt_text = load_prompt(raw["prompt_file"]) if raw.get("prompt_file") else ""
+        features.append(Feature(raw, prompt_text))
+    return FeatureRegistry(tuple(features))
+
+
+_registry: FeatureRegistry | None = None
+_registry_lock = threading.Lock()
+_observer = None
+_reload_timer: threading.Timer | None = None
+
+
+def reload_registry() -> bool:
+    """레지스트리를 다시 만들어 교체. 검증에 실패하면 기존 레지스트리를 유지"""
+    global _registry
+    try:
+        registry = build_registry()
+    except FeatureConfigError as e:
+        logger.error("feature_registry_reload_failed error=%s", e)
+        return False
+    with _registry_lock:
+        _registry = registry
+    logger.info("feature_registry_reloaded features=%d", len(registry.features))
+    return True
+
+
+def _schedule_reload():
+    """저장 한 번에 이벤트가 여러 개 오므로 마지막 이벤트 뒤 잠시 기다렸다 리로드"""
+    global _reload_timer
+    with _registry_lock:
+        if _reload_timer is not None:
+            _reload_timer.cancel()
+        _reload_timer = threading.Timer(FEATURE_RELOAD_DEBOUNCE_SECONDS, reload_registry)
+        _reload_timer.daemon = True
+        _reload_timer.start()
+
+
+def _start_watcher():
+    """prompt 폴더 변경 감시 시작 (프로세스당 한 번)"""
+    global _observer
+    if not FEATURE_HOT_RELOAD or _observer is not None:
+        return
+    try:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+    except ImportError:
+        logger.warning("feature_registry_watch_disabled reason=watchdog_missing")
+        return
+
+    class _PromptDirHandler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            # 리로드 중 파일을 읽을 때 생기는 opened/closed 이벤트는 무시
+            if event.is_directory or event.event_type not in _CHANGE_EVENTS:
+                return
+            # 편집기는 임시 파일에 쓰고 이름을 바꾸는 경우가 많아 이동 대상 경로도 확인
+            paths = (event.src_path, getattr(event, "dest_path", "") or "")
+            if any(str(path).endswith(_WATCHED_SUFFIXES) for path in paths):
+                _schedule_reload()
+
+    try:
+        observer = Observer()
+        observer.daemon = True
+        observer.schedule(_PromptDirHandler(), str(PROMPT_DIR), recursive=False)
+        observer.start()
+    except OSError as e:
+        logger.warning("feature_registry_watch_disabled error=%s", e)
+        return
+    _observer = observer
+
+
+def get_registry() -> FeatureRegistry:
+    """현재 레지스트리 (처음 호출 시 로딩하고 변경 감시를 시작)"""
+    global _registry
+    registry = _registry
+    if registry is not None:
+        return registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = build_registry()
+            _start_watcher()
+        return _registry
+
+
+def get_feature(label: str) -> Feature:
+    """레이블로 기능 설정 조회, 없으면 기본 모델 설정 반환"""
+    return get_registry().get(label)
+
+
+def get_model_options() -> tuple[str, ...]:
+    """드롭다운에 표시할 기능 레이블 목록"""
+    return get_registry().options
+
+
+def get_model_name(label: str) -> str:
+    """레이블 → 실제 모델명 (없으면 기본 모델)"""
+    return get_registry().get(label).model
+
+
+def get_prompt_for_feature(label: str) -> str:
+    """기능에 매핑된 prompt 파일 내용을 반환"""
+    return get_registry().get(label).prompt_text
@@ -0,0 +1,201 @@
+# ====================================================================================
+#  hedging.py - 스트리밍 응답 헤지 요청 (첫 청크 지연 시 중복 요청, 먼저 온 쪽 사용)
+# ====================================================================================
+#  가끔 느린 업스트림 응답 때문에 첫 토큰이 늦어지면 학생들이 다시 보내 부하가 더
+#  커진다. 헤지를 켠 기능은 최근 첫 청크 지연 분포의 백분위수를 기준 시간으로 삼아,
+#  그 안에 첫 청크가 오지 않으면 같은 요청(또는 형제 모델)을 한 번 더 보내고 먼저
+#  청크를 만든 스트림을 쓴다. 진 쪽은 다음 청크를 받는 즉시 스트림을 닫는다.
+
+import time
+import queue
+import threading
+from collections import deque
+
+import rate_limiter
+from config import (
+    HEDGE_DEFAULT_DELAY_SECONDS,
+    HEDGE_MAX_DELAY_SECONDS,
+    HEDGE_MIN_DELAY_SECONDS,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_PERCENTILE,
+    HEDGE_SAMPLE_SIZE,
+    logger,
+)
+from shared_cache import get_shared_cache
+
+_STATS_NAMESPACE = "hedge_stats"
+_STATS_TTL_SECONDS = 7 * 24 * 60 * 60
+
+# 모델별 최근 첫 청크 지연(초). 기준 시간은 워커 자신의 관측값으로 정한다
+_latencies: dict[str, deque] = {}
+_latency_lock = threading.Lock()
+
+
+def record_first_chunk_latency(model_name: str, seconds: float):
+    with _latency_lock:
+        samples = _latencies.setdefault(model_name, deque(maxlen=HEDGE_SAMPLE_SIZE))
+        samples.append(seconds)
+
+
+def get_hedge_delay(model_name: str) -> float:
+    """첫 청크 지연의 HEDGE_PERCENTILE 백분위수 (표본이 적으면 기본값)"""
+    with _latency_lock:
+        samples = sorted(_latencies.get(model_name) or ())
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY_SECONDS
+    rank = min(len(samples) - 1, int(len(samples) * HEDGE_PERCENTILE / 100))
+    return min(max(samples[rank], HEDGE_MIN_DELAY_SECONDS), HEDGE_MAX_DELAY_SECONDS)
+
+
+def _record_stats(model_name: str, hedged: bool, hedge_won: bool):
+    def bump(stats):
+        stats = dict(stats or {"requests": 0, "hedged": 0, "hedge_wins": 0})
+        stats["requests"] += 1
+        stats["hedged"] += int(hedged)
+        stats["hedge_wins"] += int(hedge_won)
+        return stats, None
+
+    try:
+        get_shared_cache().update(_STATS_NAMESPACE, model_name, bump, ttl=_STATS_TTL_SECONDS)
+    except Exception as e:
+        logger.warning("hedge_stats_failed error=%s", e)
+
+
+def get_hedge_stats(model_names) -> list[dict]:
+    """모델별 헤지 통계 (요청 수, 헤지 비율, 헤지 승리 비율, 현재 기준 시간)"""
+    rows = []
+    cache = get_shared_cache()
+    for model_name in model_names:
+        stats = cache.get(_STATS_NAMESPACE, model_name)
+        if not stats:
+            continue
+        rows.append(
+            {
+                "model": model_name,
+                "requests": stats["requests"],
+                "hedged": stats["hedged"],
+                "hedge_rate": stats["hedged"] / stats["requests"] if stats["requests"] else 0.0,
+                "hedge_wins": stats["hedge_wins"],
+                "hedge_win_rate": stats["hedge_wins"] / stats["hedged"] if stats["hedged"] else 0.0,
+                "delay_seconds": get_hedge_delay(model_name),
+            }
+        )
+    return rows
+
+
+def _run_attempt(index: int, start_stream, events: queue.Queue, cancel: threading.Event):
+    """스트림 하나를 열어 청크를 events로 전달 (취소되면 스트림을 닫고 종료)"""
+    try:
+        stream = start_stream()
+        try:
+            for chunk in stream:
+                if cancel.is_set():
+                    break
+                events.put((index, "chunk", chunk))
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+        events.put((index, "done", None))
+    except Exception as error:
+        events.put((index, "error", error))
+
+
+def hedged_stream(start_stream, model_name: str, hedge_model: str, api_key: str, request_id: str):
+    """
+    첫 청크가 기준 시간 안에 오지 않으면 hedge_model로 한 번 더 요청하고,
+    먼저 청크를 만든 스트림의 청크를 그대로 내보내는 제너레이터
+
+    Args:
+        start_stream: 모델명 → 스트림 이터레이터를 여는 함수
+    """
+    events = queue.Queue()
+    cancels = []
+    models = []
+
+    def launch(target_model: str):
+        cancel = threading.Event()
+        cancels.append(cancel)
+        models.append(target_model)
+        threading.Thread(
+            target=_run_attempt,
+            args=(len(models) - 1, lambda: start_stream(target_model), events, cancel),
+            daemon=True,
+        ).start()
+
+    started_at = time.monotonic()
+    delay = get_hedge_delay(model_name)
+    rate_limiter.acquire(api_key)
+    launch(model_name)
+
+    winner = None
+    first_chunk = None
+    can_hedge = True
+    finished = set()
+    errors = []
+    try:
+        while winner is None:
+            timeout = None
+            if can_hedge and len(models) == 1:
+                timeout = max(delay - (time.monotonic() - started_at), 0)
+            try:
+                index, kind, payload = events.get(timeout=timeout)
+            except queue.Empty:
+                try:
+                    # 헤지 요청은 키 한도가 남아 있을 때만 보낸다
+                    rate_limiter.acquire(api_key, max_wait=0)
+                except rate_limiter.RateLimitExceeded:
+                    can_hedge = False
+                    continue
+                logger.info(
+                    "hedge_launched request_id=%s model=%s hedge_model=%s delay=%.2f",
+                    request_id,
+                    model_name,
+                    hedge_model,
+                    delay,
+                )
+                launch(hedge_model)
+                continue
+
+            if kind == "chunk":
+                winner, first_chunk = index, payload
+                break
+            finished.add(index)
+            if kind == "error":
+                errors.append(payload)
+            if len(finished) == len(models):
+                # 보낸 요청이 모두 청크 없이 끝남
+                if errors:
+                    raise errors[0]
+                return
+
+        for index, cancel in enumerate(cancels):
+            if index != winner:
+                cancel.set()
+
+        first_chunk_seconds = time.monotonic() - started_at
+        record_first_chunk_latency(model_name, first_chunk_seconds)
+        hedged = len(models) > 1
+        _record_stats(model_name, hedged, winner == 1)
+        logger.info(
+            "hedge_result request_id=%s hedged=%s winner=%s first_chunk_seconds=%.2f",
+            request_id,
+            hedged,
+            models[winner] if winner == 0 else f"hedge:{models[winner]}",
+            first_chunk_seconds,
+        )
+
+        yield first_chunk
+        while True:
+            index, kind, payload = events.get()
+            if index != winner:
+                continue
+            if kind == "chunk":
+                yield payload
+            elif kind == "error":
+                raise payload
+            else:
+                return
+    finally:
+        for cancel in cancels:
+            cancel.set()
@@ -0,0 +1,149 @@
+# ====================================================================================
+#  html_patch.py - 생성된 HTML 부분 수정 (SEARCH/REPLACE 블록 적용 및 검증)
+# ====================================================================================
+#  "버튼 색 바꿔줘" 같은 후속 요청마다 전체 HTML을 다시 생성하지 않도록, 최신 HTML을
+#  서버에 두고 모델에는 바꿀 부분만 SEARCH/REPLACE 블록으로 받는다. 블록을 적용할 수
+#  없거나 결과 HTML 구조가 깨지면 호출 측이 전체 재생성으로 되돌아간다.
+
+import re
+import difflib
+from html.parser import HTMLParser
+
+from config import load_prompt
+
+PATCH_PROMPT_FILE = "html_patch.txt"
+
+_PATCH_BLOCK_PATTERN = re.compile(
+    r"<{7} ?SEARCH[^\n]*\n(.*?)\n={7}[^\n]*\n(.*?)>{7} ?REPLACE", re.DOTALL
+)
+
+# 닫는 태그가 없는 요소
+_VOID_ELEMENTS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr",
+}
+_REQUIRED_MARKERS = ("<html", "</html>", "<body", "</body>")
+
+
+class PatchError(Exception):
+    """수정 블록을 적용할 수 없거나 적용 결과가 올바른 HTML이 아닌 경우"""
+
+
+def parse_patch_blocks(text: str) -> list[tuple[str, str]]:
+    """응답에서 (search, replace) 블록 목록을 추출"""
+    blocks = []
+    for match in _PATCH_BLOCK_PATTERN.finditer(text):
+        search, replace = match.group(1), match.group(2)
+        if replace.endswith("\n"):
+            replace = replace[:-1]
+        blocks.append((search, replace))
+    return blocks
+
+
+def _replace_by_lines(code: str, search: str, replace: str) -> str:
+    """들여쓰기/끝 공백만 다른 경우를 위해 줄 단위(양끝 공백 무시)로 찾아 바꾼다"""
+    code_lines = code.split("\n")
+    search_lines = [line.strip() for line in search.strip("\n").split("\n")]
+    stripped = [line.strip() for line in code_lines]
+    width = len(search_lines)
+    positions = [
+        start
+        for start in range(len(code_lines) - width + 1)
+        if stripped[start : start + width] == search_lines
+    ]
+    if len(positions) != 1:
+        raise PatchError(
+            "수정할 위치를 찾지 못했습니다." if not positions else "수정할 위치가 여러 곳입니다."
+        )
+    start = positions[0]
+    return "\n".join(code_lines[:start] + replace.split("\n") + code_lines[start + width :])
+
+
+def apply_patch_blocks(code: str, blocks: list[tuple[str, str]]) -> str:
+    """블록을 순서대로 적용. 위치가 없거나 여러 곳이면 PatchError"""
+    for search, replace in blocks:
+        if not search.strip():
+            raise PatchError("비어 있는 SEARCH 블록이 있습니다.")
+        occurrences = code.count(search)
+        if occurrences == 1:
+            code = code.replace(search, replace, 1)
+        elif occurrences > 1:
+            raise PatchError("수정할 위치가 여러 곳입니다.")
+        else:
+            code = _replace_by_lines(code, search, replace)
+    return code
+
+
+class _TagBalanceParser(HTMLParser):
+    """짝이 맞지 않는 태그 수를 센다"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack = []
+        self.unmatched = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in _VOID_ELEMENTS:
+            self.stack.append(tag)
+
+    def handle_endtag(self, tag):
+        if tag in _VOID_ELEMENTS:
+            return
+        if tag in self.stack:
+            # 중간에 닫히지 않은 태그는 짝이 맞지 않은 것으로 센다
+            while self.stack:
+                opened = self.stack.pop()
+                if opened == tag:
+                    break
+                self.unmatched += 1
+        else:
+            self.unmatched += 1
+
+
+def _unmatched_tags(code: str) -> int:
+    parser = _TagBalanceParser()
+    parser.feed(code)
+    parser.close()
+    return parser.unmatched + len(parser.stack)
+
+
+def validate_patched_html(original: str, patched: str):
+    """적용 결과가 원본보다 구조가 나빠지지 않았는지 확인. 문제가 있으면 PatchError"""
+    lowered_original = original.lower()
+    lowered_patched = patched.lower()
+    for marker in _REQUIRED_MARKERS:
+        if marker in lowered_original and marker not in lowered_patched:
+            raise PatchError(f"수정 후 {marker} 태그가 사라졌습니다.")
+    if _unmatched_tags(patched) > _unmatched_tags(original):
+        raise PatchError("수정 후 HTML 태그의 짝이 맞지 않습니다.")
+
+
+def count_changed_lines(original: str, patched: str) -> tuple[int, int]:
+    """(추가된 줄 수, 삭제된 줄 수)"""
+    added = removed = 0
+    for line in difflib.unified_diff(original.split("\n"), patched.split("\n"), lineterm="", n=0):
+        if line.startswith("+") and not line.startswith("+++"):
+            added += 1
+        elif line.startswith("-") and not line.startswith("---"):
+            removed += 1
+    return added, removed
+
+
+def build_patch_context(code: str, full_output: bool = False) -> str:
+    """
+    요청에 함께 보낼 현재 HTML (모델이 SEARCH 블록을 정확히 쓰도록 원문 그대로)
+
+    full_output이면 수정 블록 적용에 실패한 뒤의 재요청으로, 전체 코드를 요구한다.
+    """
+    context = f"[현재 HTML 코드]\n```html\n{code}\n```"
+    if full_output:
+        context += (
+            "\n수정 블록을 적용하지 못했습니다. 위 코드를 기준으로 요청을 반영한 "
+            "전체 코드를 ```html 코드 블록으로 출력하세요."
+        )
+    return context
+
+
+def get_patch_instruction() -> str:
+    """부분 수정 모드에서 기능 지시문 뒤에 덧붙이는 지시문"""
+    return load_prompt(PATCH_PROMPT_FILE)
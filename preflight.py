@@ -0,0 +1,185 @@
+# ====================================================================================
+#  preflight.py - 요청 전 입력 토큰 추정 및 기능별 입력 예산 적용
+# ====================================================================================
+
+import re
+
+from config import (
+    ATTACHMENT_PDF_PAGE_TOKENS,
+    DEFAULT_INPUT_TOKEN_BUDGET,
+    IMAGE_TOKEN_ESTIMATE,
+    TOKEN_COUNT_VERIFY_RATIO,
+    logger,
+)
+
+# 한글/한자/가나는 대략 글자당 1토큰, 그 외(영문, 숫자, 코드)는 4글자당 1토큰으로 본다
+_WIDE_CHAR_PATTERN = re.compile(r"[\u1100-\u11ff\u3130-\u318f\uac00-\ud7a3\u3040-\u30ff\u4e00-\u9fff]")
+
+TRUNCATION_NOTICE = "\n\n... (입력 한도를 넘어 이하 내용은 생략되었습니다) ..."
+OMITTED_CONTEXT_NOTICE = "[첨부 내용 생략: 입력 한도 초과]"
+
+
+class InputBudgetExceeded(Exception):
+    """첨부 내용을 줄여도 기능별 입력 예산 안에 들어오지 않는 경우"""
+
+
+def estimate_text_tokens(text: str) -> int:
+    """API 호출 없이 텍스트의 토큰 수를 빠르게 추정"""
+    if not text:
+        return 0
+    wide = len(_WIDE_CHAR_PATTERN.findall(text))
+    return wide + (len(text) - wide + 3) // 4
+
+
+def estimate_message_tokens(message: dict) -> int:
+    """메시지 하나(본문 + 첨부 텍스트 + 첨부 파일 + 이미지)의 추정 토큰 수"""
+    if message.get("is_error"):
+        return 0
+    tokens = estimate_text_tokens(message.get("content", ""))
+    tokens += sum(estimate_text_tokens(text) for text in message.get("context") or [])
+    tokens += ATTACHMENT_PDF_PAGE_TOKENS * sum(
+        attachment.get("pages", 1) for attachment in message.get("attachments") or []
+    )
+    tokens += IMAGE_TOKEN_ESTIMATE * len(
+        [image for image in message.get("images") or [] if not image.get("evicted")]
+    )
+    return tokens
+
+
+def estimate_request_tokens(messages: list, system_instruction: str | None) -> int:
+    """지시문 + 전체 히스토리의 추정 토큰 수"""
+    return estimate_text_tokens(system_instruction or "") + sum(
+        estimate_message_tokens(message) for message in messages
+    )
+
+
+def get_input_budget(feature) -> int:
+    """prompts_config.json의 input_token_budget (없으면 기본값)"""
+    return int(feature.input_token_budget or DEFAULT_INPUT_TOKEN_BUDGET)
+
+
+def _truncate_text(text: str, max_tokens: int) -> str:
+    """추정 토큰 비율만큼 앞부분만 남긴다"""
+    tokens = estimate_text_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    keep_chars = int(len(text) * max_tokens / tokens)
+    return text[:keep_chars] + TRUNCATION_NOTICE
+
+
+def fit_messages_to_budget(
+    messages: list, system_instruction: str | None, budget: int
+) -> tuple[list, dict]:
+    """
+    요청에 쓸 메시지 목록을 입력 예산 안으로 줄인다. 원본 메시지는 변경하지 않는다.
+
+    1. 오래된 메시지부터 첨부 텍스트(context)를 생략하고, 마지막 사용자 메시지의
+       첨부 텍스트는 남은 예산만큼 앞부분만 남긴다.
+    2. 그래도 넘으면 마지막 사용자 메시지를 제외한 메시지의 첨부 파일을 생략한다.
+    3. 그래도 넘으면 마지막 사용자 메시지를 제외한 오래된 메시지를 뺀다.
+
+    Returns:
+        (요청용 메시지 목록, 보고서 dict)
+    """
+    estimated = estimate_request_tokens(messages, system_instruction)
+    report = {
+        "budget": budget,
+        "estimated_tokens": estimated,
+        "sent_tokens": estimated,
+        "truncated_contexts": 0,
+        "dropped_messages": 0,
+    }
+    if estimated <= budget:
+        return messages, report
+
+    fitted = [dict(message) for message in messages]
+    total = estimated
+    with_context = [i for i, message in enumerate(fitted) if message.get("context")]
+    for position, index in enumerate(with_context):
+        if total <= budget:
+            break
+        message = fitted[index]
+        context_tokens = sum(estimate_text_tokens(text) for text in message["context"])
+        is_latest = position == len(with_context) - 1
+        excess = total - budget
+        if is_latest and context_tokens > excess:
+            keep = context_tokens - excess
+            shortened = []
+            for text in message["context"]:
+                text_tokens = estimate_text_tokens(text)
+                share = int(keep * text_tokens / context_tokens)
+                shortened.append(
+                    _truncate_text(text, max(share - estimate_text_tokens(TRUNCATION_NOTICE), 0))
+                )
+            message["context"] = shortened
+        else:
+            message["context"] = [OMITTED_CONTEXT_NOTICE]
+        total = estimate_request_tokens(fitted, system_instruction)
+        report["truncated_contexts"] += 1
+
+    last_user_index = max(
+        (i for i, message in enumerate(fitted) if message["role"] == "user"), default=-1
+    )
+    for index, message in enumerate(fitted[:last_user_index]):
+        if total <= budget:
+            break
+        if message.get("attachments"):
+            message["attachments"] = []
+            message["context"] = list(message.get("context") or []) + [OMITTED_CONTEXT_NOTICE]
+            total = estimate_request_tokens(fitted, system_instruction)
+            report["truncated_contexts"] += 1
+
+    while total > budget and last_user_index > 0:
+        fitted.pop(0)
+        last_user_index -= 1
+        report["dropped_messages"] += 1
+        total = estimate_request_tokens(fitted, system_instruction)
+
+    if total > budget:
+        raise InputBudgetExceeded(
+            f"입력이 너무 깁니다. (예상 {total:,} 토큰 / 한도 {budget:,} 토큰) "
+            "질문이나 지시문을 줄여서 다시 시도해주세요."
+        )
+    report["sent_tokens"] = total
+    return fitted, report
+
+
+def run_preflight(
+    messages: list,
+    system_instruction: str | None,
+    budget: int,
+    build_contents,
+    count_tokens=None,
+) -> tuple[list, dict]:
+    """
+    요청 전 점검: 로컬 추정으로 예산을 맞추고, 예산에 가까우면 count_tokens로 재확인
+
+    Args:
+        build_contents: 메시지 목록 → 요청 contents 변환 함수
+        count_tokens: contents → 실제 토큰 수 (선택, 지시문 제외)
+
+    Returns:
+        (요청 contents, 보고서 dict)
+    """
+    fitted, report = fit_messages_to_budget(messages, system_instruction, budget)
+    contents = build_contents(fitted)
+
+    if count_tokens is None or report["sent_tokens"] < budget * TOKEN_COUNT_VERIFY_RATIO:
+        return contents, report
+
+    try:
+        actual = count_tokens(contents) + estimate_text_tokens(system_instruction or "")
+    except Exception as e:
+        logger.warning("count_tokens_failed error=%s", e)
+        return contents, report
+
+    report["verified_tokens"] = actual
+    if actual > budget:
+        # 추정이 실제보다 낮았던 비율만큼 예산을 좁혀 다시 맞춘다
+        scaled_budget = int(budget * report["sent_tokens"] / actual)
+        fitted, rescaled = fit_messages_to_budget(messages, system_instruction, scaled_budget)
+        rescaled["budget"] = budget
+        rescaled["verified_tokens"] = actual
+        report = rescaled
+        contents = build_contents(fitted)
+    return contents, report
@@ -0,0 +1,267 @@
+# ====================================================================================
+#  preprocess.py - 업로드 파일 전처리 프로세스 풀 (PDF 텍스트 추출, 이미지 축소, 썸네일)
+# ====================================================================================
+#  CPU를 많이 쓰는 fitz/PIL 작업을 Streamlit 스크립트 스레드 밖의 별도 프로세스에서
+#  실행해 다른 세션의 rerun이 GIL 경합으로 멈추지 않게 한다. 입력/출력은 파이프로
+#  pickle 하지 않고 임시 파일 경로로 주고받는다. (spawn 방식이므로 streamlit 미임포트)
+
+import os
+import time
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from config import (
+    IMAGE_THUMBNAIL_FORMAT,
+    IMAGE_THUMBNAIL_MAX_SIDE,
+    IMAGE_THUMBNAIL_QUALITY,
+    PREPROCESS_JOB_TIMEOUT_SECONDS,
+    PREPROCESS_MAX_PENDING,
+    PREPROCESS_QUEUE_WAIT_SECONDS,
+    PREPROCESS_WORKERS,
+    UPLOAD_IMAGE_MAX_SIDE,
+    logger,
+)
+
+
+# 추출된 PDF 텍스트의 페이지 경계 (페이지 선택에 사용)
+PDF_PAGE_SEPARATOR = "\f"
+
+
+class PreprocessQueueFull(Exception):
+    """전처리 대기열이 가득 차서 작업을 받을 수 없는 경우"""
+
+
+# --- 워커 프로세스에서 실행되는 작업 함수 ---
+
+
+def _pdf_text_job(in_path: str, out_path: str) -> int:
+    """PDF 텍스트를 페이지 구분자(PDF_PAGE_SEPARATOR)로 나눠 out_path에 쓰고 페이지 수를 반환"""
+    with fitz.open(in_path) as doc, open(out_path, "w", encoding="utf-8") as out:
+        for index, page in enumerate(doc):
+            if index:
+                out.write(PDF_PAGE_SEPARATOR)
+            out.write(page.get_text().replace(PDF_PAGE_SEPARATOR, "\n"))
+        return doc.page_count
+
+
+def _image_job(in_path: str, out_path: str, max_side: int) -> tuple[str, str]:
+    """
+    이미지를 검증하고 필요하면 max_side 이하로 축소
+
+    Returns:
+        (결과 파일 경로, mime_type) — 축소가 필요 없으면 입력 파일을 그대로 사용
+    """
+    with Image.open(in_path) as image:
+        image_format = image.format or "PNG"
+        mime_type = Image.MIME.get(image_format, "image/png")
+        if max(image.size) <= max_side:
+            image.verify()
+            return in_path, mime_type
+        image.thumbnail((max_side, max_side))
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.save(out_path, format=image_format)
+        return out_path, mime_type
+
+
+def _thumbnail_job(in_path: str, out_path: str, max_side: int) -> tuple[str, str]:
+    """대화 기록 표시용 썸네일을 out_path에 쓰고 (결과 파일 경로, mime_type)을 반환"""
+    with Image.open(in_path) as image:
+        image.thumbnail((max_side, max_side))
+        if IMAGE_THUMBNAIL_FORMAT == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.save(out_path, format=IMAGE_THUMBNAIL_FORMAT, quality=IMAGE_THUMBNAIL_QUALITY)
+    return out_path, Image.MIME.get(IMAGE_THUMBNAIL_FORMAT, "image/png")
+
+
+# --- 메인 프로세스 측 ---
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(PREPROCESS_MAX_PENDING)
+
+
+def _get_executor() -> ProcessPoolExecutor | None:
+    global _executor
+    if PREPROCESS_WORKERS <= 0:
+        return None
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(
+                    max_workers=PREPROCESS_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _executor
+
+
+def _recycle_executor(executor: ProcessPoolExecutor):
+    """
+    멈춘 작업이 있는 풀을 버리고 워커 프로세스를 종료한다 (다음 제출 때 새 풀 생성)
+
+    실행 중인 작업은 future.cancel()로 멈출 수 없어 워커와 대기열 자리를 계속 잡고
+    있으므로 프로세스째 정리한다. 같은 풀의 다른 작업은 BrokenProcessPool이나 취소로
+    끝나며, PendingJob.result가 남은 시간 안에서 새 풀에 다시 제출한다.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is not executor:
+            return  # 이미 다른 작업이 정리한 풀
+        _executor = None
+    processes = list((getattr(executor, "_processes", None) or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+    logger.warning("preprocess_pool_recycled workers=%d", len(processes))
+
+
+def _write_temp(data: bytes, suffix: str) -> str:
+    fd, path = tempfile.mkstemp(prefix="dongdong_in_", suffix=suffix)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    return path
+
+
+def _new_temp_path(suffix: str) -> str:
+    fd, path = tempfile.mkstemp(prefix="dongdong_out_", suffix=suffix)
+    os.close(fd)
+    return path
+
+
+def _remove_files(*paths: str):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _submit_to_pool(executor: ProcessPoolExecutor, func, *args) -> Future:
+    """대기열 자리를 얻어 작업을 제출 (자리는 작업이 끝나면 반납)"""
+    if not _slots.acquire(timeout=PREPROCESS_QUEUE_WAIT_SECONDS):
+        raise PreprocessQueueFull("파일 처리 대기열이 가득 찼습니다. 잠시 후 다시 시도해주세요.")
+    try:
+        future = executor.submit(func, *args)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _f: _slots.release())
+    return future
+
+
+class PendingJob:
+    """프로세스 풀에 제출된 전처리 작업 하나"""
+
+    def __init__(
+        self, kind: str, future: Future, in_path: str, out_path: str, executor=None, task=None
+    ):
+        self.kind = kind
+        self.future = future
+        self.submitted_at = time.monotonic()
+        self._in_path = in_path
+        self._out_path = out_path
+        self._executor = executor
+        # 풀이 교체되어 중단된 경우 다시 제출할 (func, *args)
+        self._task = task
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def _cleanup(self, _future=None):
+        _remove_files(self._in_path, self._out_path)
+
+    def _wait(self, timeout: float):
+        while True:
+            remaining = max(self.submitted_at + timeout - time.monotonic(), 0)
+            try:
+                return self.future.result(timeout=remaining)
+            except (BrokenProcessPool, CancelledError):
+                if self._task is None or remaining <= 0:
+                    raise
+                # 다른 작업의 시간 초과로 풀이 정리된 경우 한 번만 다시 제출
+                self._executor = _get_executor()
+                self.future = _submit_to_pool(self._executor, *self._task)
+                self._task = None
+                logger.info("preprocess_job_resubmitted kind=%s", self.kind)
+
+    def result(self, timeout: float = PREPROCESS_JOB_TIMEOUT_SECONDS):
+        """
+        작업 결과를 반환. pdf는 추출 텍스트(str), image/thumbnail은 (bytes, mime_type)
+
+        제한 시간은 제출 시점부터 세므로 여러 파일을 차례로 기다려도 전체 대기는
+        timeout 안팎이다. 넘기면 실행 중인 워커를 정리하고 concurrent.futures.TimeoutError를
+        던진다.
+        """
+        try:
+            value = self._wait(timeout)
+            if self.kind == "pdf":
+                with open(self._out_path, "r", encoding="utf-8") as f:
+                    return f.read()
+            result_path, mime_type = value
+            with open(result_path, "rb") as f:
+                return f.read(), mime_type
+        except FutureTimeoutError:
+            if not self.future.cancel() and self._executor is not None:
+                _recycle_executor(self._executor)
+            logger.warning(
+                "preprocess_job_timeout kind=%s seconds=%.1f",
+                self.kind,
+                time.monotonic() - self.submitted_at,
+            )
+            raise
+        finally:
+            if self.future.done():
+                self._cleanup()
+            else:
+                # 정리 중인 작업은 끝난 뒤 임시 파일을 정리
+                self.future.add_done_callback(self._cleanup)
+
+
+def _submit(kind: str, func, data: bytes, suffix: str, *args) -> PendingJob:
+    in_path = _write_temp(data, suffix)
+    out_path = _new_temp_path(suffix)
+    executor = _get_executor()
+
+    if executor is None:
+        future = Future()
+        try:
+            future.set_result(func(in_path, out_path, *args))
+        except Exception as e:
+            future.set_exception(e)
+        return PendingJob(kind, future, in_path, out_path)
+
+    task = (func, in_path, out_path, *args)
+    try:
+        future = _submit_to_pool(executor, *task)
+    except Exception:
+        _remove_files(in_path, out_path)
+        raise
+    return PendingJob(kind, future, in_path, out_path, executor, task)
+
+
+def count_pdf_pages(pdf_bytes: bytes) -> int:
+    """PDF 쪽수 (텍스트를 추출하지 않으므로 스크립트 스레드에서 바로 호출)"""
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        return doc.page_count
+
+
+def submit_pdf_text(pdf_bytes: bytes) -> PendingJob:
+    """PDF 텍스트 추출 작업 제출"""
+    return _submit("pdf", _pdf_text_job, pdf_bytes, ".pdf")
+
+
+def submit_image(image_bytes: bytes, suffix: str = "") -> PendingJob:
+    """이미지 검증/축소 작업 제출"""
+    return _submit("image", _image_job, image_bytes, suffix, UPLOAD_IMAGE_MAX_SIDE)
+
+
+def submit_thumbnail(image_bytes: bytes) -> PendingJob:
+    """대화 기록 표시용 썸네일 작업 제출"""
+    return _submit("thumbnail", _thumbnail_job, image_bytes, "", IMAGE_THUMBNAIL_MAX_SIDE)
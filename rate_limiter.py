@@ -0,0 +1,66 @@
+# ====================================================================================
+#  rate_limiter.py - API 키별 호출 한도 (공유 캐시 기반 토큰 버킷)
+# ====================================================================================
+
+import time
+import hashlib
+
+from config import (
+    RATE_LIMIT_MAX_WAIT_SECONDS,
+    RATE_LIMIT_REQUESTS_PER_MINUTE,
+    logger,
+)
+from shared_cache import get_shared_cache
+
+_NAMESPACE = "rate_limit"
+
+
+class RateLimitExceeded(Exception):
+    """API 키 호출 한도를 기다려도 확보하지 못한 경우"""
+
+
+def _bucket_key(api_key: str) -> str:
+    # 키 원문은 캐시에 남기지 않는다
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:32]
+
+
+def _try_take(api_key: str, cost: float) -> float:
+    """
+    버킷에서 cost만큼 토큰을 꺼낸다.
+
+    Returns:
+        0.0이면 성공, 양수면 토큰이 찰 때까지 기다려야 하는 초
+    """
+    capacity = float(RATE_LIMIT_REQUESTS_PER_MINUTE)
+    refill_per_second = capacity / 60.0
+
+    def take(bucket):
+        now = time.time()
+        if bucket is None:
+            bucket = {"tokens": capacity, "updated_at": now}
+        tokens = min(
+            capacity, bucket["tokens"] + (now - bucket["updated_at"]) * refill_per_second
+        )
+        if tokens >= cost:
+            return {"tokens": tokens - cost, "updated_at": now}, 0.0
+        return {"tokens": tokens, "updated_at": now}, (cost - tokens) / refill_per_second
+
+    return get_shared_cache().update(_NAMESPACE, _bucket_key(api_key), take, ttl=120)
+
+
+def acquire(api_key: str, cost: float = 1.0, max_wait: float = RATE_LIMIT_MAX_WAIT_SECONDS):
+    """호출 한도 토큰을 확보할 때까지 대기. max_wait를 넘기면 RateLimitExceeded"""
+    if not api_key or RATE_LIMIT_REQUESTS_PER_MINUTE <= 0:
+        return
+    deadline = time.monotonic() + max_wait
+    while True:
+        wait_seconds = _try_take(api_key, cost)
+        if wait_seconds <= 0:
+            return
+        remaining = deadline - time.monotonic()
+        if wait_seconds > remaining:
+            logger.warning("rate_limit_exceeded key=%s", _bucket_key(api_key)[:8])
+            raise RateLimitExceeded(
+                "요청이 많아 잠시 후 다시 시도해주세요. (사용 키 호출 한도 초과)"
+            )
+        time.sleep(wait_seconds)
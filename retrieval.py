@@ -0,0 +1,141 @@
+# ====================================================================================
+#  retrieval.py - 업로드 PDF 로컬 검색 색인 (페이지/문단 청크 + NumPy BM25)
+# ====================================================================================
+
+import re
+import math
+import threading
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+from config import RETRIEVAL_CHUNK_CHARS, RETRIEVAL_INDEX_CACHE_SIZE, RETRIEVAL_TOP_K
+
+# 한글 단어는 조사/어미 변화에 강하도록 글자 2-gram으로, 그 외는 단어 단위로 색인
+_TOKEN_PATTERN = re.compile(r"[\uac00-\ud7a3]+|[a-z0-9]+|[\u4e00-\u9fff]")
+_HANGUL_PATTERN = re.compile(r"[\uac00-\ud7a3]")
+
+_BM25_K1 = 1.5
+_BM25_B = 0.75
+
+
+def tokenize(text: str) -> list[str]:
+    """검색용 토큰 분리"""
+    tokens = []
+    for word in _TOKEN_PATTERN.findall(text.lower()):
+        if _HANGUL_PATTERN.match(word) and len(word) > 1:
+            tokens.extend(word[i : i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+def chunk_pages(pages: list[str], max_chars: int = RETRIEVAL_CHUNK_CHARS) -> list[tuple[int, str]]:
+    """
+    페이지 텍스트를 문단 단위로 나누고 max_chars 이하로 묶는다
+
+    Returns:
+        [(페이지 번호(1부터), 청크 텍스트), ...]
+    """
+    chunks = []
+    for page_number, page_text in enumerate(pages, start=1):
+        buffer = ""
+        for paragraph in re.split(r"\n\s*\n", page_text):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            if buffer and len(buffer) + len(paragraph) + 1 > max_chars:
+                chunks.append((page_number, buffer))
+                buffer = ""
+            while len(paragraph) > max_chars:
+                chunks.append((page_number, paragraph[:max_chars]))
+                paragraph = paragraph[max_chars:]
+            buffer = f"{buffer}\n{paragraph}" if buffer else paragraph
+        if buffer:
+            chunks.append((page_number, buffer))
+    return chunks
+
+
+class Bm25Index:
+    """청크 목록에 대한 BM25 색인 (용어별 posting 배열로 희소 저장, PDF 청크와 교육과정 단원에 공용)"""
+
+    def __init__(self, chunks: list[tuple[int, str]]):
+        self.chunks = chunks
+        postings: dict[str, tuple[list[int], list[int]]] = {}
+        doc_lengths = []
+        for chunk_id, (_, text) in enumerate(chunks):
+            counts = Counter(tokenize(text))
+            doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                ids, tfs = postings.setdefault(term, ([], []))
+                ids.append(chunk_id)
+                tfs.append(tf)
+
+        self._doc_lengths = np.asarray(doc_lengths, dtype=np.float32)
+        self._avg_length = float(self._doc_lengths.mean()) if chunks else 0.0
+        self._postings = {
+            term: (np.asarray(ids, dtype=np.int32), np.asarray(tfs, dtype=np.float32))
+            for term, (ids, tfs) in postings.items()
+        }
+
+    def score(self, query: str) -> np.ndarray:
+        """청크별 BM25 점수"""
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        if not self.chunks:
+            return scores
+        length_norm = _BM25_K1 * (
+            1 - _BM25_B + _BM25_B * self._doc_lengths / max(self._avg_length, 1.0)
+        )
+        n_docs = len(self.chunks)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            ids, tfs = posting
+            idf = math.log(1 + (n_docs - len(ids) + 0.5) / (len(ids) + 0.5))
+            scores[ids] += idf * tfs * (_BM25_K1 + 1) / (tfs + length_norm[ids])
+        return scores
+
+    def search(self, query: str, top_k: int = RETRIEVAL_TOP_K) -> list[int]:
+        """질문과 관련도가 높은 청크 번호를 점수 순으로 반환"""
+        if not self.chunks:
+            return []
+        scores = self.score(query)
+        n_docs = len(self.chunks)
+        if not scores.any():
+            # 겹치는 단어가 없으면 앞부분을 보낸다
+            return list(range(min(top_k, n_docs)))
+        k = min(top_k, n_docs)
+        top = np.argpartition(-scores, k - 1)[:k]
+        return [int(i) for i in top[np.argsort(-scores[top])] if scores[i] > 0]
+
+
+_index_cache: OrderedDict[str, Bm25Index] = OrderedDict()
+_index_lock = threading.Lock()
+
+
+def get_pdf_index(digest: str, pages: list[str]) -> Bm25Index:
+    """PDF 다이제스트별로 색인을 만들어 재사용 (LRU)"""
+    with _index_lock:
+        index = _index_cache.get(digest)
+        if index is not None:
+            _index_cache.move_to_end(digest)
+            return index
+
+    index = Bm25Index(chunk_pages(pages))
+    with _index_lock:
+        _index_cache[digest] = index
+        while len(_index_cache) > RETRIEVAL_INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
+
+
+def select_relevant_excerpts(
+    digest: str, pages: list[str], question: str, top_k: int = RETRIEVAL_TOP_K
+) -> str:
+    """질문과 관련된 청크만 페이지 순서대로 이어 붙여 반환"""
+    index = get_pdf_index(digest, pages)
+    chunk_ids = sorted(index.search(question, top_k))
+    return "\n\n".join(
+        f"[p.{index.chunks[i][0]}]\n{index.chunks[i][1]}" for i in chunk_ids
+    )
@@ -2,14 +2,24 @@
 #  session.py - 세션 상태 초기화 & 관리
 # ====================================================================================
 
+import uuid
 import streamlit as st
-from config import MODEL_OPTIONS
+from streamlit_local_storage import LocalStorage
+
+import store
+from config import (
+    RESUME_WINDOW_MESSAGES,
+    SESSION_TOKEN_STORAGE_KEY,
+    logger,
+)
+from feature_registry import get_model_options
 
 
 def init_session_state():
     """앱 시작 시 필요한 세션 상태를 초기화"""
+    model_options = get_model_options()
     defaults = {
-        "selected_gemini_model": MODEL_OPTIONS[0] if MODEL_OPTIONS else "",
+        "selected_gemini_model": model_options[0],
         "system_instructions": "",
         "gemini_client": None,
         "api_key_configured": False,
@@ -20,14 +30,170 @@ def init_session_state():
         "active_project_type": None,
         "active_model_label": None,
         "summary_html": None,
+        "session_token": None,
+        "session_token_probed": False,
+        "conversation_id": None,
+        "conversation_next_seq": 0,
+        "conversation_resume_checked": False,
+        "unsaved_messages": [],
+        "expanded_images": set(),
+        "history_thumbnail_bytes_saved": 0,
     }
     for key, default_value in defaults.items():
         if key not in st.session_state:
             st.session_state[key] = default_value
 
-    # 선택된 모델이 유효한지 검증
-    if st.session_state.selected_gemini_model not in MODEL_OPTIONS:
-        st.session_state.selected_gemini_model = MODEL_OPTIONS[0] if MODEL_OPTIONS else ""
+    # 선택된 모델이 유효한지 검증 (설정 리로드로 기능이 빠진 경우 포함)
+    if st.session_state.selected_gemini_model not in model_options:
+        st.session_state.selected_gemini_model = model_options[0]
+
+    ensure_session_token()
+    restore_persisted_conversation()
+    flush_unsaved_messages()
+
+
+def ensure_session_token():
+    """브라우저 localStorage에 익명 세션 토큰을 보관하고 세션 상태에 반영"""
+    if st.session_state.session_token:
+        return
+
+    local_storage = LocalStorage()
+    token = local_storage.getItem(SESSION_TOKEN_STORAGE_KEY)
+    if token:
+        st.session_state.session_token = token
+        return
+
+    # 컴포넌트 값은 첫 실행에서 아직 도착하지 않을 수 있으므로 한 번은 기다린다
+    if not st.session_state.session_token_probed:
+        st.session_state.session_token_probed = True
+        return
+
+    token = uuid.uuid4().hex
+    local_storage.setItem(SESSION_TOKEN_STORAGE_KEY, token)
+    st.session_state.session_token = token
+    st.session_state.conversation_resume_checked = True
+
+
+def restore_persisted_conversation():
+    """새로고침/재접속 시 최근 대화 구간만 불러와 이어서 진행"""
+    if st.session_state.conversation_resume_checked:
+        return
+    token = st.session_state.session_token
+    if not token:
+        return
+    st.session_state.conversation_resume_checked = True
+    if st.session_state.messages:
+        return
+
+    latest = store.safe_call(store.load_latest_conversation, token)
+    if not latest:
+        return
+    conversation_id, feature_label = latest
+    loaded = store.safe_call(
+        store.load_recent_messages, conversation_id, RESUME_WINDOW_MESSAGES
+    )
+    if not loaded or not loaded[0]:
+        return
+
+    messages, next_seq = loaded
+    _drop_stale_artifacts(messages)
+    st.session_state.messages = messages
+    st.session_state.conversation_id = conversation_id
+    st.session_state.conversation_next_seq = next_seq
+    if feature_label in get_model_options():
+        st.session_state.selected_gemini_model = feature_label
+    # chat_session은 None으로 두면 initialize_chat_session이 복원된 메시지로 재생성한다
+    st.session_state.chat_session = None
+    st.session_state.gemini_client = None
+    logger.info(
+        "conversation_resumed conversation=%s messages=%d", conversation_id, len(messages)
+    )
+
+
+def _drop_stale_artifacts(messages: list):
+    """부분 수정 HTML 사본은 가장 최근 것만 세션에 남긴다 (저장소 기록은 그대로)"""
+    seen_latest = False
+    for message in reversed(messages):
+        if "artifact_html" not in message:
+            continue
+        if seen_latest:
+            del message["artifact_html"]
+        seen_latest = True
+
+
+def _persist_message(message: dict) -> bool:
+    """메시지를 현재 대화의 다음 순번으로 저장. 토큰/대화가 없거나 기록에 실패하면 False"""
+    token = st.session_state.get("session_token")
+    if not token:
+        return False
+    if not st.session_state.get("conversation_id"):
+        st.session_state.conversation_id = store.safe_call(
+            store.create_conversation,
+            token,
+            st.session_state.get("selected_gemini_model", ""),
+        )
+        st.session_state.conversation_next_seq = 0
+        if not st.session_state.conversation_id:
+            return False
+
+    seq = st.session_state.conversation_next_seq
+    if not store.safe_call(store.append_message, st.session_state.conversation_id, seq, message):
+        # 순번은 그대로 두고 보류 목록에 남겨 다음 기회에 같은 순번으로 다시 저장
+        return False
+    st.session_state.conversation_next_seq = seq + 1
+    return True
+
+
+def flush_unsaved_messages():
+    """세션 토큰이 생기기 전(첫 실행)에 받은 메시지를 순서대로 저장"""
+    unsaved = st.session_state.get("unsaved_messages")
+    while unsaved and _persist_message(unsaved[0]):
+        unsaved.pop(0)
+
+
+def append_chat_message(message: dict):
+    """
+    메시지를 세션 히스토리에 추가하고 저장소에 즉시 기록
+
+    토큰이 아직 없거나 저장소가 응답하지 않으면 보류해 두었다가 다음 기회에 저장한다.
+    """
+    st.session_state.messages.append(message)
+    if message.get("artifact_html"):
+        _drop_stale_artifacts(st.session_state.messages)
+
+    st.session_state.unsaved_messages.append(message)
+    flush_unsaved_messages()
+
+
+def replace_last_chat_message(message: dict):
+    """마지막 메시지를 교체하고 저장소의 같은 순번 기록도 덮어쓴다"""
+    previous = st.session_state.messages[-1]
+    st.session_state.messages[-1] = message
+
+    unsaved = st.session_state.get("unsaved_messages")
+    if unsaved and unsaved[-1] is previous:
+        # 아직 저장되지 않은 메시지는 보류 목록에서 교체
+        unsaved[-1] = message
+        return
+    conversation_id = st.session_state.get("conversation_id")
+    seq = st.session_state.get("conversation_next_seq", 0) - 1
+    if conversation_id and seq >= 0:
+        store.safe_call(store.append_message, conversation_id, seq, message)
+
+
+def keep_image_variant(index: int):
+    """마지막 응답의 후보 이미지 중 하나만 남기고 나머지는 히스토리에서 버린다"""
+    messages = st.session_state.get("messages") or []
+    if not messages or not messages[-1].get("variant_pending"):
+        return
+    message = dict(messages[-1])
+    images = message.get("images") or []
+    if not 0 <= index < len(images):
+        return
+    message["images"] = [images[index]]
+    message.pop("variant_pending", None)
+    replace_last_chat_message(message)
+    logger.info("image_variant_kept index=%d candidates=%d", index, len(images))
 
 
 def reset_session_for_new_chat():
@@ -36,3 +202,8 @@ def reset_session_for_new_chat():
     st.session_state.gemini_client = None
     st.session_state.messages = []
     st.session_state.summary_html = None
+    st.session_state.expanded_images = set()
+    # 다음 메시지부터 새 대화로 저장
+    st.session_state.conversation_id = None
+    st.session_state.conversation_next_seq = 0
+    st.session_state.unsaved_messages = []
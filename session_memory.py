@@ -0,0 +1,198 @@
+# ====================================================================================
+#  session_memory.py - 세션별 메모리 사용량 측정, 상한 적용, 관리자 통계
+# ====================================================================================
+
+import sys
+import time
+import threading
+import base64
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+import store
+from config import (
+    MEMORY_REGISTRY_TTL_SECONDS,
+    SESSION_INLINE_IMAGE_LIMIT,
+    SESSION_MEMORY_CAP_BYTES,
+    logger,
+)
+
+
+class _MemoryRegistry:
+    """프로세스 전체 세션의 최근 측정값을 보관"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions: dict[str, dict] = {}
+
+    def update(self, session_id: str, record: dict):
+        now = time.time()
+        with self._lock:
+            self._sessions[session_id] = {**record, "updated_at": now}
+            stale = [
+                sid
+                for sid, item in self._sessions.items()
+                if now - item["updated_at"] > MEMORY_REGISTRY_TTL_SECONDS
+            ]
+            for sid in stale:
+                del self._sessions[sid]
+
+    def top_sessions(self, limit: int) -> list[tuple[str, dict]]:
+        with self._lock:
+            items = list(self._sessions.items())
+        items.sort(key=lambda item: item[1]["total_bytes"], reverse=True)
+        return items[:limit]
+
+
+@st.cache_resource
+def _get_registry() -> _MemoryRegistry:
+    return _MemoryRegistry()
+
+
+def measure_value_bytes(value) -> int:
+    """session_state 값 하나의 대략적인 메모리 크기(바이트)"""
+    if value is None:
+        return 0
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode("utf-8", errors="ignore"))
+    if isinstance(value, dict):
+        return sum(measure_value_bytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(measure_value_bytes(v) for v in value)
+    if hasattr(value, "getbands") and hasattr(value, "size"):
+        # PIL 이미지: 디코딩된 픽셀 버퍼 기준
+        width, height = value.size
+        return width * height * len(value.getbands())
+    size = getattr(value, "size", None)
+    if isinstance(size, int):
+        # Streamlit UploadedFile
+        return size
+    return sys.getsizeof(value)
+
+
+def measure_session_state() -> dict[str, int]:
+    """현재 세션의 session_state 키별 크기"""
+    return {
+        str(key): measure_value_bytes(st.session_state[key])
+        for key in list(st.session_state.keys())
+    }
+
+
+def _iter_inline_images_oldest_first():
+    for message in st.session_state.get("messages", []):
+        for image_item in message.get("images") or []:
+            if image_item.get("data"):
+                yield image_item
+
+
+def _iter_inline_attachments():
+    for message in st.session_state.get("messages", []):
+        for attachment in message.get("attachments") or []:
+            if attachment.get("data"):
+                yield attachment
+
+
+def _offload_file_item(image_item: dict) -> int:
+    """이미지/첨부 원본을 저장소로 내보내고 세션에는 참조만 남긴다. 해제한 바이트 수 반환"""
+    freed = len(image_item.get("data") or "")
+    if not image_item.get("ref"):
+        image_item["ref"] = store.safe_call(
+            store.store_image_blob,
+            base64.b64decode(image_item["data"]),
+            image_item.get("mime_type", "image/png"),
+        )
+    if not image_item.get("ref"):
+        # 저장소에 보관하지 못하면 이미지를 제거한다
+        image_item["evicted"] = True
+    image_item.pop("data", None)
+    return freed
+
+
+def _offload_context(message: dict) -> int:
+    """
+    첨부 텍스트(context)를 저장소로 내보내고 세션에는 참조(context_ref)만 남긴다.
+    저장하지 못하면 요청에서 빠지지 않도록 그대로 둔다. 해제한 바이트 수 반환
+    """
+    context_ref = store.safe_call(store.store_text_blob, message["context"])
+    if not context_ref:
+        return 0
+    message["context_ref"] = context_ref
+    return measure_value_bytes(message.pop("context"))
+
+
+def enforce_session_memory_budget(usage: dict[str, int]) -> int:
+    """
+    세션 메모리 상한을 적용한다.
+
+    1. 첨부 파일(attachments)의 원본은 항상, 이미지는 최근 SESSION_INLINE_IMAGE_LIMIT개를
+       제외하고 저장소로 내보낸다. 요청을 만들 때 참조(ref)로 다시 읽는다.
+    2. 총량이 상한을 넘으면 나머지 이미지도 내보내고, 그래도 넘으면
+       최근 사용자 메시지를 제외한 첨부 텍스트(context)도 저장소로 내보낸다.
+       요청을 만들 때 참조(context_ref)로 다시 읽는다.
+
+    summary_html은 미리보기에 띄운 요약 문서 하나뿐이라 크기가 대화 길이와 무관해
+    정리 대상에서 뺀다.
+
+    Returns:
+        해제한 대략적인 바이트 수
+    """
+    freed = 0
+    for attachment in list(_iter_inline_attachments()):
+        freed += _offload_file_item(attachment)
+    inline_images = list(_iter_inline_images_oldest_first())
+    for image_item in inline_images[: max(len(inline_images) - SESSION_INLINE_IMAGE_LIMIT, 0)]:
+        freed += _offload_file_item(image_item)
+
+    total = sum(usage.values()) - freed
+    if total <= SESSION_MEMORY_CAP_BYTES:
+        return freed
+
+    for image_item in _iter_inline_images_oldest_first():
+        freed += _offload_file_item(image_item)
+    total = sum(usage.values()) - freed
+
+    if total > SESSION_MEMORY_CAP_BYTES:
+        # 최근 사용자 메시지를 제외한 첨부 텍스트를 저장소로 내보냄
+        user_messages = [
+            msg for msg in st.session_state.get("messages", []) if msg["role"] == "user"
+        ]
+        for message in user_messages[:-1]:
+            if message.get("context"):
+                freed += _offload_context(message)
+
+    logger.warning(
+        "session_memory_cap_enforced total_bytes=%d freed_bytes=%d", sum(usage.values()), freed
+    )
+    return freed
+
+
+def _current_session_id() -> str:
+    token = st.session_state.get("session_token")
+    if token:
+        return token
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else "unknown"
+
+
+def account_session_memory():
+    """매 실행마다 현재 세션의 메모리를 측정하고 상한을 적용한 뒤 레지스트리에 기록"""
+    usage = measure_session_state()
+    freed = enforce_session_memory_budget(usage)
+    if freed:
+        usage = measure_session_state()
+    _get_registry().update(
+        _current_session_id(),
+        {
+            "total_bytes": sum(usage.values()),
+            "by_key": usage,
+            "feature": st.session_state.get("selected_gemini_model", ""),
+            "message_count": len(st.session_state.get("messages", [])),
+        },
+    )
+
+
+def get_top_sessions_by_memory(limit: int = 20) -> list[tuple[str, dict]]:
+    """메모리 사용량 상위 세션 목록 (관리자 화면용)"""
+    return _get_registry().top_sessions(limit)
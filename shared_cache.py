@@ -0,0 +1,217 @@
+# ====================================================================================
+#  shared_cache.py - 워커 간 공유 가능한 키-값 캐시 (memory / sqlite 백엔드)
+# ====================================================================================
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from config import (
+    SHARED_CACHE_BACKEND,
+    SHARED_CACHE_MEMORY_MAX_BYTES,
+    SHARED_CACHE_PATH,
+    SHARED_CACHE_PURGE_INTERVAL_SECONDS,
+    logger,
+)
+
+
+def _approx_size(value) -> int:
+    """캐시 값의 대략적인 크기(바이트). 문자열은 글자 수로 센다"""
+    if isinstance(value, (str, bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(_approx_size(k) + _approx_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(_approx_size(v) for v in value)
+    return 16
+
+
+class MemoryCacheBackend:
+    """단일 프로세스용 캐시 (워커 간 공유 안 됨). 총량이 max_bytes를 넘으면 LRU로 제거"""
+
+    def __init__(self, max_bytes: int = SHARED_CACHE_MEMORY_MAX_BYTES):
+        self._lock = threading.Lock()
+        self._max_bytes = max_bytes
+        self._total_bytes = 0
+        # (namespace, key) → (value, expires_at, size), 최근 사용한 항목이 뒤쪽
+        self._items: OrderedDict[tuple[str, str], tuple[object, float | None, int]] = (
+            OrderedDict()
+        )
+
+    def _get_unlocked(self, namespace: str, key: str):
+        item = self._items.get((namespace, key))
+        if item is None:
+            return None
+        value, expires_at, _ = item
+        if expires_at is not None and expires_at < time.time():
+            self._delete_unlocked((namespace, key))
+            return None
+        self._items.move_to_end((namespace, key))
+        return value
+
+    def _delete_unlocked(self, item_key: tuple[str, str]):
+        _, _, size = self._items.pop(item_key)
+        self._total_bytes -= size
+
+    def _put_unlocked(self, namespace: str, key: str, value, ttl: float | None):
+        item_key = (namespace, key)
+        if item_key in self._items:
+            self._delete_unlocked(item_key)
+        size = _approx_size(key) + _approx_size(value)
+        expires_at = time.time() + ttl if ttl else None
+        self._items[item_key] = (value, expires_at, size)
+        self._total_bytes += size
+
+        evicted = 0
+        while self._total_bytes > self._max_bytes and len(self._items) > 1:
+            self._delete_unlocked(next(iter(self._items)))
+            evicted += 1
+        if evicted:
+            logger.info(
+                "shared_cache_evicted entries=%d remaining=%d bytes=%d",
+                evicted,
+                len(self._items),
+                self._total_bytes,
+            )
+
+    def get(self, namespace: str, key: str):
+        with self._lock:
+            return self._get_unlocked(namespace, key)
+
+    def set(self, namespace: str, key: str, value, ttl: float | None = None):
+        with self._lock:
+            self._put_unlocked(namespace, key, value, ttl)
+
+    def update(self, namespace: str, key: str, func, ttl: float | None = None):
+        """현재 값에 func를 적용해 원자적으로 갱신하고 func의 두 번째 반환값을 돌려준다"""
+        with self._lock:
+            new_value, result = func(self._get_unlocked(namespace, key))
+            self._put_unlocked(namespace, key, new_value, ttl)
+            return result
+
+
+class SQLiteCacheBackend:
+    """
+    로컬 SQLite(WAL) 파일을 통해 같은 서버의 여러 워커 프로세스가 공유하는 캐시
+
+    만료된 항목은 읽을 때 무시하고, 저장할 때 PURGE 주기마다 한 번씩 지운다.
+    """
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS cache (
+        namespace TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value TEXT NOT NULL,
+        expires_at REAL,
+        PRIMARY KEY (namespace, key)
+    );
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._local = threading.local()
+        self._purge_lock = threading.Lock()
+        self._last_purge = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self._path, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self._SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _read(conn: sqlite3.Connection, namespace: str, key: str):
+        row = conn.execute(
+            "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?",
+            (namespace, key),
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at < time.time():
+            return None
+        return json.loads(value)
+
+    @staticmethod
+    def _write(conn: sqlite3.Connection, namespace: str, key: str, value, ttl):
+        expires_at = time.time() + ttl if ttl else None
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) "
+            "VALUES (?, ?, ?, ?)",
+            (namespace, key, json.dumps(value, ensure_ascii=False), expires_at),
+        )
+
+    def get(self, namespace: str, key: str):
+        return self._read(self._connect(), namespace, key)
+
+    def _purge_expired(self, conn: sqlite3.Connection):
+        now = time.time()
+        with self._purge_lock:
+            if now - self._last_purge < SHARED_CACHE_PURGE_INTERVAL_SECONDS:
+                return
+            self._last_purge = now
+        deleted = conn.execute(
+            "DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at < ?", (now,)
+        ).rowcount
+        if deleted:
+            logger.info("shared_cache_purged entries=%d", deleted)
+
+    def set(self, namespace: str, key: str, value, ttl: float | None = None):
+        conn = self._connect()
+        self._write(conn, namespace, key, value, ttl)
+        self._purge_expired(conn)
+
+    def update(self, namespace: str, key: str, func, ttl: float | None = None):
+        """BEGIN IMMEDIATE 트랜잭션으로 프로세스 간 원자적 갱신"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            new_value, result = func(self._read(conn, namespace, key))
+            self._write(conn, namespace, key, new_value, ttl)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_shared_cache():
+    """설정된 백엔드의 공유 캐시 인스턴스 (프로세스당 1개)"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if SHARED_CACHE_BACKEND == "sqlite":
+                    _backend = SQLiteCacheBackend(SHARED_CACHE_PATH)
+                else:
+                    _backend = MemoryCacheBackend()
+                logger.info("shared_cache_backend backend=%s", SHARED_CACHE_BACKEND)
+    return _backend
+
+
+def cache_get(namespace: str, key: str):
+    """캐시 조회. 백엔드 오류는 캐시 미스로 처리"""
+    try:
+        return get_shared_cache().get(namespace, key)
+    except sqlite3.Error as e:
+        logger.warning("shared_cache_error op=get namespace=%s error=%s", namespace, e)
+        return None
+
+
+def cache_set(namespace: str, key: str, value, ttl: float | None = None):
+    """캐시 저장. 백엔드 오류는 로깅만 한다"""
+    try:
+        get_shared_cache().set(namespace, key, value, ttl)
+    except sqlite3.Error as e:
+        logger.warning("shared_cache_error op=set namespace=%s error=%s", namespace, e)
@@ -0,0 +1,130 @@
+# ====================================================================================
+#  single_flight.py - 동일한 진행 중 요청 합치기 (세션 간 하나의 업스트림 스트림 공유)
+# ====================================================================================
+#  수업에서 같은 프롬프트를 여러 학생이 동시에 새 대화에 붙여 넣으면 같은 요청이
+#  한꺼번에 나간다. (API 키, 모델, 지시문, 히스토리, 입력)이 모두 같은 요청이 진행 중이면
+#  새 요청을 보내지 않고 그 스트림에 합류해, 지금까지 받은 청크부터 이어서 받는다.
+#  같은 워커 프로세스 안의 세션끼리만 합쳐지며, 요청이 끝나면 기록은 바로 지운다.
+
+import hashlib
+import threading
+
+from config import logger
+
+_flights: dict[str, "_Flight"] = {}
+_flights_lock = threading.Lock()
+
+
+def _digest(*values: str) -> str:
+    hasher = hashlib.sha256()
+    for value in values:
+        hasher.update(value.encode("utf-8"))
+        hasher.update(b"\0")
+    return hasher.hexdigest()
+
+
+def request_key(
+    api_key: str, model_name: str, system_instruction: str | None, contents: list
+) -> str:
+    """
+    (키 다이제스트, 모델, 지시문 다이제스트, 히스토리 다이제스트, 입력 다이제스트) 키
+
+    업스트림 요청은 합류한 쪽의 호출 한도를 쓰지 않으므로 같은 API 키끼리만 합친다.
+    """
+    serialized = [content.model_dump_json(exclude_none=True) for content in contents]
+    return _digest(
+        _digest(api_key or ""),
+        model_name,
+        _digest(system_instruction or ""),
+        _digest(*serialized[:-1]),
+        _digest(*serialized[-1:]),
+    )
+
+
+class _Flight:
+    """진행 중인 업스트림 스트림 하나와 그 청크 기록"""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.cancel = threading.Event()
+        self.condition = threading.Condition()
+
+    def run(self, start_stream):
+        """업스트림 스트림을 읽어 청크를 쌓는다 (별도 스레드에서 실행)"""
+        try:
+            stream = start_stream()
+            try:
+                for chunk in stream:
+                    if self.cancel.is_set():
+                        break
+                    with self.condition:
+                        self.chunks.append(chunk)
+                        self.condition.notify_all()
+            finally:
+                close = getattr(stream, "close", None)
+                if close is not None:
+                    close()
+        except Exception as error:
+            self.error = error
+        finally:
+            with _flights_lock:
+                if _flights.get(self.key) is self:
+                    del _flights[self.key]
+            with self.condition:
+                self.done = True
+                self.condition.notify_all()
+
+    def subscribe(self):
+        """처음 청크부터 순서대로 내보내는 제너레이터 (모든 구독자가 떠나면 업스트림 중단)"""
+        index = 0
+        try:
+            while True:
+                with self.condition:
+                    while index >= len(self.chunks) and not self.done:
+                        self.condition.wait()
+                    if index < len(self.chunks):
+                        chunk = self.chunks[index]
+                        index += 1
+                    elif self.error is not None:
+                        raise self.error
+                    else:
+                        return
+                yield chunk
+        finally:
+            with self.condition:
+                self.subscribers -= 1
+                if self.subscribers <= 0 and not self.done:
+                    self.cancel.set()
+
+
+def coalesced_stream(key: str, start_stream, request_id: str):
+    """
+    같은 키의 요청이 진행 중이면 합류하고, 없으면 start_stream으로 새로 연다
+
+    Args:
+        start_stream: 업스트림 스트림 이터레이터를 여는 함수 (새로 열 때만 호출)
+    """
+    with _flights_lock:
+        flight = _flights.get(key)
+        is_leader = flight is None or flight.cancel.is_set()
+        if is_leader:
+            flight = _Flight(key)
+            _flights[key] = flight
+        with flight.condition:
+            flight.subscribers += 1
+            subscribers = flight.subscribers
+
+    if is_leader:
+        threading.Thread(target=flight.run, args=(start_stream,), daemon=True).start()
+    else:
+        logger.info(
+            "single_flight_joined request_id=%s key=%s subscribers=%d",
+            request_id,
+            key[:12],
+            subscribers,
+        )
+    return flight.subscribe()
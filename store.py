@@ -0,0 +1,235 @@
+# ====================================================================================
+#  store.py - 대화 영구 저장소 (로컬 SQLite/WAL, 세션 토큰 기반 이어하기)
+# ====================================================================================
+
+import base64
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+from config import STORE_DB_PATH, logger
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    session_token TEXT NOT NULL,
+    feature_label TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_conversations_token
+    ON conversations (session_token, updated_at);
+
+CREATE TABLE IF NOT EXISTS messages (
+    conversation_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    files TEXT,
+    image_refs TEXT,
+    meta TEXT,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (conversation_id, seq)
+);
+
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    mime_type TEXT,
+    data BLOB NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+# 메시지 dict에서 meta 컬럼(JSON)으로 함께 저장할 부가 키
+_META_KEYS = (
+    "context",
+    "context_ref",
+    "is_error",
+    "variant_pending",
+    "truncated",
+    "artifact_html",
+    "attachments",
+)
+
+# Streamlit은 세션마다 별도 스레드에서 스크립트를 실행하므로 연결은 스레드별로 둔다
+_local = threading.local()
+
+
+def _connect() -> sqlite3.Connection:
+    """현재 스레드 전용 SQLite 연결을 반환 (최초 호출 시 스키마 생성)"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        STORE_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(STORE_DB_PATH, timeout=5.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        _migrate(conn)
+        _local.conn = conn
+    return conn
+
+
+def _migrate(conn: sqlite3.Connection):
+    """이전 버전 DB에 없는 컬럼을 추가"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(messages)")}
+    if "meta" not in columns:
+        with conn:
+            conn.execute("ALTER TABLE messages ADD COLUMN meta TEXT")
+
+
+def content_digest(data: bytes) -> str:
+    """바이트 데이터의 sha256 다이제스트"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def store_image_blob(data: bytes, mime_type: str) -> str:
+    """이미지(또는 첨부 파일) 바이트를 다이제스트 키로 저장하고 참조값을 반환 (중복 저장 없음)"""
+    digest = content_digest(data)
+    conn = _connect()
+    with conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO blobs (digest, mime_type, data, created_at) "
+            "VALUES (?, ?, ?, ?)",
+            (digest, mime_type, data, time.time()),
+        )
+    return digest
+
+
+def load_image_blob(digest: str) -> bytes | None:
+    """참조값으로 이미지(또는 첨부 파일) 바이트 조회"""
+    row = _connect().execute(
+        "SELECT data FROM blobs WHERE digest = ?", (digest,)
+    ).fetchone()
+    return bytes(row[0]) if row else None
+
+
+def store_text_blob(texts: list[str]) -> str:
+    """첨부 텍스트 목록을 blobs 테이블에 저장하고 참조값을 반환"""
+    return store_image_blob(
+        json.dumps(texts, ensure_ascii=False).encode("utf-8"), "application/json"
+    )
+
+
+def load_text_blob(digest: str) -> list[str] | None:
+    """store_text_blob으로 저장한 첨부 텍스트 목록 조회"""
+    data = load_image_blob(digest)
+    return json.loads(data.decode("utf-8")) if data is not None else None
+
+
+def create_conversation(session_token: str, feature_label: str) -> str:
+    """새 대화를 생성하고 대화 ID를 반환"""
+    conversation_id = uuid.uuid4().hex
+    now = time.time()
+    conn = _connect()
+    with conn:
+        conn.execute(
+            "INSERT INTO conversations (id, session_token, feature_label, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (conversation_id, session_token, feature_label, now, now),
+        )
+    return conversation_id
+
+
+def append_message(conversation_id: str, seq: int, message: dict) -> bool:
+    """
+    메시지 한 건을 추가 기록 (append-only). 기록에 성공하면 True
+
+    이미지(썸네일 포함)는 blobs 테이블에 저장하고 메시지에는 참조(ref, thumb_ref)만
+    남긴다. 전달된 message의 이미지 항목에도 참조를 채워 넣는다.
+    """
+    image_refs = []
+    for image_item in message.get("images") or []:
+        ref = image_item.get("ref")
+        if not ref:
+            ref = store_image_blob(
+                base64.b64decode(image_item["data"]),
+                image_item.get("mime_type", "image/png"),
+            )
+            image_item["ref"] = ref
+        image_ref = {"ref": ref, "mime_type": image_item.get("mime_type", "image/png")}
+        if image_item.get("thumb") and not image_item.get("thumb_ref"):
+            image_item["thumb_ref"] = store_image_blob(
+                base64.b64decode(image_item["thumb"]), image_item["thumb_mime_type"]
+            )
+        if image_item.get("thumb_ref"):
+            image_ref.update(
+                thumb_ref=image_item["thumb_ref"],
+                thumb_mime_type=image_item["thumb_mime_type"],
+                size=image_item.get("size", 0),
+            )
+        image_refs.append(image_ref)
+
+    meta = {key: message[key] for key in _META_KEYS if key in message}
+
+    now = time.time()
+    conn = _connect()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO messages "
+            "(conversation_id, seq, role, content, files, image_refs, meta, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                conversation_id,
+                seq,
+                message["role"],
+                message.get("content", ""),
+                json.dumps(message.get("files") or [], ensure_ascii=False),
+                json.dumps(image_refs),
+                json.dumps(meta, ensure_ascii=False),
+                now,
+            ),
+        )
+        conn.execute(
+            "UPDATE conversations SET updated_at = ? WHERE id = ?",
+            (now, conversation_id),
+        )
+    return True
+
+
+def load_latest_conversation(session_token: str) -> tuple[str, str | None] | None:
+    """세션 토큰의 가장 최근 대화 (conversation_id, feature_label) 조회"""
+    row = _connect().execute(
+        "SELECT id, feature_label FROM conversations "
+        "WHERE session_token = ? ORDER BY updated_at DESC LIMIT 1",
+        (session_token,),
+    ).fetchone()
+    return (row[0], row[1]) if row else None
+
+
+def load_recent_messages(conversation_id: str, limit: int) -> tuple[list[dict], int]:
+    """
+    최근 limit개 메시지만 불러온다. 이미지는 참조만 복원하고 실제 바이트는
+    렌더링 시점에 load_image_blob으로 지연 로딩한다.
+
+    Returns:
+        (messages, next_seq)
+    """
+    rows = _connect().execute(
+        "SELECT seq, role, content, files, image_refs, meta FROM messages "
+        "WHERE conversation_id = ? ORDER BY seq DESC LIMIT ?",
+        (conversation_id, limit),
+    ).fetchall()
+
+    messages = []
+    for seq, role, content, files, image_refs, meta in reversed(rows):
+        message = {"role": role, "content": content, "files": json.loads(files or "[]")}
+        message.update(json.loads(meta or "{}"))
+        refs = json.loads(image_refs or "[]")
+        if refs:
+            message["images"] = refs
+        messages.append(message)
+
+    next_seq = rows[0][0] + 1 if rows else 0
+    return messages, next_seq
+
+
+def safe_call(func, *args, **kwargs):
+    """저장소 오류가 채팅 흐름을 막지 않도록 예외를 로깅하고 None을 반환"""
+    try:
+        return func(*args, **kwargs)
+    except sqlite3.Error as e:
+        logger.warning("conversation_store_error func=%s error=%s", func.__name__, e)
+        return None
@@ -2,15 +2,23 @@
 #  ui_main.py - 메인 채팅 인터페이스 렌더링
 # ====================================================================================
 
-import io
 import base64
 import uuid
 import streamlit as st
-from PIL import Image
 
-from config import MODEL_OPTIONS, MODEL_NAME_MAP, get_feature, logger
-from callbacks import reset_chat_session_on_model_change
+import preprocess
+from config import IMAGE_VARIANT_GRID_COLUMNS, logger
+from feature_registry import get_feature, get_model_options
+from callbacks import (
+    keep_image_variant_on_click,
+    reset_chat_session_on_model_change,
+    stop_generation_on_click,
+    toggle_full_image_on_click,
+)
+from cancellation import GenerationCancelled
 from chat_engine import initialize_chat_session, send_chat_response
+from session import append_chat_message, keep_image_variant
+from store import load_image_blob
 from utils import process_uploaded_files
 
 
@@ -22,7 +30,7 @@ def _render_header():
     with col2:
         st.selectbox(
             "기능 선택",
-            options=MODEL_OPTIONS,
+            options=get_model_options(),
             key="selected_gemini_model",
             help="사용할 봇의 기능을 선택하세요.",
             on_change=reset_chat_session_on_model_change,
@@ -33,10 +41,9 @@ def _render_initial_guide():
     """API 키 미등록 시 초기 안내 메시지 표시"""
     selected_model = st.session_state.selected_gemini_model
     feature = get_feature(selected_model)
-    feature_type = feature.get("type", "free")
 
     # free 타입은 안내 불필요
-    if feature_type == "free":
+    if feature.is_free:
         return
 
     # API 키 등록 완료 또는 이미 메시지가 있으면 안내 불필요
@@ -44,28 +51,216 @@ def _render_initial_guide():
         return
 
     with st.chat_message("assistant", avatar="./images/동동이.PNG"):
-        description = feature.get("description", "")
-        if description:
-            st.info(description)
+        if feature.description:
+            st.info(feature.description)
+
+
+def _load_image_bytes(image_item: dict) -> bytes | None:
+    """세션에 남아있는 이미지 데이터 또는 저장소 참조에서 바이트를 얻는다"""
+    if image_item.get("data"):
+        return base64.b64decode(image_item["data"])
+    if image_item.get("ref"):
+        return load_image_blob(image_item["ref"])
+    return None
+
+
+def _ensure_thumbnails(messages: list):
+    """
+    썸네일이 없는 이미지는 처음 표시할 때 전처리 프로세스 풀에서 한꺼번에 만든다
+
+    디코딩/축소를 스크립트 스레드에서 하지 않고, 여러 장이면 동시에 처리한다.
+    만든 썸네일은 항목에 보관해 rerun마다 다시 만들지 않는다.
+    """
+    pending = []
+    for message in messages:
+        for image_item in message.get("images") or []:
+            if any(image_item.get(key) for key in ("thumb", "thumb_ref", "thumb_failed", "evicted")):
+                continue
+            image_bytes = _load_image_bytes(image_item)
+            if image_bytes is None:
+                continue
+            try:
+                job = preprocess.submit_thumbnail(image_bytes)
+            except preprocess.PreprocessQueueFull:
+                break  # 남은 이미지는 원본으로 표시하고 다음 rerun에 다시 시도
+            pending.append((image_item, len(image_bytes), job))
+
+    for image_item, size, job in pending:
+        try:
+            thumb_bytes, image_item["thumb_mime_type"] = job.result()
+        except Exception as e:
+            logger.warning("image_thumbnail_failed error=%s", e)
+            # 읽을 수 없는 이미지는 rerun마다 다시 제출하지 않는다
+            image_item["thumb_failed"] = True
+            continue
+        image_item["thumb"] = base64.b64encode(thumb_bytes).decode("ascii")
+        image_item["size"] = size
+
+
+def _load_thumbnail(image_item: dict) -> bytes | None:
+    """
+    대화 기록 표시용 썸네일 바이트
+
+    _ensure_thumbnails가 만든 썸네일이나 저장소의 썸네일(thumb_ref)을 쓰고, 얻은 썸네일은
+    항목에 보관해 rerun마다 저장소를 다시 읽지 않는다. 썸네일을 만들지 못했으면 원본 반환
+    """
+    if image_item.get("thumb"):
+        return base64.b64decode(image_item["thumb"])
+    thumb_bytes = None
+    if image_item.get("thumb_ref"):
+        thumb_bytes = load_image_blob(image_item["thumb_ref"])
+    if thumb_bytes is None:
+        return _load_image_bytes(image_item)
+    image_item["thumb"] = base64.b64encode(thumb_bytes).decode("ascii")
+    return thumb_bytes
+
+
+def _render_image_variants(message: dict) -> int:
+    """후보 이미지 격자 + 남길 이미지 선택 버튼 (썸네일로 절약한 바이트 수 반환)"""
+    st.caption("마음에 드는 이미지를 하나 선택하면 그 이미지만 대화에 남습니다.")
+    columns = st.columns(IMAGE_VARIANT_GRID_COLUMNS)
+    bytes_saved = 0
+    for index, image_item in enumerate(message["images"]):
+        with columns[index % IMAGE_VARIANT_GRID_COLUMNS]:
+            thumb_bytes = _load_thumbnail(image_item)
+            if thumb_bytes is None:
+                st.caption("🗑️ 이미지를 불러올 수 없습니다.")
+                continue
+            st.image(thumb_bytes, use_container_width=True)
+            bytes_saved += max(image_item.get("size", 0) - len(thumb_bytes), 0)
+            st.button(
+                "✅ 이 이미지 남기기",
+                key=f"keep_image_variant_{index}",
+                on_click=keep_image_variant_on_click,
+                args=(index,),
+                use_container_width=True,
+            )
+    return bytes_saved
+
+
+def _render_history_image(message: dict, message_index: int, image_index: int) -> int:
+    """
+    히스토리 이미지 하나를 썸네일로 표시. 어시스턴트 이미지는 '원본 보기'를 눌렀을
+    때만 원본을 불러와 표시하고 내려받을 수 있게 한다.
+
+    Returns:
+        썸네일로 표시해 원본 대비 절약한 바이트 수 (원본을 표시하면 0)
+    """
+    image_item = message["images"][image_index]
+    thumb_bytes = _load_thumbnail(image_item)
+    if thumb_bytes is None:
+        raise ValueError("image data not found")
+    if message["role"] != "assistant":
+        st.image(thumb_bytes, width=100)
+        return max(image_item.get("size", 0) - len(thumb_bytes), 0)
+
+    image_key = f"{message_index}:{image_index}"
+    expanded = image_key in st.session_state.expanded_images
+    saved = 0
+    if expanded:
+        image_bytes = _load_image_bytes(image_item)
+        if image_bytes is None:
+            raise ValueError("image data not found")
+        st.image(image_bytes, use_container_width=True)
+    else:
+        st.image(thumb_bytes)
+        saved = max(image_item.get("size", 0) - len(thumb_bytes), 0)
+
+    columns = st.columns(2)
+    with columns[0]:
+        st.button(
+            "🔽 접기" if expanded else "🔍 원본 보기",
+            key=f"toggle_full_image_{image_key}",
+            on_click=toggle_full_image_on_click,
+            args=(image_key,),
+        )
+    if expanded:
+        mime_type = image_item.get("mime_type", "image/png")
+        with columns[1]:
+            st.download_button(
+                "⬇️ 원본 내려받기",
+                data=image_bytes,
+                file_name=f"dongdongbot_{image_key.replace(':', '_')}.{mime_type.split('/')[-1]}",
+                mime=mime_type,
+                key=f"download_full_image_{image_key}",
+            )
+    return saved
 
 
 def _render_chat_history():
-    """채팅 히스토리 렌더링"""
-    for message in st.session_state.messages:
+    """채팅 히스토리 렌더링 (이미지는 썸네일로 표시)"""
+    last_index = len(st.session_state.messages) - 1
+    thumbnails = 0
+    bytes_saved = 0
+    _ensure_thumbnails(st.session_state.messages)
+    for message_index, message in enumerate(st.session_state.messages):
         with st.chat_message(message["role"]):
             st.markdown(message.get("content", ""))
+            if message.get("truncated") and not message.get("is_error"):
+                st.caption("⏹️ 생성을 중지해 여기까지만 받은 답변입니다.")
             if message.get("files"):
                 st.caption(f"📎 첨부 파일: {', '.join(message['files'])}")
-            if message["role"] == "assistant" and message.get("images"):
-                for image_item in message["images"]:
+            if message.get("variant_pending") and message_index == last_index:
+                bytes_saved += _render_image_variants(message)
+                thumbnails += len(message["images"])
+            elif message.get("images"):
+                for image_index, image_item in enumerate(message["images"]):
+                    if image_item.get("evicted"):
+                        st.caption("🗑️ 메모리 절약을 위해 정리된 이미지입니다.")
+                        continue
                     try:
-                        image_bytes = base64.b64decode(image_item["data"])
-                        st.image(
-                            Image.open(io.BytesIO(image_bytes)),
-                            use_container_width=True,
-                        )
+                        saved = _render_history_image(message, message_index, image_index)
                     except Exception:
                         st.warning("이미지 응답을 표시하는 중 문제가 발생했습니다.")
+                        continue
+                    bytes_saved += saved
+                    thumbnails += 1
+
+    # rerun마다 같은 값이 반복되므로 달라졌을 때만 기록
+    if bytes_saved != st.session_state.history_thumbnail_bytes_saved:
+        st.session_state.history_thumbnail_bytes_saved = bytes_saved
+        logger.info(
+            "history_images_rendered images=%d full=%d bytes_saved_per_rerun=%d",
+            thumbnails,
+            len(st.session_state.expanded_images),
+            bytes_saved,
+        )
+
+
+def _build_assistant_payload(
+    response_text: str, response_images: list, artifact_html: str | None = None
+) -> dict:
+    """응답 텍스트/이미지로 히스토리에 넣을 어시스턴트 메시지를 만든다"""
+    assistant_content = response_text if response_text else (
+        "이미지 응답이 생성되었습니다."
+        if response_images
+        else "⚠️ 응답 없음"
+    )
+    message_payload = {
+        "role": "assistant",
+        "content": assistant_content,
+    }
+    if artifact_html:
+        # 수정 블록 응답은 적용 결과 전체 HTML을 함께 보관 (미리보기/다음 수정의 기준)
+        message_payload["artifact_html"] = artifact_html
+
+    if response_images:
+        encoded_images = []
+        for image_bytes, mime_type in response_images:
+            try:
+                encoded_images.append(
+                    {
+                        "data": base64.b64encode(image_bytes).decode("ascii"),
+                        "mime_type": mime_type,
+                    }
+                )
+            except Exception:
+                continue
+        if encoded_images:
+            message_payload["images"] = encoded_images
+        if len(encoded_images) > 1:
+            message_payload["variant_pending"] = True
+    return message_payload
 
 
 def _handle_user_input(chat):
@@ -76,8 +271,7 @@ def _handle_user_input(chat):
 
     if not chat:
         selected_model = st.session_state.selected_gemini_model
-        feature = get_feature(selected_model)
-        if feature.get("type") == "paid_only":
+        if get_feature(selected_model).is_paid_only:
             st.error(
                 "⚠️ 이 기능을 사용하려면 사이드바에 사용 키를 먼저 입력해주세요."
             )
@@ -87,69 +281,61 @@ def _handle_user_input(chat):
             )
         st.stop()
 
+    # 고르지 않은 후보 이미지는 첫 번째만 남기고 정리
+    if st.session_state.messages and st.session_state.messages[-1].get("variant_pending"):
+        keep_image_variant(0)
+
     # 파일 처리
-    content_parts = [prompt]
-    pil_images_for_display = []
+    file_parts = []
+    images_for_display = []
     uploaded_filenames = []
 
     staged_files = st.session_state.get("uploaded_files_sidebar", [])
     if staged_files:
-        file_parts, pil_images_for_display, uploaded_filenames = (
-            process_uploaded_files(staged_files)
+        file_parts, images_for_display, uploaded_filenames = (
+            process_uploaded_files(staged_files, question=prompt)
         )
-        content_parts.extend(file_parts)
 
-    # 사용자 메시지 표시
-    st.session_state.messages.append(
-        {"role": "user", "content": prompt, "files": uploaded_filenames}
-    )
+    # 사용자 메시지 표시 (첨부 내용까지 메시지에 담아 단일 히스토리로 관리)
+    user_message = {"role": "user", "content": prompt, "files": uploaded_filenames}
+    context_texts = [part for part in file_parts if isinstance(part, str)]
+    if context_texts:
+        user_message["context"] = context_texts
+    file_items = [part for part in file_parts if isinstance(part, dict)]
+    user_images = [item for item in file_items if item["mime_type"].startswith("image/")]
+    if user_images:
+        user_message["images"] = user_images
+    user_attachments = [item for item in file_items if item not in user_images]
+    if user_attachments:
+        user_message["attachments"] = user_attachments
+    append_chat_message(user_message)
     with st.chat_message("user"):
         st.markdown(prompt)
-        if pil_images_for_display:
-            st.image(pil_images_for_display, width=100)
+        if images_for_display:
+            st.image(images_for_display, width=100)
         if uploaded_filenames:
             file_info_str = ", ".join([f"'{f}'" for f in uploaded_filenames])
             st.info(f"📄 다음 파일과 함께 질문: {file_info_str}")
 
     # 어시스턴트 응답 생성
     with st.chat_message("assistant"):
+        # 누르면 rerun이 일어나 진행 중인 생성이 다음 화면 갱신 시점에 중단된다
+        st.button("⏹️ 생성 중지", key="stop_generation", on_click=stop_generation_on_click)
         with st.spinner("동동봇 생각 중... 🤔"):
             try:
                 selected_model_label = st.session_state.get(
-                    "active_model_label", MODEL_OPTIONS[0] if MODEL_OPTIONS else ""
-                )
-                response_text, response_images = send_chat_response(
-                    chat, content_parts, selected_model_label
+                    "active_model_label"
+                ) or get_model_options()[0]
+                response_text, response_images, artifact_html = send_chat_response(
+                    chat,
+                    st.session_state.messages,
+                    selected_model_label,
+                    image_variants=st.session_state.get("image_variant_count", 1),
                 )
 
-                assistant_content = response_text if response_text else (
-                    "이미지 응답이 생성되었습니다."
-                    if response_images
-                    else "⚠️ 응답 없음"
+                append_chat_message(
+                    _build_assistant_payload(response_text, response_images, artifact_html)
                 )
-                message_payload = {
-                    "role": "assistant",
-                    "content": assistant_content,
-                }
-
-                if response_images:
-                    encoded_images = []
-                    for image_bytes, mime_type in response_images:
-                        try:
-                            encoded_images.append(
-                                {
-                                    "data": base64.b64encode(image_bytes).decode(
-                                        "ascii"
-                                    ),
-                                    "mime_type": mime_type,
-                                }
-                            )
-                        except Exception:
-                            continue
-                    if encoded_images:
-                        message_payload["images"] = encoded_images
-
-                st.session_state.messages.append(message_payload)
 
                 if uploaded_filenames:
                     st.toast(
@@ -158,12 +344,38 @@ def _handle_user_input(chat):
                     )
                 st.rerun()
 
+            except GenerationCancelled as cancelled:
+                # 받은 부분까지 히스토리에 남기고, 중지 버튼/새 질문의 rerun을 이어서 진행
+                if cancelled.partial_text or cancelled.images:
+                    message_payload = _build_assistant_payload(
+                        cancelled.partial_text, cancelled.images
+                    )
+                else:
+                    # 받은 내용이 없으면 모델 히스토리에서 제외
+                    message_payload = {
+                        "role": "assistant",
+                        "content": "⏹️ 답변 생성을 중지했습니다.",
+                        "is_error": True,
+                    }
+                message_payload["truncated"] = True
+                append_chat_message(message_payload)
+                logger.info(
+                    "request_cancelled project=%s model=%s partial_chars=%d images=%d",
+                    st.session_state.get("active_project_type", "unknown"),
+                    chat.get("model_name", "unknown"),
+                    len(cancelled.partial_text),
+                    len(cancelled.images),
+                )
+                if cancelled.interrupt is not None:
+                    raise cancelled.interrupt
+                st.rerun()
+
             except Exception as error:
                 request_id = uuid.uuid4().hex[:12]
                 project_type = st.session_state.get(
                     "active_project_type", "unknown"
                 )
-                model_name = MODEL_NAME_MAP.get(selected_model_label, "unknown")
+                model_name = chat.get("model_name", "unknown")
                 logger.exception(
                     "request_failed request_id=%s project=%s model=%s",
                     request_id,
@@ -174,8 +386,8 @@ def _handle_user_input(chat):
                     f"오류 발생 ({type(error).__name__}): {error}"
                 )
                 st.error(error_message, icon="💥")
-                st.session_state.messages.append(
-                    {"role": "assistant", "content": error_message}
+                append_chat_message(
+                    {"role": "assistant", "content": error_message, "is_error": True}
                 )
                 st.rerun()
 
@@ -6,12 +6,15 @@ import urllib.parse
 import streamlit as st
 import streamlit.components.v1 as components
 
-from config import get_feature
+from feature_registry import Feature, get_feature, get_prompt_for_feature, get_registry
 from callbacks import (
     auto_apply_api_key_on_change,
     auto_apply_system_instructions_on_change,
+    stop_generation_on_click,
 )
-from config import load_prompt
+from config import IMAGE_VARIANT_MAX_COUNT, load_prompt
+from hedging import get_hedge_stats
+from session_memory import get_top_sessions_by_memory
 from utils import extract_latest_html_code, render_copy_button, summarize_conversation
 
 
@@ -28,9 +31,11 @@ def has_summary_content(messages: list) -> bool:
 
 
 @st.dialog("현재 적용된 System Instructions", width="large")
-def show_system_instructions_modal():
-    """지시문 확인 모달 다이얼로그"""
-    instructions = st.session_state.get("system_instructions", "")
+def show_system_instructions_modal(current_model: str):
+    """지시문 확인 모달 다이얼로그 (지시문 파일은 현재 내용을 다시 읽어 표시)"""
+    instructions = get_prompt_for_feature(current_model) or st.session_state.get(
+        "system_instructions", ""
+    )
     if instructions:
         st.markdown(instructions)
         render_copy_button(instructions)
@@ -58,10 +63,9 @@ def show_appscript_deploy_guide_modal(guide_file: str):
         st.info("배포 가이드 파일을 찾을 수 없습니다.")
 
 
-def _render_api_key_section(current_model: str, feature: dict):
+def _render_api_key_section(current_model: str, feature: Feature):
     """API 키 입력 섹션 렌더링"""
-    feature_type = feature.get("type", "free")
-    is_free_model = feature_type == "free"
+    is_free_model = feature.is_free
 
     st.title("🔑 GEMINI 사용 키 설정")
 
@@ -88,19 +92,18 @@ def _render_api_key_section(current_model: str, feature: dict):
         error_message = st.session_state.get("api_key_error_text")
         if error_message:
             st.warning("올바른 GEMINI 사용 키인지 확인해주세요.")
-        elif feature_type == "paid_or_free":
+        elif feature.type == "paid_or_free":
             st.info("현재 무료 버전 사용 중...")
 
 
-def _render_system_instructions_section(current_model: str, feature: dict):
+def _render_system_instructions_section(current_model: str, feature: Feature):
     """System Instructions 섹션 렌더링"""
     st.title("📜 System Instructions")
 
-    prompt_file = feature.get("prompt_file")
-    if prompt_file:
+    if feature.prompt_file:
         # prompt 파일이 매핑된 기능 → 확인 버튼만 표시
         if st.button("적용된 지시문 확인", use_container_width=True):
-            show_system_instructions_modal()
+            show_system_instructions_modal(current_model)
     else:
         # prompt 파일 없는 기능 → 자유 입력 텍스트 영역
         st.text_area(
@@ -112,6 +115,19 @@ def _render_system_instructions_section(current_model: str, feature: dict):
         )
 
 
+def _render_image_variant_section():
+    """이미지 생성 기능: 한 번에 만들 이미지 수 선택"""
+    st.title("🖼️ 이미지 여러 장 만들기")
+    st.slider(
+        "한 번에 만들 이미지 수",
+        min_value=1,
+        max_value=IMAGE_VARIANT_MAX_COUNT,
+        value=1,
+        help="여러 장을 동시에 만든 뒤 마음에 드는 한 장만 골라 대화에 남길 수 있습니다.",
+        key="image_variant_count",
+    )
+
+
 def _render_file_upload_section():
     """파일 첨부 섹션 렌더링"""
     st.title("📎 파일 첨부")
@@ -121,6 +137,17 @@ def _render_file_upload_section():
         accept_multiple_files=True,
         key="uploaded_files_sidebar",
     )
+    st.text_input(
+        "PDF 페이지 선택 (선택 사항):",
+        placeholder="예: 1-10, 15",
+        help="긴 PDF는 필요한 페이지만 보내면 더 빠르고 정확하게 답변합니다. 비워두면 전체 페이지를 보냅니다.",
+        key="pdf_page_selection",
+    )
+    st.checkbox(
+        "PDF 전체 내용 보내기",
+        help="끄면 긴 PDF는 질문과 관련된 부분만 골라 보냅니다. 문서 전체 요약처럼 전부 필요할 때만 켜세요.",
+        key="pdf_full_text_mode",
+    )
 
 
 def _render_html_preview_section():
@@ -188,10 +215,8 @@ def _render_html_preview_section():
         )
 
 
-def _render_summary_export_section(feature: dict):
+def _render_summary_export_section(feature: Feature):
     """대화내용 요약 → 미리보기 → 다운로드 버튼을 순서대로 렌더링"""
-    from config import MODEL_NAME_MAP, MODEL_OPTIONS
-
     st.subheader("📄 대화내용 요약하기")
 
     messages = st.session_state.get("messages", [])
@@ -204,8 +229,9 @@ def _render_summary_export_section(feature: dict):
         use_container_width=True,
         help=None if has_messages else "첫 질문에 대한 답변이 완료된 후 요약할 수 있습니다.",
     ):
-        summarize_prompt_file = feature.get("summarize_prompt_file", "")
-        summarize_prompt = load_prompt(summarize_prompt_file) if summarize_prompt_file else ""
+        summarize_prompt = (
+            load_prompt(feature.summarize_prompt_file) if feature.summarize_prompt_file else ""
+        )
 
         if not summarize_prompt:
             st.error("요약 지시문 파일을 찾을 수 없습니다.")
@@ -215,12 +241,15 @@ def _render_summary_export_section(feature: dict):
                 if st.session_state.get("api_key_configured", False)
                 else st.secrets.get("default_api_key")
             )
-            selected_label = st.session_state.get("selected_gemini_model", MODEL_OPTIONS[0])
+            registry = get_registry()
             if st.session_state.get("api_key_configured", False):
-                model_name = MODEL_NAME_MAP.get(selected_label, MODEL_NAME_MAP.get(MODEL_OPTIONS[0], ""))
+                model_name = registry.get(
+                    st.session_state.get("selected_gemini_model", registry.default.label)
+                ).model
             else:
-                model_name = MODEL_NAME_MAP.get(MODEL_OPTIONS[0], "")
+                model_name = registry.default.model
 
+            st.button("⏹️ 요약 중지", key="stop_summary", on_click=stop_generation_on_click)
             with st.spinner("AI가 대화 내용을 분석하여 HTML 문서를 생성 중입니다... ⏳"):
                 html_code, error_msg = summarize_conversation(
                     messages=messages,
@@ -297,18 +326,64 @@ def _render_summary_export_section(feature: dict):
         )
 
 
-def _render_deploy_guide_section(feature: dict):
+def _render_deploy_guide_section(feature: Feature):
     """배포 가이드 섹션 렌더링"""
     st.subheader("🚀 배포 가이드")
-    guide_file = feature.get("guide_file", "")
-    btn_label = feature.get("guide_button_label", "📖 배포 가이드 확인")
-    if st.button(btn_label, use_container_width=True):
+    guide_file = feature.guide_file
+    if st.button(feature.guide_button_label, use_container_width=True):
         if guide_file == "githubpage.txt":
             show_github_deploy_guide_modal(guide_file)
         else:
             show_appscript_deploy_guide_modal(guide_file)
 
 
+def _is_admin_view() -> bool:
+    """?admin=<토큰> 쿼리 파라미터가 secrets의 admin_token과 일치하는지 확인"""
+    admin_token = st.secrets.get("admin_token")
+    return bool(admin_token) and st.query_params.get("admin") == admin_token
+
+
+def _render_memory_admin_section():
+    """세션별 메모리 사용량 상위 목록 (관리자 전용)"""
+    st.subheader("🧮 세션 메모리 사용량")
+    rows = []
+    for session_id, record in get_top_sessions_by_memory():
+        top_keys = sorted(record["by_key"].items(), key=lambda item: item[1], reverse=True)[:3]
+        rows.append(
+            {
+                "세션": session_id[:8],
+                "기능": record["feature"],
+                "메시지 수": record["message_count"],
+                "총량(KB)": round(record["total_bytes"] / 1024, 1),
+                "주요 키": ", ".join(f"{key}={size // 1024}KB" for key, size in top_keys),
+            }
+        )
+    if rows:
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+    else:
+        st.info("측정된 세션이 없습니다.")
+
+
+def _render_hedge_admin_section():
+    """헤지 요청 비율/승리 비율 (관리자 전용)"""
+    st.subheader("⏱️ 헤지 요청 통계")
+    hedged_models = {f.model for f in get_registry().features if f.hedging}
+    rows = [
+        {
+            "모델": row["model"],
+            "요청 수": row["requests"],
+            "헤지 비율(%)": round(row["hedge_rate"] * 100, 1),
+            "헤지 승리 비율(%)": round(row["hedge_win_rate"] * 100, 1),
+            "기준 시간(초)": round(row["delay_seconds"], 2),
+        }
+        for row in get_hedge_stats(sorted(hedged_models))
+    ]
+    if rows:
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+    else:
+        st.info("헤지 요청을 사용한 기록이 없습니다.")
+
+
 def render_sidebar():
     """사이드바 전체 렌더링"""
     with st.sidebar:
@@ -317,17 +392,23 @@ def render_sidebar():
 
         _render_api_key_section(current_model, feature)
         _render_system_instructions_section(current_model, feature)
+        if feature.is_image_model:
+            _render_image_variant_section()
         _render_file_upload_section()
 
         # 프론트엔드 개발 기능은 별도 HTML 미리보기 섹션을 유지
-        if feature.get("has_html_preview", False) and not feature.get("has_summary_export", False):
+        if feature.has_preview:
             _render_html_preview_section()
 
         # 대화 요약 내보내기는 수학수업 기능에서 요약/미리보기/다운로드를 연속 배치
-        if feature.get("has_summary_export", False):
+        if feature.has_summary_export:
             _render_summary_export_section(feature)
 
         # 배포 가이드 파일이 매핑된 기능
-        if feature.get("guide_file"):
+        if feature.guide_file:
             _render_deploy_guide_section(feature)
 
+        if _is_admin_view():
+            _render_memory_admin_section()
+            _render_hedge_admin_section()
+
@@ -3,18 +3,46 @@
 # ====================================================================================
 
 import re
-import io
 import html
+import base64
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 import streamlit as st
 import streamlit.components.v1 as components
-from PIL import Image
-import fitz  # PyMuPDF
+from pathlib import Path
+
+import cancellation
+import preflight
+import preprocess
+import rate_limiter
+import retrieval
+import store
+from config import (
+    ATTACHMENT_PDF_MAX_PAGES,
+    ATTACHMENT_REMOTE_FILES,
+    ATTACHMENT_REMOTE_MIN_BYTES,
+    FILE_CACHE_TTL_SECONDS,
+    RETRIEVAL_MIN_CHARS,
+    SUMMARY_CHUNK_CACHE_TTL_SECONDS,
+    SUMMARY_CHUNK_PROMPT_FILE,
+    SUMMARY_CHUNK_TOKENS,
+    SUMMARY_MAP_CONCURRENCY,
+    SUMMARY_SINGLE_PASS_TOKENS,
+    load_prompt,
+    logger,
+)
+from shared_cache import cache_get, cache_set
 
 
 def extract_latest_html_code(messages: list) -> str | None:
     """채팅 히스토리에서 가장 최근 HTML 코드 블록을 추출"""
     for msg in reversed(messages):
         if msg.get("role") == "assistant":
+            # 부분 수정 모드 응답은 적용 후 전체 HTML을 따로 보관한다
+            if msg.get("artifact_html"):
+                return msg["artifact_html"]
             content = msg.get("content", "")
             matches = re.findall(
                 r"```(?:html)?\s*[\r\n]+(.*?)```", content, re.DOTALL | re.IGNORECASE
@@ -67,16 +95,116 @@ def render_copy_button(text: str):
     components.html(html_code, height=120)
 
 
-def process_uploaded_files(staged_files: list) -> tuple[list, list[Image.Image], list[str]]:
+def _pdf_cache_key(pdf_bytes: bytes) -> str:
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def parse_page_selection(spec: str, page_count: int) -> list[int]:
+    """
+    "1-10, 15" 형식의 페이지 선택 문자열을 0부터 시작하는 페이지 번호 목록으로 변환
+
+    비어 있거나 해석할 수 없으면 전체 페이지를 반환한다.
+    """
+    selected = []
+    for token in (spec or "").replace(" ", "").split(","):
+        if not token:
+            continue
+        start, _, end = token.partition("-")
+        try:
+            first = int(start)
+            last = int(end) if end else first
+        except ValueError:
+            continue
+        for page_number in range(max(first, 1), min(last, page_count) + 1):
+            if page_number - 1 not in selected:
+                selected.append(page_number - 1)
+    return selected or list(range(page_count))
+
+
+def _format_pdf_content(
+    name: str, pdf_text: str, page_spec: str = "", digest: str = "", question: str = ""
+) -> str:
+    """
+    PDF 텍스트를 프롬프트용으로 감싼다
+
+    페이지를 직접 선택했으면 그 페이지 전체를, 아니면 긴 PDF는 질문과 관련된
+    발췌만 넣는다. (사이드바에서 전체 내용 모드를 켜면 항상 전체)
+    """
+    pages = pdf_text.split(preprocess.PDF_PAGE_SEPARATOR)
+    selected = parse_page_selection(page_spec, len(pages))
+    if len(selected) < len(pages):
+        return (
+            f"--- PDF 내용 시작: {name} (p.{page_spec.strip()} / 전체 {len(pages)}쪽) ---\n\n"
+            f"{''.join(pages[i] for i in selected)}\n\n"
+            f"--- PDF 내용 끝 ---"
+        )
+
+    use_retrieval = (
+        question
+        and digest
+        and not st.session_state.get("pdf_full_text_mode", False)
+        and len(pdf_text) > RETRIEVAL_MIN_CHARS
+    )
+    if use_retrieval:
+        excerpts = retrieval.select_relevant_excerpts(digest, pages, question)
+        return (
+            f"--- PDF 발췌 시작: {name} (질문과 관련된 부분만 발췌 / 전체 {len(pages)}쪽) ---\n\n"
+            f"{excerpts}\n\n"
+            f"--- PDF 발췌 끝 ---"
+        )
+
+    return (
+        f"--- PDF 내용 시작: {name} ---\n\n"
+        f"{''.join(pages)}\n\n"
+        f"--- PDF 내용 끝 ---"
+    )
+
+
+def _remote_pdf_attachment(name: str, pdf_bytes: bytes) -> dict | None:
+    """
+    원격 파일로 보낼 PDF면 원본을 저장소에 보관하고 첨부 항목을 만든다 (아니면 None)
+
+    원격 파일은 매 턴 문서 전체를 보내므로, 호출 측은 어차피 전체를 보낼 때(전체 내용
+    모드, 또는 텍스트가 짧아 발췌하지 않는 PDF)만 이 함수를 부른다. 작은 PDF는 텍스트가
+    더 싸고 아주 긴 PDF는 보내지 않으며, 다시 올릴 때 쓸 원본을 저장하지 못해도 보내지 않는다.
+    """
+    if not ATTACHMENT_REMOTE_FILES or len(pdf_bytes) < ATTACHMENT_REMOTE_MIN_BYTES:
+        return None
+    pages = preprocess.count_pdf_pages(pdf_bytes)
+    if pages > ATTACHMENT_PDF_MAX_PAGES:
+        return None
+    ref = store.safe_call(store.store_image_blob, pdf_bytes, "application/pdf")
+    if not ref:
+        return None
+    return {"ref": ref, "mime_type": "application/pdf", "name": name, "pages": pages}
+
+
+def process_uploaded_files(
+    staged_files: list, question: str = ""
+) -> tuple[list, list[bytes], list[str]]:
     """
     업로드된 파일들을 처리하여 content_parts, 표시용 이미지, 파일명 목록을 반환
 
+    question이 주어지면 긴 PDF는 질문과 관련된 발췌만 content_parts에 넣는다.
+    발췌하지 않고 전체를 보낼 PDF 중 원격 파일 대상(_remote_pdf_attachment)은
+    {"ref", "mime_type", "name", "pages"} 첨부 항목으로 반환한다. 전체 내용 모드에서는
+    텍스트를 추출하지 않고, 그 밖에는 추출한 텍스트가 RETRIEVAL_MIN_CHARS 이하일 때만
+    (스캔본처럼 텍스트가 거의 없는 PDF 포함) 원격 파일로 바꾼다.
+
+    PDF 텍스트 추출과 이미지 디코딩/축소는 preprocess 프로세스 풀에서 처리하고,
+    대기 중에는 진행 상황을 표시한다. 이미지 항목은 메시지 저장 형식
+    {"data": base64, "mime_type": ...} 으로 반환한다.
+
     Returns:
-        (content_parts, pil_images_for_display, uploaded_filenames)
+        (content_parts, images_for_display, uploaded_filenames)
     """
-    content_parts = []
-    pil_images_for_display = []
+    images_for_display = []
     uploaded_filenames = []
+    page_spec = st.session_state.get("pdf_page_selection", "")
+    full_text_mode = st.session_state.get("pdf_full_text_mode", False)
+    # 파일 순서를 유지하기 위해 (파일명, 종류, 결과 또는 PendingJob, 다이제스트,
+    # 원격 파일 후보 PDF 바이트) 를 모은다
+    slots = []
 
     for uploaded_file in staged_files:
         uploaded_filenames.append(uploaded_file.name)
@@ -84,25 +212,31 @@ def process_uploaded_files(staged_files: list) -> tuple[list, list[Image.Image],
 
         if uploaded_file.type.startswith("image/"):
             try:
-                image = Image.open(uploaded_file)
-                content_parts.append(image)
-                pil_images_for_display.append(image)
+                job = preprocess.submit_image(
+                    uploaded_file.getvalue(), Path(uploaded_file.name).suffix
+                )
+                slots.append((uploaded_file.name, "image", job, None, None))
             except Exception as e:
                 st.error(f"이미지 파일 '{uploaded_file.name}' 처리 중 오류: {e}")
 
         elif uploaded_file.type == "application/pdf":
             try:
-                pdf_bytes = uploaded_file.read()
-                pdf_text = "".join(
-                    page.get_text()
-                    for page in fitz.open(stream=pdf_bytes, filetype="pdf")
-                )
-                pdf_content = (
-                    f"--- PDF 내용 시작: {uploaded_file.name} ---\n\n"
-                    f"{pdf_text}\n\n"
-                    f"--- PDF 내용 끝 ---"
-                )
-                content_parts.append(pdf_content)
+                pdf_bytes = uploaded_file.getvalue()
+                # 쪽 선택은 추출한 텍스트에만 적용되므로 선택이 있으면 텍스트로 보낸다
+                remote_candidate = pdf_bytes if not page_spec.strip() else None
+                if remote_candidate and full_text_mode:
+                    attachment = _remote_pdf_attachment(uploaded_file.name, pdf_bytes)
+                    if attachment:
+                        slots.append((uploaded_file.name, "attachment", attachment, None, None))
+                        continue
+                    remote_candidate = None
+                digest = _pdf_cache_key(pdf_bytes)
+                cached = cache_get("pdf_pages", digest)
+                if cached is not None:
+                    slots.append((uploaded_file.name, "pdf", cached, digest, remote_candidate))
+                else:
+                    job = preprocess.submit_pdf_text(pdf_bytes)
+                    slots.append((uploaded_file.name, "pdf", job, digest, remote_candidate))
             except Exception as e:
                 st.error(f"PDF 파일 '{uploaded_file.name}' 처리 중 오류: {e}")
 
@@ -115,11 +249,61 @@ def process_uploaded_files(staged_files: list) -> tuple[list, list[Image.Image],
                     f"{html_code}\n\n"
                     f"--- HTML 코드 끝 ---"
                 )
-                content_parts.append(html_content)
+                slots.append((uploaded_file.name, "html", html_content, None, None))
             except Exception as e:
                 st.error(f"HTML 파일 '{uploaded_file.name}' 처리 중 오류: {e}")
 
-    return content_parts, pil_images_for_display, uploaded_filenames
+    pending_count = sum(isinstance(slot[2], preprocess.PendingJob) for slot in slots)
+    progress = st.progress(0.0, text="📂 첨부 파일 처리 중...") if pending_count else None
+    finished = 0
+
+    content_parts = []
+    for name, kind, value, digest, remote_candidate in slots:
+        is_fresh = isinstance(value, preprocess.PendingJob)
+        if is_fresh:
+            try:
+                value = value.result()
+            except FutureTimeoutError:
+                st.error(f"'{name}' 처리 시간이 너무 오래 걸려 제외했습니다.")
+                continue
+            except Exception as e:
+                label = "이미지" if kind == "image" else "PDF"
+                st.error(f"{label} 파일 '{name}' 처리 중 오류: {e}")
+                continue
+            finally:
+                finished += 1
+                progress.progress(
+                    finished / pending_count,
+                    text=f"📂 첨부 파일 처리 중... ({finished}/{pending_count})",
+                )
+
+        if kind == "image":
+            image_bytes, mime_type = value
+            # 표시용으로 다시 디코딩하지 않고 바이트를 그대로 st.image에 넘긴다
+            images_for_display.append(image_bytes)
+            content_parts.append(
+                {"data": base64.b64encode(image_bytes).decode("ascii"), "mime_type": mime_type}
+            )
+        elif kind == "pdf":
+            if is_fresh:
+                cache_set("pdf_pages", digest, value, ttl=FILE_CACHE_TTL_SECONDS)
+            attachment = None
+            if remote_candidate and len(value) <= RETRIEVAL_MIN_CHARS:
+                # 발췌 대상이 아닌 짧은 텍스트 → 어차피 전체를 보내므로 원본 파일로
+                attachment = _remote_pdf_attachment(name, remote_candidate)
+            if attachment:
+                content_parts.append(attachment)
+            else:
+                content_parts.append(
+                    _format_pdf_content(name, value, page_spec, digest, question)
+                )
+        else:
+            content_parts.append(value)
+
+    if progress is not None:
+        progress.empty()
+
+    return content_parts, images_for_display, uploaded_filenames
 
 
 def build_conversation_text(messages: list) -> str:
@@ -132,6 +316,106 @@ def build_conversation_text(messages: list) -> str:
     return "\n\n---\n\n".join(lines)
 
 
+def split_conversation_chunks(messages: list, max_tokens: int) -> list[str]:
+    """
+    대화를 턴(사용자 메시지 + 이어지는 답변) 단위로 묶어 max_tokens 이하 구간 텍스트로 나눈다
+
+    앞에서부터 채우므로 대화가 길어져도 앞쪽 구간은 그대로 유지되어 구간 요약 캐시를
+    다시 쓸 수 있다. 턴 하나가 max_tokens를 넘으면 그 턴만으로 한 구간을 만든다.
+    """
+    turns = []
+    for msg in messages:
+        if msg["role"] == "user" or not turns:
+            turns.append([])
+        turns[-1].append(msg)
+
+    chunks = []
+    current = []
+    current_tokens = 0
+    for turn in turns:
+        turn_tokens = preflight.estimate_text_tokens(build_conversation_text(turn))
+        if current and current_tokens + turn_tokens > max_tokens:
+            chunks.append(build_conversation_text(current))
+            current, current_tokens = [], 0
+        current.extend(turn)
+        current_tokens += turn_tokens
+    if current:
+        chunks.append(build_conversation_text(current))
+    return chunks
+
+
+def _summarize_chunk(
+    client, model_name: str, api_key: str, cancel, index: int, chunk_text: str
+) -> tuple[str | None, bool]:
+    """
+    구간 하나를 요약 (구간 내용 다이제스트로 캐시)
+
+    cancel(threading.Event)이 set되어 있으면 호출하지 않고 (None, False)를 반환한다.
+
+    Returns:
+        (요약 텍스트, 캐시 사용 여부)
+    """
+    from google.genai import types as genai_types
+
+    chunk_prompt = (
+        f"{load_prompt(SUMMARY_CHUNK_PROMPT_FILE)}\n\n"
+        f"# 아래는 대화의 {index + 1}번째 구간입니다.\n\n"
+        f"{chunk_text}"
+    )
+    cache_key = hashlib.sha256(f"{model_name}\0{chunk_prompt}".encode("utf-8")).hexdigest()
+    cached = cache_get("summary_chunk", cache_key)
+    if cached:
+        return cached, True
+
+    if cancel.is_set():
+        return None, False
+    rate_limiter.acquire(api_key)
+    if cancel.is_set():
+        # 호출 한도를 기다리는 동안 중지된 경우
+        return None, False
+    response = client.models.generate_content(
+        model=model_name,
+        contents=chunk_prompt,
+        config=genai_types.GenerateContentConfig(system_instruction=None),
+    )
+    summary = (response.text or "").strip()
+    if not summary:
+        raise ValueError(f"{index + 1}번째 구간 요약 응답이 비어 있습니다.")
+    cache_set("summary_chunk", cache_key, summary, ttl=SUMMARY_CHUNK_CACHE_TTL_SECONDS)
+    return summary, False
+
+
+def _summarize_chunks(
+    client, model_name: str, api_key: str, chunks: list[str], cancel: threading.Event
+) -> list[str]:
+    """
+    구간 요약을 동시에 만든다 (호출마다 API 키 호출 한도를 거친다)
+
+    중지되어 cancel이 set되면 아직 시작하지 않은 구간은 호출하지 않는다.
+    """
+    with ThreadPoolExecutor(max_workers=SUMMARY_MAP_CONCURRENCY) as pool:
+        results = list(
+            pool.map(
+                lambda item: _summarize_chunk(client, model_name, api_key, cancel, *item),
+                enumerate(chunks),
+            )
+        )
+    if cancel.is_set():
+        logger.info(
+            "summary_chunks_cancelled chunks=%d skipped=%d",
+            len(chunks),
+            sum(summary is None for summary, _ in results),
+        )
+        return []
+    logger.info(
+        "summary_chunks_done model=%s chunks=%d cached=%d",
+        model_name,
+        len(chunks),
+        sum(cached for _, cached in results),
+    )
+    return [summary for summary, _ in results]
+
+
 def summarize_conversation(
     messages: list,
     summarize_prompt: str,
@@ -141,6 +425,10 @@ def summarize_conversation(
     """
     대화 히스토리 + summarize 프롬프트를 Gemini API에 단발성 전송하여 HTML 코드를 반환
 
+    대화가 SUMMARY_SINGLE_PASS_TOKENS를 넘으면 구간별 요약을 동시에 만든 뒤(map)
+    그 요약들로 HTML을 만든다(reduce). 캐시는 구간 요약에만 쓰고, 최종 HTML은
+    버튼을 누를 때마다 새로 생성한다.
+
     Returns:
         (html_code, error_message) — 성공 시 html_code, 실패 시 error_message
     """
@@ -152,16 +440,38 @@ def summarize_conversation(
     if not api_key:
         return None, "API 키가 없습니다. 사이드바에 키를 등록하거나 무료 키를 서버에 설정해주세요."
 
-    conversation_text = build_conversation_text(messages)
-    full_prompt = (
-        f"{summarize_prompt}\n\n"
-        f"# 아래는 지금까지의 대화 전체 기록입니다.\n\n"
-        f"{conversation_text}"
-    )
-
     try:
         client = genai.Client(api_key=api_key)
-        response = client.models.generate_content(
+        conversation_text = build_conversation_text(messages)
+        if preflight.estimate_text_tokens(conversation_text) <= SUMMARY_SINGLE_PASS_TOKENS:
+            full_prompt = (
+                f"{summarize_prompt}\n\n"
+                f"# 아래는 지금까지의 대화 전체 기록입니다.\n\n"
+                f"{conversation_text}"
+            )
+        else:
+            # 한 번에 보내기 긴 대화는 구간별로 요약한 뒤 그 요약들로 HTML을 만든다
+            chunks = split_conversation_chunks(messages, SUMMARY_CHUNK_TOKENS)
+            cancel = threading.Event()
+            chunk_summaries = cancellation.run_interruptibly(
+                _summarize_chunks, client, model_name, api_key, chunks, cancel, cancel_event=cancel
+            )
+            joined = "\n\n---\n\n".join(
+                f"[구간 {index}]\n{summary}"
+                for index, summary in enumerate(chunk_summaries, start=1)
+            )
+            full_prompt = (
+                f"{summarize_prompt}\n\n"
+                f"# 아래는 지금까지의 대화 전체를 {len(chunks)}개 구간으로 나누어 "
+                f"순서대로 정리한 내용입니다. 모든 구간을 빠짐없이 종합하세요.\n\n"
+                f"{joined}"
+            )
+
+        # 최종 HTML은 캐시하지 않는다: 요약 버튼을 다시 누르면 새로 만들어야 한다
+        rate_limiter.acquire(api_key)
+        # 중지 버튼을 누르면 응답을 기다리지 않고 바로 돌아간다
+        response = cancellation.run_interruptibly(
+            client.models.generate_content,
             model=model_name,
             contents=full_prompt,
             config=genai_types.GenerateContentConfig(
@@ -173,11 +483,14 @@ def summarize_conversation(
         matches = re.findall(
             r"```html\n(.*?)\n```", raw_text, re.DOTALL | re.IGNORECASE
         )
+        html_code = None
         if matches:
-            return matches[-1].strip(), None
+            html_code = matches[-1].strip()
         # 코드 블록 없이 HTML 태그가 직접 있는 경우도 허용
-        if raw_text.strip().startswith("<!DOCTYPE") or raw_text.strip().startswith("<html"):
-            return raw_text.strip(), None
+        elif raw_text.strip().startswith("<!DOCTYPE") or raw_text.strip().startswith("<html"):
+            html_code = raw_text.strip()
+        if html_code:
+            return html_code, None
         return None, "AI 응답에서 HTML 코드를 찾을 수 없습니다. 다시 시도해주세요."
     except Exception as e:
         return None, f"요약 생성 중 오류: {type(e).__name__} - {e}"